@@ -0,0 +1,142 @@
+# app/admin_routes.py
+#
+# Endpoint khusus admin untuk user massal (lihat user_bulk.py):
+#   POST /admin/users/import    body CSV (Content-Type: text/csv) atau NDJSON (application/x-ndjson);
+#                               respons NDJSON berisi satu baris progres per batch
+#   GET  /admin/users/export    ?format=ndjson|csv, di-stream
+#   POST   /admin/profiles          profil N request berikutnya ke satu route (lihat profiler.py)
+#   GET    /admin/profiles          sesi aktif di worker ini dan hasil yang tersimpan
+#   GET    /admin/profiles/{id}     ringkasan teks, atau ?raw=true untuk file pstats
+#   DELETE /admin/profiles          ?method=&path=: hentikan sesi lebih awal dan simpan hasilnya
+
+import json
+import os
+import tempfile
+
+import aiofiles
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+
+from . import auth, profiler, schemas, user_bulk
+from .query_budget import query_budget
+
+router = APIRouter()
+
+
+def _require_admin(current_user: auth.Principal) -> None:
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Hanya admin yang dapat mengakses endpoint ini")
+
+
+def _progress(f, path: str, rows, admin_id: int):
+    try:
+        for summary in user_bulk.import_users(rows, admin_id):
+            yield json.dumps(summary, ensure_ascii=False) + "\n"
+    finally:
+        f.close()
+        os.remove(path)
+
+
+@router.post("/admin/users/import")
+# Per batch: cek username/email, INSERT multi-baris, activity log; skenario budget berisi satu batch
+@query_budget(statements=3, commits=1)
+async def import_users(request: Request, current_user: auth.Principal = Depends(auth.get_current_principal)):
+    _require_admin(current_user)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    formats = {media_type: fmt for fmt, media_type in user_bulk.FORMATS.items()}
+    if content_type not in formats:
+        raise HTTPException(status_code=415, detail=f"Content-Type harus salah satu dari: {', '.join(formats)}")
+
+    # Body ditampung di disk dulu: file 100 ribu user tidak perlu berada di memori
+    fd, path = tempfile.mkstemp(prefix="kanapp-import-", suffix=f".{formats[content_type]}")
+    os.close(fd)
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > user_bulk.USER_IMPORT_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File melebihi batas {user_bulk.USER_IMPORT_MAX_BYTES / 1024 / 1024}MB")
+                await f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Body kosong")
+        # Byte yang bukan UTF-8 menjadi U+FFFD; baris itu tetap divalidasi seperti biasa
+        f = open(path, encoding="utf-8-sig", errors="replace", newline="")
+    except BaseException:
+        os.remove(path)
+        raise
+    try:
+        # Header CSV diperiksa sekarang agar kesalahannya menjadi 400, bukan baris progres
+        rows = user_bulk.read_rows(f, formats[content_type])
+    except user_bulk.UserImportError as exc:
+        f.close()
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(exc))
+    # Generator sinkron dijalankan di threadpool oleh StreamingResponse; file dihapus setelah selesai
+    return StreamingResponse(_progress(f, path, rows, current_user.id), media_type=user_bulk.FORMATS["ndjson"])
+
+
+@router.get("/admin/users/export")
+@query_budget(statements=1)
+def export_users(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    _require_admin(current_user)
+    return StreamingResponse(
+        user_bulk.export_users(format),
+        media_type=user_bulk.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+@router.post("/admin/profiles", response_model=schemas.ResponseModel)
+@query_budget(statements=0)
+def start_profile(
+    profile: schemas.ProfileRequest,
+    request: Request,
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    _require_admin(current_user)
+    try:
+        session = profiler.start(request.app.routes, profile.method, profile.path, profile.requests, profile.sort)
+    except profiler.ProfileError as exc:
+        return schemas.ResponseModel(success=False, error=str(exc))
+    return schemas.ResponseModel(success=True, data=session)
+
+
+@router.get("/admin/profiles", response_model=schemas.ResponseModel)
+@query_budget(statements=0)
+def list_profiles(current_user: auth.Principal = Depends(auth.get_current_principal)):
+    _require_admin(current_user)
+    return schemas.ResponseModel(success=True, data={"active": profiler.active(), "results": profiler.results()})
+
+
+@router.get("/admin/profiles/{profile_id}")
+@query_budget(statements=0)
+def get_profile(profile_id: str, raw: bool = False, current_user: auth.Principal = Depends(auth.get_current_principal)):
+    _require_admin(current_user)
+    path = profiler.result_path(profile_id, raw=raw)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Hasil profil tidak ditemukan")
+    if raw:
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    with open(path) as f:
+        return PlainTextResponse(f.read())
+
+
+@router.delete("/admin/profiles", response_model=schemas.ResponseModel)
+@query_budget(statements=0)
+def stop_profile(
+    method: str,
+    path: str,
+    request: Request,
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    _require_admin(current_user)
+    try:
+        profile_id = profiler.stop(request.app.routes, method, path)
+    except profiler.ProfileError as exc:
+        return schemas.ResponseModel(success=False, error=str(exc))
+    # None: sesi berhenti sebelum ada request yang diprofil
+    return schemas.ResponseModel(success=True, data={"id": profile_id})
@@ -0,0 +1,253 @@
+# app/admission.py
+#
+# Admission control per worker: token bucket per klien (subject JWT, atau IP bila tanpa JWT) untuk
+# setiap grup route, ditambah batas request in-flight per route dan per klien per route. Request yang
+# melewati batas langsung dijawab 429/503 tanpa menyentuh dependency, threadpool, atau database.
+#
+# Konfigurasi lewat environment:
+#   ADMISSION_ENABLED=0                            aktifkan (1) setelah IP klien terbaca benar, lihat di bawah
+#   RATE_LIMIT_<GRUP>=<token per detik>/<burst>   mis. RATE_LIMIT_CHAT=5/20, 0 = tanpa batas
+#   ADMISSION_MAX_IN_FLIGHT=16                     batas request bersamaan per route (0 = tanpa batas,
+#                                                  route @long_poll tidak dibatasi)
+#   ADMISSION_MAX_IN_FLIGHT_PER_CLIENT=4           bagian dari batas di atas yang boleh dipakai satu klien
+#   ADMISSION_TRUSTED_PROXIES=10.0.0.2,10.0.0.3    IP reverse proxy (default kosong)
+#   ADMISSION_CLIENT_IP_HEADER=X-Forwarded-For     header IP klien, hanya dipercaya dari proxy di atas
+#
+# Tanpa ADMISSION_TRUSTED_PROXIES (atau --forwarded-allow-ips di gunicorn), semua klien di belakang proxy
+# atau NAT terlihat sebagai satu IP dan berbagi satu bucket login.
+#
+# State disimpan di memori worker dan hanya diakses dari event loop, sehingga tidak perlu lock.
+# Dengan gunicorn N worker, batas efektif per klien kira-kira N kali nilai di atas.
+
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import orjson
+from jose import JWTError, jwt
+from starlette.routing import Match
+
+from . import auth
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "0") == "1"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", 16))
+ADMISSION_MAX_IN_FLIGHT_PER_CLIENT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_PER_CLIENT", 4))
+ADMISSION_TRUSTED_PROXIES = frozenset(
+    address.strip() for address in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if address.strip()
+)
+ADMISSION_CLIENT_IP_HEADER = os.getenv("ADMISSION_CLIENT_IP_HEADER", "X-Forwarded-For").lower().encode("latin-1")
+# Bucket yang sudah penuh kembali dibuang ketika jumlah klien melewati batas ini
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", 10000))
+
+# Grup route: (nama, prefix path, default "rate/burst"). Urutan penting; yang pertama cocok dipakai.
+ROUTE_GROUPS = (
+    ("auth", ("/login", "/register"), "1/10"),
+    # Upload bertahap: satu file besar = banyak PATCH; bucket sendiri agar tidak menghabiskan jatah chat
+    ("upload", ("/messages/uploads",), "10/40"),
+    # Heartbeat, mengetik, dan long-poll presence: sering tetapi tanpa database
+    ("presence", ("/presence",), "2/30"),
+    ("chat", ("/chats", "/messages"), "5/20"),
+    ("public", (), "20/50"),  # semua route berakhiran /public
+    ("default", ("/",), "10/30"),
+)
+
+
+def long_poll(func):
+    """
+    Menandai endpoint yang sengaja ditahan lama (long-poll); tidak dihitung dalam ADMISSION_MAX_IN_FLIGHT.
+    """
+    func.__long_poll__ = True
+    return func
+
+
+def _parse_limit(value: str) -> Tuple[float, float]:
+    rate, _, burst = value.partition("/")
+    return float(rate), float(burst or rate)
+
+
+LIMITS: Dict[str, Tuple[float, float]] = {
+    name: _parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", default))
+    for name, _, default in ROUTE_GROUPS
+}
+
+
+def group_for(path: str) -> str:
+    for name, prefixes, _ in ROUTE_GROUPS:
+        if name == "public":
+            if path.endswith("/public"):
+                return name
+        elif path.startswith(prefixes):
+            return name
+    return "default"
+
+
+@lru_cache(maxsize=4096)
+def client_key(credentials: str) -> Optional[str]:
+    """
+    Kunci rate limit dari bearer token. Hanya token JWT yang tanda tangannya valid yang dipakai
+    subject-nya; token asal-asalan jatuh ke kunci IP agar tidak bisa membuat bucket baru tiap request.
+    Static token dipakai bersama oleh semua aplikasi klien, jadi juga jatuh ke kunci IP.
+    """
+    if credentials == auth.STATIC_BEARER_TOKEN:
+        return None
+    try:
+        payload = jwt.decode(credentials, auth.SECRET_KEY, algorithms=[auth.ALGORITHM], options={"verify_exp": False})
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return f"sub:{subject}" if subject is not None else None
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """
+        Mengambil satu token. Mengembalikan 0 jika diizinkan, atau detik sampai token berikutnya tersedia.
+        """
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_in_flight: Dict[Tuple[str, str], int] = {}
+_client_in_flight: Dict[Tuple[str, str, str], int] = {}
+_route_groups: Dict[str, str] = {}
+
+
+def _prune_buckets(now: float) -> None:
+    for key, bucket in list(_buckets.items()):
+        rate, burst = LIMITS[key[0]]
+        if bucket.tokens + (now - bucket.updated) * rate >= burst:
+            del _buckets[key]
+
+
+def admit(group: str, key: str, now: float) -> float:
+    rate, burst = LIMITS[group]
+    if rate <= 0:
+        return 0.0
+    bucket = _buckets.get((group, key))
+    if bucket is None:
+        if len(_buckets) >= ADMISSION_MAX_CLIENTS:
+            _prune_buckets(now)
+        bucket = _buckets[(group, key)] = TokenBucket(burst, now)
+    return bucket.take(rate, burst, now)
+
+
+def _bearer(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and credentials:
+                return credentials
+            return None
+    return None
+
+
+def client_ip(scope) -> str:
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if peer not in ADMISSION_TRUSTED_PROXIES:
+        return peer
+    for name, value in scope["headers"]:
+        if name == ADMISSION_CLIENT_IP_HEADER:
+            # Alamat paling kanan yang bukan proxy kita; alamat di kirinya bisa dipalsukan klien
+            for address in reversed(value.decode("latin-1").split(",")):
+                address = address.strip()
+                if address and address not in ADMISSION_TRUSTED_PROXIES:
+                    return address
+    return peer
+
+
+async def _reject(send, status_code: int, error: str, retry_after: float) -> None:
+    body = orjson.dumps({"success": False, "data": None, "error": error})
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI murni. Route dicocokkan di sini (bukan menunggu router) supaya batas berlaku
+    per template route; route yang cocok disimpan di scope sehingga MetricsMiddleware tetap
+    memberi label yang benar pada request yang ditolak.
+    """
+
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+
+    def _match(self, scope):
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route = self._match(scope)
+        path = getattr(route, "path", None)
+        if path is None:
+            await self.app(scope, receive, send)
+            return
+        scope["route"] = route
+
+        group = _route_groups.get(path)
+        if group is None:
+            group = _route_groups[path] = group_for(path)
+        # Login dan registrasi selalu per IP: JWT milik orang lain tidak boleh membuka jatah baru
+        credentials = _bearer(scope) if group != "auth" else None
+        key = client_key(credentials) if credentials else None
+        if key is None:
+            key = f"ip:{client_ip(scope)}"
+
+        retry_after = admit(group, key, time.monotonic())
+        if retry_after:
+            await _reject(send, 429, "Terlalu banyak request, coba lagi nanti", retry_after)
+            return
+
+        if getattr(getattr(route, "endpoint", None), "__long_poll__", False):
+            await self.app(scope, receive, send)
+            return
+
+        route_key = (scope["method"], path)
+        client_route_key = (scope["method"], path, key)
+        in_flight = _in_flight.get(route_key, 0)
+        client_in_flight = _client_in_flight.get(client_route_key, 0)
+        # Batas per klien dicek dulu: burst satu klien tidak boleh menghabiskan slot route untuk klien lain
+        if ADMISSION_MAX_IN_FLIGHT_PER_CLIENT and client_in_flight >= ADMISSION_MAX_IN_FLIGHT_PER_CLIENT:
+            await _reject(send, 429, "Terlalu banyak request bersamaan, coba lagi nanti", 1)
+            return
+        if ADMISSION_MAX_IN_FLIGHT and in_flight >= ADMISSION_MAX_IN_FLIGHT:
+            await _reject(send, 503, "Server sedang sibuk, coba lagi nanti", 1)
+            return
+
+        _in_flight[route_key] = in_flight + 1
+        _client_in_flight[client_route_key] = client_in_flight + 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight[route_key] -= 1
+            remaining = _client_in_flight.pop(client_route_key) - 1
+            if remaining:
+                _client_in_flight[client_route_key] = remaining
@@ -1,6 +1,23 @@
 # app/auth.py
+#
+# Token JWT:
+# - access token (ACCESS_TOKEN_EXPIRE_MINUTES): sub = id user, role, gen (generasi token user) dan
+#   typ "access". Cukup untuk mengotorisasi sebagian besar endpoint tanpa query (get_current_principal).
+# - refresh token (REFRESH_TOKEN_EXPIRE_DAYS): typ "refresh", ditukar di POST /token/refresh dengan
+#   pasangan token baru. Generasinya dicek ke database setiap kali ditukar. jti-nya dicatat di tabel
+#   refresh_tokens dan hanya bisa ditukar sekali (rotasi); refresh token yang dipakai ulang berarti bocor,
+#   jadi semua token user itu dicabut.
+# Logout dan ganti password menaikkan users.token_generation sehingga semua token lama user itu ditolak.
+# Setiap worker menyimpan generasi user yang dicabut dalam ACCESS_TOKEN_EXPIRE_MINUTES terakhir (pencabutan
+# yang lebih lama tidak relevan: access token-nya sudah kedaluwarsa) dan menyegarkannya dari database
+# paling lama setiap TOKEN_REVOCATION_SYNC_SECONDS di thread terpisah.
 
-from typing import Optional
+import logging
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
@@ -8,25 +25,41 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta
 from .schemas import Token
-from .models import User
+from .models import RefreshToken, User
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
-from .dependencies import get_db
-from passlib.context import CryptContext
+from .database import engine
+from .dependencies import get_db, on_commit
+from .passwords import pwd_context
 import re
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Static Bearer Token untuk login dan register
 STATIC_BEARER_TOKEN = os.getenv("STATIC_BEARER_TOKEN")
 
 # JWT Configuration
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 15))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", 5))
 
 security = HTTPBearer()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class Principal(NamedTuple):
+    # Identitas dari access token; cukup untuk endpoint yang hanya butuh id/role user
+    id: int
+    role: str
+    generation: int
+
+
+def prewarm_password_context() -> None:
+    # passlib memuat backend bcrypt secara lazy pada hash/verify pertama; muat saat startup tanpa menjalankan hash
+    pwd_context.handler().get_backend()
 
 def verify_static_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if credentials.credentials != STATIC_BEARER_TOKEN:
@@ -45,7 +78,7 @@ def authenticate_user(db: Session, identifier: str, password: str) -> Optional[U
         user = db.query(User).filter(User.email == identifier).first()
     else:
         user = db.query(User).filter(User.username == identifier).first()
-    
+
     if not user:
         return None
     if not pwd_context.verify(password, user.hashed_password):
@@ -62,24 +95,207 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Tidak dapat memverifikasi kredensial",
-        headers={"WWW-Authenticate": "Bearer"},
+def access_token_for(user_id: int, role: str, generation: int) -> str:
+    return create_access_token(
+        {"sub": str(user_id), "role": role, "gen": generation, "typ": "access"},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+
+def issue_tokens(db: Session, user: User) -> dict:
+    generation = user.token_generation or 0
+    jti = uuid.uuid4().hex
+    expires_delta = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token = create_access_token(
+        # jti membuat setiap refresh token unik meskipun diterbitkan pada detik yang sama
+        {"sub": str(user.id), "gen": generation, "typ": "refresh", "jti": jti},
+        expires_delta=expires_delta,
+    )
+    # Di-flush bersama commit request; token baru berlaku setelah commit itu
+    db.add(RefreshToken(jti=jti, user_id=user.id, expires_at=datetime.utcnow() + expires_delta))
+    return {
+        "access_token": access_token_for(user.id, user.role, generation),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+class _Revocations:
+    """
+    Generasi token minimum per user yang dicabut baru-baru ini: {user_id: (generasi, waktu cabut)}.
+    """
+
+    def __init__(self):
+        self.generations: Dict[int, Tuple[int, float]] = {}
+        self.synced_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def is_revoked(self, user_id: int, generation: int) -> bool:
+        now = time.monotonic()
+        # Satu thread latar yang menyegarkan; request tidak pernah menunggu query
+        if now - self.synced_at >= TOKEN_REVOCATION_SYNC_SECONDS and self.lock.acquire(blocking=False):
+            self.synced_at = now
+            threading.Thread(target=self._sync_and_release, daemon=True).start()
+        entry = self.generations.get(user_id)
+        return entry is not None and generation < entry[0]
+
+    def revoke(self, user_id: int, generation: int) -> None:
+        current = self.generations.get(user_id)
+        if current is None or generation > current[0]:
+            self.generations[user_id] = (generation, time.time())
+
+    def sync(self) -> None:
+        cutoff = time.time() - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        query = select(User.id, User.token_generation, User.tokens_revoked_at).where(
+            User.tokens_revoked_at >= datetime.utcfromtimestamp(cutoff)
+        )
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(query).all()
+        except Exception as exc:
+            logger.warning("Gagal memuat token yang dicabut: %s", exc)
+            return
+        generations = {
+            user_id: (generation, (revoked_at - datetime(1970, 1, 1)).total_seconds())
+            for user_id, generation, revoked_at in rows
+        }
+        # Pencabutan lokal yang di-commit setelah query di atas tetap dipertahankan
+        for user_id, (generation, revoked_at) in list(self.generations.items()):
+            if revoked_at >= cutoff and generation > generations.get(user_id, (-1, 0))[0]:
+                generations[user_id] = (generation, revoked_at)
+        self.generations = generations
+
+    def _sync_and_release(self) -> None:
+        try:
+            self.sync()
+        finally:
+            self.lock.release()
+
+
+_revocations = _Revocations()
+
+
+def prewarm_revocations() -> None:
+    # Dipanggil saat startup agar token yang dicabut sebelum worker hidup langsung ditolak
+    with _revocations.lock:
+        _revocations.synced_at = time.monotonic()
+        _revocations.sync()
+
+
+def revoke_tokens(db: Session, principal: Principal) -> None:
+    """
+    Mencabut semua access dan refresh token milik user (logout, ganti password).
+    """
+    # UPDATE langsung: tidak menaikkan users.version, profil tidak berubah
+    db.execute(
+        update(User)
+        .where(User.id == principal.id)
+        .values(token_generation=User.token_generation + 1, tokens_revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
     )
+    # Batas bawah generasi baru; nilai pastinya menyusul lewat sync berikutnya
+    on_commit(db, lambda: _revocations.revoke(principal.id, principal.generation + 1))
+
+
+@lru_cache(maxsize=4096)
+def _claims(credentials: str) -> Optional[dict]:
+    # Verifikasi tanda tangan di-cache per token; exp dicek terpisah di setiap pemakaian
     try:
-        payload = jwt.decode(token.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        identifier: str = payload.get("sub")
-        if identifier is None:
-            raise credentials_exception
+        return jwt.decode(credentials, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
     except JWTError:
-        raise credentials_exception
-    # Deteksi apakah identifier adalah email
-    if re.match(r'[^@]+@[^@]+\.[^@]+', identifier):
-        user = db.query(User).filter(User.email == identifier).first()
-    else:
-        user = db.query(User).filter(User.username == identifier).first()
+        return None
+
+
+def _verified_claims(credentials: str, token_type: str) -> dict:
+    claims = _claims(credentials)
+    if (
+        claims is None
+        or claims.get("typ") != token_type
+        or not str(claims.get("sub", "")).isdigit()
+        or not isinstance(claims.get("gen"), int)
+        or claims.get("exp", 0) <= time.time()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Tidak dapat memverifikasi kredensial",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+
+def get_current_principal(token: HTTPAuthorizationCredentials = Depends(security)) -> Principal:
+    claims = _verified_claims(token.credentials, "access")
+    user_id = int(claims["sub"])
+    if _revocations.is_revoked(user_id, claims["gen"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token sudah dicabut",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Principal(user_id, claims.get("role", ""), claims["gen"])
+
+
+def user_for_refresh_token(db: Session, refresh_token: str) -> User:
+    """
+    Menukar refresh token satu kali: jti-nya ditandai terpakai, pemanggil menerbitkan pasangan baru.
+    """
+    claims = _verified_claims(refresh_token, "refresh")
+    user_id = int(claims["sub"])
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token tidak valid atau sudah dicabut",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    # UPDATE bersyarat: dari dua request yang menukar token yang sama, hanya satu yang berhasil
+    consumed = db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.jti == str(claims.get("jti", "")),
+            RefreshToken.user_id == user_id,
+            RefreshToken.used_at.is_(None),
+        )
+        .values(used_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not consumed:
+        used = db.get(RefreshToken, str(claims.get("jti", "")))
+        if used is not None and used.user_id == user_id and used.used_at is not None:
+            # Token yang sudah ditukar dipakai lagi: pencuri atau pemiliknya memegang salinan, cabut semuanya.
+            # Di-commit langsung karena get_db me-rollback request yang berakhir dengan exception.
+            logger.warning("Refresh token user %s dipakai ulang; semua token user dicabut", user_id)
+            db.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(token_generation=User.token_generation + 1, tokens_revoked_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            _revocations.revoke(user_id, claims["gen"] + 1)
+        raise invalid
+    user = db.get(User, user_id)
+    # Generasi dicek ke database, bukan ke cache: refresh token berumur panjang
+    if user is None or user.token_generation != claims["gen"]:
+        raise invalid
+    return user
+
+
+def prune_refresh_tokens(db: Session, now: Optional[datetime] = None) -> int:
+    deleted = db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.expires_at < (now or datetime.utcnow()))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def get_current_user(principal: Principal = Depends(get_current_principal), db: Session = Depends(get_db)) -> User:
+    # Untuk endpoint yang membutuhkan baris user lengkap (profil, nama pengirim)
+    user = db.get(User, principal.id)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Tidak dapat memverifikasi kredensial",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
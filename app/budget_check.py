@@ -0,0 +1,181 @@
+# app/budget_check.py
+#
+# Harness query budget: memanggil setiap route aplikasi (main.py dan semua router) terhadap database
+# yang sudah di-seed, lalu gagal (dengan daftar statement yang melanggar) jika ada route yang
+# melampaui anggaran @query_budget-nya atau belum punya anggaran/skenario.
+#
+#   python -m app.cli check-budgets                 # SQLite sementara
+#   python -m app.cli check-budgets --database-url postgresql://.../kanapp_budget
+
+import uuid
+from typing import Callable, List, Tuple
+
+from fastapi.routing import APIRoute
+
+from . import auth, chat_models, media_storage, models, profiler, query_budget, resumable_upload
+from .seed import SEED_PASSWORD
+
+# (method, template route, fungsi pembuat argumen request dari konteks)
+Scenario = Tuple[str, str, Callable[[dict], dict]]
+
+
+def _user_headers(ctx: dict) -> dict:
+    return {"Authorization": f"Bearer {ctx['token']}"}
+
+
+def _idempotent_headers(ctx: dict) -> dict:
+    return {**_user_headers(ctx), "Idempotency-Key": uuid.uuid4().hex}
+
+
+def _admin_headers(ctx: dict) -> dict:
+    return {"Authorization": f"Bearer {ctx['admin_token']}"}
+
+
+def _static_headers(ctx: dict) -> dict:
+    return {"Authorization": f"Bearer {auth.STATIC_BEARER_TOKEN}"}
+
+
+DATA_ENTRY = {
+    **{f"string_field{k}": f"budget {k}" for k in range(1, 4)},
+    **{f"int_field{k}": k for k in range(1, 9)},
+}
+
+IMPORT_CSV = (
+    "name,username,email,password,role\n"
+    + "".join(f"Import User {k},import{k},import{k}@example.com,{SEED_PASSWORD},user\n" for k in range(3))
+).encode()
+
+SCENARIOS: List[Scenario] = [
+    ("POST", "/register", lambda ctx: {"url": "/register", "headers": _static_headers(ctx), "json": {
+        "name": "Budget User", "username": "budget_user", "email": "budget@example.com",
+        "password": SEED_PASSWORD, "role": "user"}}),
+    ("POST", "/login", lambda ctx: {"url": "/login", "headers": _static_headers(ctx), "json": {
+        "identifier": ctx["username"], "password": SEED_PASSWORD}}),
+    ("POST", "/token/refresh", lambda ctx: {"url": "/token/refresh", "headers": _static_headers(ctx), "json": {
+        "refresh_token": ctx["refresh_token"]}}),
+    # Memakai user lain: logout mencabut token yang dipakai skenario lain
+    ("POST", "/logout", lambda ctx: {"url": "/logout", "headers": {"Authorization": f"Bearer {ctx['logout_token']}"}}),
+    ("GET", "/users/me/", lambda ctx: {"url": "/users/me/", "headers": _user_headers(ctx)}),
+    ("GET", "/token/validate", lambda ctx: {"url": "/token/validate", "headers": _user_headers(ctx)}),
+    ("GET", "/users/search", lambda ctx: {"url": "/users/search?name=Seed", "headers": _user_headers(ctx)}),
+    ("GET", "/users/search/public", lambda ctx: {"url": "/users/search/public?name=Seed", "headers": _static_headers(ctx)}),
+    ("GET", "/users/batch", lambda ctx: {"url": "/users/batch", "headers": _user_headers(ctx),
+                                          "params": {"ids": ",".join(str(ctx["user_id"] + k) for k in range(50))}}),
+    ("POST", "/users/batch", lambda ctx: {"url": "/users/batch", "headers": _user_headers(ctx),
+                                           "json": {"ids": [ctx["user_id"] + k for k in range(300)]}}),
+    ("GET", "/users/all", lambda ctx: {"url": "/users/all", "headers": _user_headers(ctx)}),
+    ("GET", "/users/all/public", lambda ctx: {"url": "/users/all/public", "headers": _static_headers(ctx)}),
+    ("GET", "/reports/user/{user_id}", lambda ctx: {"url": f"/reports/user/{ctx['user_id']}", "headers": _user_headers(ctx)}),
+    ("GET", "/reports/user/{user_id}/public", lambda ctx: {"url": f"/reports/user/{ctx['user_id']}/public", "headers": _static_headers(ctx)}),
+    # POST pembuat data dipanggil dengan Idempotency-Key baru: jalur termahal (cek key + simpan hasil)
+    ("POST", "/data_entries/", lambda ctx: {"url": "/data_entries/", "headers": _idempotent_headers(ctx), "json": DATA_ENTRY}),
+    ("GET", "/data_entries/", lambda ctx: {"url": "/data_entries/", "headers": _user_headers(ctx),
+                                            "params": {"filter": "int_field1:gte:0", "sort": "-int_field2", "limit": 20}}),
+    ("GET", "/data_entries/changes", lambda ctx: {"url": "/data_entries/changes", "headers": _user_headers(ctx), "params": {"since": 5}}),
+    ("GET", "/data_entries/{data_entry_id}", lambda ctx: {"url": f"/data_entries/{ctx['entry_id']}", "headers": _user_headers(ctx)}),
+    ("PUT", "/data_entries/{data_entry_id}", lambda ctx: {"url": f"/data_entries/{ctx['entry_id']}", "headers": _user_headers(ctx), "json": {"int_field1": 7}}),
+    ("DELETE", "/data_entries/{data_entry_id}", lambda ctx: {"url": f"/data_entries/{ctx['entry_id']}", "headers": _user_headers(ctx)}),
+    ("PUT", "/users/me/profile", lambda ctx: {"url": "/users/me/profile", "headers": _user_headers(ctx), "json": {"name": "Seed User Baru"}}),
+    ("POST", "/logs/", lambda ctx: {"url": "/logs/", "headers": _user_headers(ctx), "json": {"action": "budget"}}),
+    ("GET", "/logs/", lambda ctx: {"url": "/logs/", "headers": _user_headers(ctx)}),
+    ("GET", "/logs/public", lambda ctx: {"url": "/logs/public", "headers": _static_headers(ctx)}),
+    ("POST", "/reports/", lambda ctx: {"url": "/reports/", "headers": _idempotent_headers(ctx), "json": {f"int_value{k}": k for k in range(1, 9)}}),
+    ("GET", "/reports/", lambda ctx: {"url": "/reports/", "headers": _user_headers(ctx)}),
+    ("GET", "/cache/stats", lambda ctx: {"url": "/cache/stats", "headers": _static_headers(ctx)}),
+    ("GET", "/metrics", lambda ctx: {"url": "/metrics", "headers": _static_headers(ctx)}),
+    ("GET", "/chats", lambda ctx: {"url": "/chats", "headers": _user_headers(ctx)}),
+    ("GET", "/chats/search", lambda ctx: {"url": "/chats/search?q=jadwal obat", "headers": _user_headers(ctx)}),
+    ("POST", "/chats", lambda ctx: {"url": "/chats", "headers": _user_headers(ctx), "json": {"username": "budget_user"}}),
+    ("GET", "/chats/{chat_id}/messages", lambda ctx: {"url": f"/chats/{ctx['chat_id']}/messages", "headers": _user_headers(ctx)}),
+    ("POST", "/messages", lambda ctx: {"url": "/messages", "headers": _idempotent_headers(ctx), "json": {"chat_id": ctx["chat_id"], "content": "halo"}}),
+    ("POST", "/messages/upload-media", lambda ctx: {"url": "/messages/upload-media", "headers": _user_headers(ctx),
+                                                     "files": {"file": ("budget.png", b"\x89PNG\r\n\x1a\n", "image/png")}}),
+    ("POST", "/messages/uploads", lambda ctx: {"url": "/messages/uploads", "headers": _user_headers(ctx),
+                                               "json": {"length": 8, "content_type": "video/mp4"}}),
+    ("PATCH", "/messages/uploads/{upload_id}", lambda ctx: {"url": f"/messages/uploads/{ctx['upload_id']}", "content": b"\x00" * 8,
+                                                            "headers": {**_user_headers(ctx), "Upload-Offset": "0",
+                                                                        "Content-Type": "application/offset+octet-stream"}}),
+    ("HEAD", "/messages/uploads/{upload_id}", lambda ctx: {"url": f"/messages/uploads/{ctx['upload_id']}", "headers": _user_headers(ctx)}),
+    ("GET", "/messages/uploads/{upload_id}", lambda ctx: {"url": f"/messages/uploads/{ctx['upload_id']}", "headers": _user_headers(ctx)}),
+    ("POST", "/messages/uploads/{upload_id}/finalize", lambda ctx: {"url": f"/messages/uploads/{ctx['upload_id']}/finalize", "headers": _user_headers(ctx)}),
+    ("POST", "/storage/uploads", lambda ctx: {"url": "/storage/uploads", "headers": _user_headers(ctx),
+                                              "json": {"length": 8, "content_type": "image/png"}}),
+    ("GET", "/storage/media/{name}", lambda ctx: {"url": "/storage/media/image_budget.png", "headers": _user_headers(ctx),
+                                                  "follow_redirects": False}),
+    ("PUT", "/storage/local/{name}", lambda ctx: {"url": ctx["local_upload_url"], "content": b"\x89PNG\r\n\x1a\n",
+                                                  "headers": {"Content-Type": "image/png"}}),
+    ("DELETE", "/messages/uploads/{upload_id}", lambda ctx: {"url": f"/messages/uploads/{ctx['abandoned_upload_id']}", "headers": _user_headers(ctx)}),
+    ("POST", "/presence/heartbeat", lambda ctx: {"url": "/presence/heartbeat", "headers": _user_headers(ctx)}),
+    ("POST", "/presence/chats/{chat_id}/typing", lambda ctx: {"url": f"/presence/chats/{ctx['chat_id']}/typing", "headers": _user_headers(ctx),
+                                                              "json": {"typing": True}}),
+    ("GET", "/presence/chats/{chat_id}", lambda ctx: {"url": f"/presence/chats/{ctx['chat_id']}", "headers": _user_headers(ctx)}),
+    ("POST", "/admin/users/import", lambda ctx: {"url": "/admin/users/import", "headers": {**_admin_headers(ctx), "Content-Type": "text/csv"},
+                                                 "content": IMPORT_CSV}),
+    ("GET", "/admin/users/export", lambda ctx: {"url": "/admin/users/export", "headers": _admin_headers(ctx)}),
+    # Sesi profil untuk daftar profil itu sendiri: skenario berikutnya menghasilkan file yang dibaca setelahnya
+    ("POST", "/admin/profiles", lambda ctx: {"url": "/admin/profiles", "headers": _admin_headers(ctx),
+                                              "json": {"method": "GET", "path": "/admin/profiles", "requests": 1}}),
+    ("GET", "/admin/profiles", lambda ctx: {"url": "/admin/profiles", "headers": _admin_headers(ctx)}),
+    ("GET", "/admin/profiles/{profile_id}", lambda ctx: {"url": f"/admin/profiles/{profiler.results()[0]}", "headers": _admin_headers(ctx)}),
+    ("DELETE", "/admin/profiles", lambda ctx: {"url": "/admin/profiles", "headers": _admin_headers(ctx),
+                                                "params": {"method": "GET", "path": "/token/validate"}}),
+]
+
+
+def _context(db) -> dict:
+    user = db.query(models.User).filter(models.User.username == "seed1").first()
+    other = db.query(models.User).filter(models.User.username == "seed2").first()
+    admin = db.query(models.User).filter(models.User.role == "admin").order_by(models.User.id).first()
+    tokens = auth.issue_tokens(db, user)
+    logout_token = auth.issue_tokens(db, other)["access_token"]
+    admin_token = auth.issue_tokens(db, admin)["access_token"]
+    # Refresh token baru berlaku setelah jti-nya tersimpan
+    db.commit()
+    entry_id = db.query(models.DataEntry.id).filter(models.DataEntry.owner_id == user.id).first()[0]
+    chat_id = db.query(chat_models.ChatParticipant.chat_id).filter(chat_models.ChatParticipant.user_id == user.id).first()[0]
+    return {
+        "user_id": user.id,
+        "username": user.username,
+        "token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
+        "logout_token": logout_token,
+        "admin_token": admin_token,
+        "entry_id": entry_id,
+        "chat_id": chat_id,
+        "upload_id": resumable_upload.create(user.id, 8, "video/mp4")[0],
+        "abandoned_upload_id": resumable_upload.create(user.id, 8, "video/mp4")[0],
+        # Skenario PUT lokal hanya berlaku untuk MEDIA_STORAGE=local (default harness)
+        "local_upload_url": media_storage.get_storage().presign_upload("image_budget.png", "image/png", 8)["url"],
+    }
+
+
+def run(app, db) -> List[str]:
+    """
+    Menjalankan semua skenario dan mengembalikan daftar kegagalan (kosong berarti lolos).
+    """
+    from fastapi.testclient import TestClient
+
+    failures = []
+    covered = {(method, path) for method, path, _ in SCENARIOS}
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        if query_budget.budget_for(route.endpoint) is None:
+            failures.append(f"{sorted(route.methods)} {route.path}: belum punya @query_budget")
+        for method in route.methods:
+            if (method, route.path) not in covered:
+                failures.append(f"{method} {route.path}: belum punya skenario di budget_check.SCENARIOS")
+
+    ctx = _context(db)
+    with TestClient(app) as client:
+        for method, path, build in SCENARIOS:
+            kwargs = build(ctx)
+            try:
+                with query_budget.enforce():
+                    response = client.request(method, **kwargs)
+            except query_budget.QueryBudgetExceeded as exc:
+                failures.append(str(exc))
+                continue
+            if response.status_code >= 400:
+                failures.append(f"{method} {path}: status {response.status_code} {response.text[:200]}")
+    return failures
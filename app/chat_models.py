@@ -1,15 +1,22 @@
 # app/chat_models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Text, Index, func, literal
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import REGCONFIG
+import os
+
+# Konfigurasi text search PostgreSQL untuk pencarian pesan; index dan query harus memakai nilai yang sama
+CHAT_SEARCH_CONFIG = os.getenv("CHAT_SEARCH_CONFIG", "simple")
 
 class Chat(Base):
     __tablename__ = "chats"
 
     id = Column(String, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Diperbarui saat ada pesan baru atau pesan ditandai terbaca; cap versi untuk ETag chat
+    updated_at = Column(DateTime, default=datetime.utcnow)
     
     participants = relationship("ChatParticipant", back_populates="chat")
     messages = relationship("Message", back_populates="chat")
@@ -18,14 +25,18 @@ class ChatParticipant(Base):
     __tablename__ = "chat_participants"
 
     id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(String, ForeignKey("chats.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    chat_id = Column(String, ForeignKey("chats.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     
     chat = relationship("Chat", back_populates="participants")
     user = relationship("User", back_populates="chats")
 
 class Message(Base):
     __tablename__ = "messages"
+    # Mendukung pesan terakhir per chat dan riwayat chat terurut tanpa sort penuh
+    __table_args__ = (
+        Index("ix_messages_chat_id_timestamp", "chat_id", "timestamp"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     chat_id = Column(String, ForeignKey("chats.id"))
@@ -38,4 +49,11 @@ class Message(Base):
     read = Column(Boolean, default=False)
     
     chat = relationship("Chat", back_populates="messages")
-    sender = relationship("User")
\ No newline at end of file
+    sender = relationship("User")
+
+# Index GIN full-text untuk /chats/search; hanya dibuat di PostgreSQL (SQLite memakai index di memori)
+Index(
+    "ix_messages_content_fts",
+    func.to_tsvector(literal(CHAT_SEARCH_CONFIG).cast(REGCONFIG), Message.content),
+    postgresql_using="gin",
+).ddl_if(dialect="postgresql")
@@ -1,98 +1,174 @@
 # app/chat_routes.py
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, UploadFile, File
+from sqlalchemy import String, and_, case, cast, func, tuple_
+from sqlalchemy.orm import Session, aliased
 import uuid
 from datetime import datetime
+from typing import Optional
 
-from . import models, chat_models, chat_schemas, auth, schemas
+from . import models, chat_models, chat_schemas, auth, schemas, serializers, conditional
 from .dependencies import get_db
 from .logging_service import log_activity
-from .media_service import save_media
-import traceback
+from .media_service import classify_media, save_media, schedule_derivatives
+from . import idempotency, jobs
+from . import message_archive, message_search
+from .query_budget import query_budget
+from .db_routing import read_only
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _touch_chat(db: Session, chat_id: str, when: datetime = None) -> None:
+    db.query(chat_models.Chat).filter(chat_models.Chat.id == chat_id).update(
+        {chat_models.Chat.updated_at: when or datetime.utcnow()}, synchronize_session=False
+    )
+
+def _message_stamp(db: Session, chat_id: str, user_id: int):
+    # (updated_at chat, jumlah versi profil peserta) atau None jika user bukan peserta chat
+    row = db.query(
+        func.max(case((chat_models.ChatParticipant.user_id == user_id, 1), else_=0)),
+        chat_models.Chat.updated_at,
+        func.sum(models.User.version),
+    ).select_from(chat_models.Chat).join(
+        chat_models.ChatParticipant, chat_models.ChatParticipant.chat_id == chat_models.Chat.id
+    ).join(
+        models.User, models.User.id == chat_models.ChatParticipant.user_id
+    ).filter(chat_models.Chat.id == chat_id).group_by(chat_models.Chat.id, chat_models.Chat.updated_at).first()
+    if not row or not row[0]:
+        return None
+    return row[1], row[2]
+
 @router.get("/chats", response_model=chat_schemas.ChatListResponse)
-def get_chats(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    # Get all chats where the current user is a participant
-    chat_participants = db.query(chat_models.ChatParticipant).filter(
-        chat_models.ChatParticipant.user_id == current_user.id
-    ).all()
+@query_budget(statements=5, commits=1)
+@read_only
+def get_chats(request: Request, db: Session = Depends(get_db), current_user: auth.Principal = Depends(auth.get_current_principal)):
+    me = aliased(chat_models.ChatParticipant)
+    other = aliased(chat_models.ChatParticipant)
     
-    chat_list = []
-    for participant in chat_participants:
-        chat = participant.chat
-        
-        # Find the other participants
-        other_participants = db.query(chat_models.ChatParticipant).filter(
-            chat_models.ChatParticipant.chat_id == chat.id,
-            chat_models.ChatParticipant.user_id != current_user.id
-        ).all()
-        
-        if not other_participants:
-            continue
-            
-        other_user_id = other_participants[0].user_id
-        other_user = db.query(models.User).filter(models.User.id == other_user_id).first()
-        
-        # Get last message
-        last_message = db.query(chat_models.Message).filter(
-            chat_models.Message.chat_id == chat.id
-        ).order_by(chat_models.Message.timestamp.desc()).first()
+    # Cap versi daftar chat: jumlah chat, perubahan terakhir, dan versi profil lawan bicara
+    stamp = db.query(
+        func.count(me.id), func.max(chat_models.Chat.updated_at), func.sum(models.User.version)
+    ).select_from(me).join(
+        other, and_(other.chat_id == me.chat_id, other.user_id != current_user.id)
+    ).join(
+        models.User, models.User.id == other.user_id
+    ).join(
+        chat_models.Chat, chat_models.Chat.id == me.chat_id
+    ).filter(me.user_id == current_user.id).one()
+    etag = conditional.make_etag("chats", current_user.id, *stamp)
+    if conditional.is_fresh(request, etag):
+        return conditional.not_modified(etag)
+    
+    # Get all chats where the current user is a participant, beserta peserta lain dan namanya (satu query)
+    participants = db.query(
+        me.chat_id, other.user_id, models.User.name
+    ).join(
+        other, and_(other.chat_id == me.chat_id, other.user_id != current_user.id)
+    ).join(
+        models.User, models.User.id == other.user_id
+    ).filter(
+        me.user_id == current_user.id
+    ).order_by(me.id, other.id).all()
+    
+    # Ambil peserta lain pertama untuk setiap chat, dengan urutan chat seperti sebelumnya
+    recipients = {}
+    for chat_id, user_id, name in participants:
+        recipients.setdefault(chat_id, (user_id, name))
+    chat_ids = list(recipients)
+    
+    last_messages = {}
+    unread_chats = set()
+    if chat_ids:
+        # Get last message per chat dengan window function, bukan satu query per chat
+        ranked = db.query(
+            chat_models.Message.chat_id,
+            chat_models.Message.content,
+            chat_models.Message.timestamp,
+            func.row_number().over(
+                partition_by=chat_models.Message.chat_id,
+                order_by=chat_models.Message.timestamp.desc()
+            ).label("position")
+        ).filter(chat_models.Message.chat_id.in_(chat_ids)).subquery()
+        for chat_id, content, timestamp in db.query(
+            ranked.c.chat_id, ranked.c.content, ranked.c.timestamp
+        ).filter(ranked.c.position == 1):
+            last_messages[chat_id] = (content, timestamp)
         
         # Check if there are unread messages
-        unread_messages = db.query(chat_models.Message).filter(
-            chat_models.Message.chat_id == chat.id,
+        unread_chats = {chat_id for (chat_id,) in db.query(chat_models.Message.chat_id).filter(
+            chat_models.Message.chat_id.in_(chat_ids),
             chat_models.Message.sender_id != current_user.id,
             chat_models.Message.read == False
-        ).count() > 0
-        
-        chat_item = chat_schemas.Chat(
-            id=chat.id,
-            recipient_id=str(other_user.id),
-            recipient_name=other_user.name,
-            last_message=last_message.content if last_message else None,
-            last_message_time=last_message.timestamp if last_message else None,
-            unread=unread_messages
-        )
-        chat_list.append(chat_item)
+        ).distinct()}
+    
+    chat_list = []
+    for chat_id in chat_ids:
+        recipient_id, recipient_name = recipients[chat_id]
+        content, timestamp = last_messages.get(chat_id, (None, None))
+        chat_list.append({
+            "id": chat_id,
+            "recipient_id": str(recipient_id),
+            "recipient_name": recipient_name,
+            "last_message": content,
+            "last_message_time": timestamp,
+            "unread": chat_id in unread_chats,
+        })
     
     # Log activity
     log = schemas.ActivityLogCreate(action=f"Retrieved {len(chat_list)} chats")
     log_activity(db, log, current_user.id)
     
-    return chat_schemas.ChatListResponse(success=True, data=chat_list)
+    return serializers.chats.render(chat_list, headers=conditional.etag_headers(etag))
+
+@router.get("/chats/search", response_model=chat_schemas.MessageSearchResponse)
+@query_budget(statements=4, commits=1)
+@read_only
+def search_messages(q: str,
+                    skip: int = 0,
+                    limit: int = 20,
+                    db: Session = Depends(get_db),
+                    current_user: auth.Principal = Depends(auth.get_current_principal)):
+    if not q.strip() or len(q) > 200:
+        return chat_schemas.MessageSearchResponse(success=False, error="Kata kunci pencarian harus 1-200 karakter")
+    limit = max(1, min(limit, 100))
+    skip = max(skip, 0)
+    
+    # Ambil satu hasil ekstra untuk mengetahui apakah masih ada halaman berikutnya
+    hits = message_search.search(db, current_user.id, q, skip, limit + 1)
+    next_skip = skip + limit if len(hits) > limit else None
+    
+    # Log activity (tanpa isi kata kunci, karena bisa berisi data pribadi)
+    log = schemas.ActivityLogCreate(action=f"Searched messages ({min(len(hits), limit)} hits)")
+    log_activity(db, log, current_user.id)
+    
+    return chat_schemas.MessageSearchResponse(
+        success=True,
+        data=chat_schemas.MessageSearchPage(hits=hits[:limit], next_skip=next_skip)
+    )
 
 @router.post("/chats", response_model=chat_schemas.ChatResponse)
+@query_budget(statements=6, commits=1)
 def create_chat(request: chat_schemas.CreateChatRequest, 
                 db: Session = Depends(get_db), 
-                current_user: models.User = Depends(auth.get_current_user)):
+                current_user: auth.Principal = Depends(auth.get_current_principal)):
     # Find the recipient by username
     recipient = db.query(models.User).filter(models.User.username == request.username).first()
     if not recipient:
         return chat_schemas.ChatResponse(success=False, error="Recipient not found")
     
-    # Check if chat already exists between these users
-    existing_chat = None
-    user_chats = db.query(chat_models.ChatParticipant).filter(
-        chat_models.ChatParticipant.user_id == current_user.id
-    ).all()
-    
-    for user_chat in user_chats:
-        # Check if the recipient is also in this chat
-        recipient_in_chat = db.query(chat_models.ChatParticipant).filter(
-            chat_models.ChatParticipant.chat_id == user_chat.chat_id,
-            chat_models.ChatParticipant.user_id == recipient.id
-        ).first()
-        
-        if recipient_in_chat:
-            existing_chat = user_chat.chat
-            break
+    # Check if chat already exists between these users (satu query join)
+    me = aliased(chat_models.ChatParticipant)
+    other = aliased(chat_models.ChatParticipant)
+    existing_chat = db.query(me.chat_id).join(
+        other, and_(other.chat_id == me.chat_id, other.user_id == recipient.id)
+    ).filter(me.user_id == current_user.id).order_by(me.id).first()
     
     if existing_chat:
         chat_data = chat_schemas.Chat(
-            id=existing_chat.id,
+            id=existing_chat.chat_id,
             recipient_id=str(recipient.id),
             recipient_name=recipient.name,
             last_message=None,
@@ -112,7 +188,7 @@ def create_chat(request: chat_schemas.CreateChatRequest,
     db.add(participant1)
     db.add(participant2)
     
-    db.commit()
+    db.flush()
     
     # Log activity
     log = schemas.ActivityLogCreate(action=f"Created new chat with {recipient.username}")
@@ -130,61 +206,132 @@ def create_chat(request: chat_schemas.CreateChatRequest,
     return chat_schemas.ChatResponse(success=True, data=chat_data)
 
 @router.get("/chats/{chat_id}/messages", response_model=chat_schemas.MessageListResponse)
-def get_messages(chat_id: str, 
-                 db: Session = Depends(get_db), 
-                 current_user: models.User = Depends(auth.get_current_user)):
-    # Verify chat exists and user is a participant
-    participant = db.query(chat_models.ChatParticipant).filter(
-        chat_models.ChatParticipant.chat_id == chat_id,
-        chat_models.ChatParticipant.user_id == current_user.id
-    ).first()
-    
-    if not participant:
+# +2 statement (cek + insert job chat.mark_read) hanya jika ada pesan belum terbaca, +1 (nama pengirim)
+# hanya jika halaman menyambung ke arsip (lihat message_archive.py)
+@query_budget(statements=6, commits=1)
+@read_only
+def get_messages(chat_id: str,
+                 request: Request,
+                 limit: Optional[int] = None,
+                 before: Optional[str] = None,
+                 db: Session = Depends(get_db),
+                 current_user: auth.Principal = Depends(auth.get_current_principal)):
+    # Tanpa limit: seluruh riwayat. Dengan limit: `limit` pesan terbaru sebelum cursor `before`
+    # (next_cursor dari halaman sebelumnya), tetap diurutkan dari yang tertua
+    if limit is not None and limit < 1:
+        return chat_schemas.MessageListResponse(success=False, error="limit harus >= 1")
+    try:
+        before_key = message_archive.decode_cursor(before) if before is not None else None
+    except message_archive.CursorError as exc:
+        return chat_schemas.MessageListResponse(success=False, error=str(exc))
+
+    # Verify chat exists and user is a participant, sekaligus membaca cap versi chat
+    stamp = _message_stamp(db, chat_id, current_user.id)
+    if not stamp:
         return chat_schemas.MessageListResponse(success=False, error="Chat not found or you're not a participant")
-    
-    # Get all messages in this chat
-    messages = db.query(chat_models.Message).filter(
+
+    etag = conditional.make_etag("messages", chat_id, *stamp, limit, before)
+    if conditional.is_fresh(request, etag):
+        return conditional.not_modified(etag)
+
+    # Get messages in this chat, beserta nama pengirim dalam satu query join
+    keys = message_archive.keyset_columns(db)
+    query = db.query(
+        chat_models.Message.id,
+        chat_models.Message.chat_id,
+        cast(chat_models.Message.sender_id, String).label("sender_id"),
+        models.User.name.label("sender_name"),
+        chat_models.Message.content,
+        chat_models.Message.message_type,
+        chat_models.Message.media_url,
+        chat_models.Message.timestamp,
+        chat_models.Message.read,
+    ).join(models.User, models.User.id == chat_models.Message.sender_id).filter(
         chat_models.Message.chat_id == chat_id
-    ).order_by(chat_models.Message.timestamp).all()
-    
-    # Mark messages as read if they were sent by the other user
-    unread_messages = db.query(chat_models.Message).filter(
-        chat_models.Message.chat_id == chat_id,
-        chat_models.Message.sender_id != current_user.id,
-        chat_models.Message.read == False
-    ).all()
-    
-    for message in unread_messages:
-        message.read = True
-    
-    db.commit()
-    
+    )
+    if before_key is not None:
+        query = query.filter(tuple_(*keys) < before_key)
+    if limit is None:
+        rows = query.order_by(*keys).all()
+    else:
+        rows = query.order_by(*[key.desc() for key in keys]).limit(limit + 1).all()[::-1]
+    messages = [row._asdict() for row in rows]
+
+    # Tanda terbaca untuk pesan lawan bicara diserahkan ke job chat.mark_read; respons sudah
+    # menampilkannya sebagai terbaca, sama seperti saat UPDATE dijalankan di request. Job hanya
+    # menandai sampai pesan terbaru yang dikembalikan: pesan yang masuk setelah request ini belum dilihat
+    me = str(current_user.id)
+    if any(not message["read"] and message["sender_id"] != me for message in messages):
+        newest = message_archive.encode_cursor((messages[-1]["timestamp"], messages[-1]["id"]))
+        # Klien yang polling sebelum runner sempat jalan tidak menumpuk job yang sama
+        jobs.enqueue(db, "chat.mark_read", {"chat_id": chat_id, "user_id": current_user.id, "until": newest},
+                     key=f"{chat_id}:{current_user.id}:{newest}")
+        for message in messages:
+            if message["sender_id"] != me:
+                message["read"] = True
+
+    # Tabel habis sebelum halaman penuh: sambung dari arsip, sebelum pesan tertua di tabel.
+    # Tanpa limit, membuka chat hanya membaca tabel; riwayat arsip diminta lewat before=next_cursor,
+    # paling banyak MESSAGE_ARCHIVE_PAGE_SIZE pesan arsip per respons
+    next_cursor = None
+    oldest = (messages[0]["timestamp"], messages[0]["id"]) if messages else before_key
+    if limit is None and before_key is None and messages:
+        if message_archive.has_archive(chat_id):
+            next_cursor = message_archive.encode_cursor(oldest)
+    elif limit is None or len(messages) <= limit:
+        page = message_archive.MESSAGE_ARCHIVE_PAGE_SIZE if limit is None else limit - len(messages)
+        archived = message_archive.read_archived(chat_id, oldest, page + 1)
+        if limit is None and len(archived) > page:
+            archived = archived[1:]
+            next_cursor = message_archive.encode_cursor((archived[0]["timestamp"], archived[0]["id"]))
+        if archived:
+            names = dict(db.query(models.User.id, models.User.name).filter(
+                models.User.id.in_({row["sender_id"] for row in archived})
+            ).all())
+            messages = [
+                dict(row, sender_id=str(row["sender_id"]), sender_name=names.get(row["sender_id"], ""))
+                for row in archived
+            ] + messages
+
+    if limit is not None and len(messages) > limit:
+        messages = messages[-limit:]
+        next_cursor = message_archive.encode_cursor((messages[0]["timestamp"], messages[0]["id"]))
+
     # Log activity
     log = schemas.ActivityLogCreate(action=f"Retrieved {len(messages)} messages from chat {chat_id}")
     log_activity(db, log, current_user.id)
-    
-    message_list = []
-    for message in messages:
-        sender = db.query(models.User).filter(models.User.id == message.sender_id).first()
-        message_item = chat_schemas.Message(
-            id=message.id,
-            chat_id=message.chat_id,
-            sender_id=str(message.sender_id),
-            sender_name=sender.name,
-            content=message.content,
-            message_type=message.message_type,
-            media_url=message.media_url,
-            timestamp=message.timestamp,
-            read=message.read
-        )
-        message_list.append(message_item)
-    
-    return chat_schemas.MessageListResponse(success=True, data=message_list)
+
+    return serializers.messages.render(messages, headers=conditional.etag_headers(etag), next_cursor=next_cursor)
+
+@jobs.handler("chat.mark_read", concurrency=2)
+def _mark_read(db: Session, payload: dict) -> dict:
+    # Satu UPDATE tanpa memuat baris; idempoten jika job dijalankan ulang
+    query = db.query(chat_models.Message).filter(
+        chat_models.Message.chat_id == payload["chat_id"],
+        chat_models.Message.sender_id != payload["user_id"],
+        chat_models.Message.read == False
+    )
+    # Job lama tanpa "until" tetap menandai seluruh chat
+    if payload.get("until"):
+        query = query.filter(tuple_(*message_archive.keyset_columns(db)) <= message_archive.decode_cursor(payload["until"]))
+    marked = query.update({chat_models.Message.read: True}, synchronize_session=False)
+    if marked:
+        # Status terbaca terlihat oleh pengirim, jadi versi chat ikut berubah
+        _touch_chat(db, payload["chat_id"])
+    return {"marked": marked}
 
 @router.post("/messages", response_model=chat_schemas.MessageResponse)
+@query_budget(statements=7, commits=1)
 def send_message(request: chat_schemas.SendMessageRequest, 
                  db: Session = Depends(get_db), 
-                 current_user: models.User = Depends(auth.get_current_user)):
+                 current_user: models.User = Depends(auth.get_current_user),
+                 idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    # Retry klien dengan Idempotency-Key yang sama mendapat pesan yang sudah dibuat
+    idempotent = idempotency.Idempotency(db, current_user.id, "POST /messages", idempotency_key, request)
+    replay = idempotent.replay()
+    if replay is not None:
+        return replay
+    
     # Verify chat exists and user is a participant
     participant = db.query(chat_models.ChatParticipant).filter(
         chat_models.ChatParticipant.chat_id == request.chat_id,
@@ -208,8 +355,7 @@ def send_message(request: chat_schemas.SendMessageRequest,
     )
     
     db.add(new_message)
-    db.commit()
-    db.refresh(new_message)
+    _touch_chat(db, request.chat_id, new_message.timestamp)
     
     # Log activity
     log = schemas.ActivityLogCreate(action=f"Sent {request.message_type} to chat {request.chat_id}")
@@ -228,27 +374,22 @@ def send_message(request: chat_schemas.SendMessageRequest,
         read=new_message.read
     )
     
-    return chat_schemas.MessageResponse(success=True, data=message_data)
+    return idempotent.remember(chat_schemas.MessageResponse(success=True, data=message_data))
 
 @router.post("/messages/upload-media")
+@query_budget(statements=2, commits=1)
 async def upload_media(
     file: UploadFile = File(...), 
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     try:
-        # Validasi tipe file
-        content_type = file.content_type
-        
-        if content_type.startswith("image/"):
-            file_type = "image"
-        elif content_type.startswith("video/"):
-            file_type = "video"
-        else:
-            raise HTTPException(status_code=400, detail="Only image and video files are allowed")
+        # Validasi tipe file (sama dengan upload bertahap dan upload langsung ke storage)
+        file_type, _ = classify_media(file.content_type)
         
         # Simpan file
         media_url = await save_media(file)
+        derivatives = schedule_derivatives(db, media_url) if file_type == "image" else {}
         
         # Log aktivitas
         log = schemas.ActivityLogCreate(action=f"Uploaded {file_type}")
@@ -258,10 +399,13 @@ async def upload_media(
             "success": True, 
             "data": {
                 "media_url": media_url,
-                "message_type": file_type
+                "message_type": file_type,
+                "derivatives": derivatives
             }
         }
+    except HTTPException:
+        # Kesalahan klien (tipe/ukuran file) tetap 4xx
+        raise
     except Exception as e:
-        print(f"Error in upload_media: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception("Upload media gagal")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,7 +1,7 @@
 # app/chat_schemas.py
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 # Message schemas
@@ -61,4 +61,80 @@ class ChatListResponse(BaseModel):
 class MessageListResponse(BaseModel):
     success: bool
     data: Optional[List[Message]] = None
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    # Cursor `before` untuk halaman pesan yang lebih lama; None jika sudah di awal riwayat atau tanpa limit
+    next_cursor: Optional[str] = None
+
+class MessageSearchHit(BaseModel):
+    id: str
+    chat_id: str
+    sender_id: str
+    sender_name: str
+    message_type: str = "text"
+    timestamp: datetime
+    rank: float
+    # Potongan isi pesan (HTML-escaped) dengan kata yang cocok dibungkus <mark>...</mark>
+    snippet: str
+
+class MessageSearchPage(BaseModel):
+    hits: List[MessageSearchHit]
+    next_skip: Optional[int] = None
+
+class MessageSearchResponse(BaseModel):
+    success: bool
+    data: Optional[MessageSearchPage] = None
+    error: Optional[str] = None
+
+# Upload media bertahap (/messages/uploads) dan langsung ke storage (/storage/uploads)
+class MediaUploadCreate(BaseModel):
+    length: int  # ukuran total file dalam byte
+    content_type: str  # image/* atau video/*
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    offset: int  # byte yang sudah diterima; PATCH berikutnya dimulai dari sini
+    length: int
+    content_type: str
+    expires_at: datetime
+
+class ResumableUploadResponse(BaseModel):
+    success: bool
+    data: Optional[ResumableUploadStatus] = None
+    error: Optional[str] = None
+
+class PresignedUpload(BaseModel):
+    method: str  # "PUT": body mentah + headers; "POST": form multipart berisi fields lalu field "file"
+    url: str
+    fields: Dict[str, str] = {}
+    headers: Dict[str, str] = {}
+
+class DirectUpload(BaseModel):
+    media_url: str  # dikirim lewat POST /messages setelah upload ke storage selesai
+    message_type: str
+    upload: PresignedUpload
+    expires_at: datetime
+
+class DirectUploadResponse(BaseModel):
+    success: bool
+    data: Optional[DirectUpload] = None
+    error: Optional[str] = None
+
+# Presence dan indikator mengetik (/presence), lihat presence.py
+class TypingRequest(BaseModel):
+    typing: bool = True  # false = berhenti mengetik (mis. input dikosongkan) tanpa menunggu TYPING_TTL
+
+class ParticipantPresence(BaseModel):
+    user_id: str
+    online: bool
+    typing: bool
+    last_seen: Optional[datetime] = None
+
+class ChatPresence(BaseModel):
+    chat_id: str
+    state: str  # kirim kembali sebagai ?since= pada long-poll berikutnya
+    participants: List[ParticipantPresence]
+
+class ChatPresenceResponse(BaseModel):
+    success: bool
+    data: Optional[ChatPresence] = None
+    error: Optional[str] = None
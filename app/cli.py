@@ -0,0 +1,204 @@
+# app/cli.py
+#
+# Perintah operasional yang dijalankan di luar worker gunicorn, misalnya:
+#   python -m app.cli migrate
+#   python -m app.cli prune-logs   (jalankan harian lewat cron/systemd timer)
+#   python -m app.cli archive-messages (jalankan harian; lihat message_archive.py)
+#   python -m app.cli prune-uploads (jalankan berkala; membuang upload bertahap yang kedaluwarsa)
+#   python -m app.cli prune-idempotency-keys (jalankan berkala; lihat idempotency.py)
+#   python -m app.cli prune-refresh-tokens (jalankan berkala; lihat auth.py)
+#   python -m app.cli run-jobs     (runner job terpisah dari worker web, lihat jobs.py)
+#   python -m app.cli check-budgets (jalankan di CI sebelum merge)
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    from .database import engine
+    from .preflight import run_migrations
+
+    run_migrations(engine)
+    return 0
+
+
+def cmd_prune_logs(args: argparse.Namespace) -> int:
+    from .database import engine
+    from .log_retention import apply_retention
+
+    result = apply_retention(engine)
+    for entry in result["archived"]:
+        print(f"archived {entry}")
+    for entry in result["dropped"]:
+        print(f"dropped {entry}")
+    return 0
+
+
+def cmd_archive_messages(args: argparse.Namespace) -> int:
+    from .database import engine
+    from .message_archive import archive_messages
+
+    result = archive_messages(engine)
+    for chat_id, count in result.items():
+        print(f"archived {count} messages from chat {chat_id}")
+    return 0
+
+
+def cmd_prune_uploads(args: argparse.Namespace) -> int:
+    from .resumable_upload import prune
+
+    for upload_id in prune():
+        print(f"removed {upload_id}")
+    return 0
+
+
+def cmd_prune_idempotency_keys(args: argparse.Namespace) -> int:
+    from .database import SessionLocal
+    from .idempotency import prune
+
+    with SessionLocal() as db:
+        print(f"removed {prune(db)} idempotency keys")
+    return 0
+
+
+def cmd_prune_refresh_tokens(args: argparse.Namespace) -> int:
+    from .auth import prune_refresh_tokens
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        print(f"removed {prune_refresh_tokens(db)} refresh tokens")
+    return 0
+
+
+def cmd_run_jobs(args: argparse.Namespace) -> int:
+    import signal
+    import threading
+
+    from . import jobs, media_derivatives, structured_logging
+
+    # Runner adalah service jangka panjang: lognya ikut format JSON seperti worker web
+    structured_logging.start()
+    stopped = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopped.set())
+    runner = jobs.start(args.threads)
+    if runner is None:
+        structured_logging.stop()
+        print("--threads harus lebih dari 0", file=sys.stderr)
+        return 2
+    stopped.wait()
+    jobs.stop()
+    media_derivatives.shutdown()
+    structured_logging.stop()
+    return 0
+
+
+def cmd_seed(args: argparse.Namespace) -> int:
+    from .database import SessionLocal
+    from .seed import seed
+
+    db = SessionLocal()
+    try:
+        counts = seed(db, users=args.users)
+    finally:
+        db.close()
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    return 0
+
+
+def cmd_check_budgets(args: argparse.Namespace) -> int:
+    # DATABASE_URL harus diset sebelum modul app diimport karena engine dibuat saat import
+    workdir = tempfile.mkdtemp(prefix="kanapp-budget-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'budget.db')}"
+    # upload-media menulis ke ./uploads (dan ./uploads_partial); jalankan di direktori sementara agar tidak mengotori checkout
+    os.chdir(workdir)
+    # Hanya query di dalam request yang dihitung; job yang diantrekan skenario tidak perlu dijalankan
+    os.environ.setdefault("JOBS_WORKER_THREADS", "0")
+    # Baris akses per skenario hanya menenggelamkan laporan kegagalan
+    os.environ.setdefault("LOG_ACCESS", "0")
+
+    from . import budget_check
+    from .database import SessionLocal, engine
+    from .main import app
+    from .preflight import run_migrations
+    from .seed import seed
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    run_migrations(engine)
+    db = SessionLocal()
+    try:
+        seed(db, users=args.users)
+        failures = budget_check.run(app, db)
+    finally:
+        db.close()
+    for failure in failures:
+        print(failure)
+    print(f"{len(budget_check.SCENARIOS)} skenario, {len(failures)} kegagalan")
+    return 1 if failures else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="Buat tabel dan direktori uploads sebelum worker dijalankan")
+    migrate.set_defaults(func=cmd_migrate)
+
+    prune_logs = subparsers.add_parser(
+        "prune-logs",
+        help="Arsipkan/hapus activity_logs di luar ACTIVITY_LOG_RETENTION_DAYS dan siapkan partisi berikutnya",
+    )
+    prune_logs.set_defaults(func=cmd_prune_logs)
+
+    archive_messages = subparsers.add_parser(
+        "archive-messages",
+        help="Pindahkan pesan yang lebih tua dari MESSAGE_ARCHIVE_DAYS ke segmen arsip di MESSAGE_ARCHIVE_DIR",
+    )
+    archive_messages.set_defaults(func=cmd_archive_messages)
+
+    prune_uploads = subparsers.add_parser(
+        "prune-uploads", help="Hapus upload bertahap yang belum di-finalize setelah RESUMABLE_UPLOAD_TTL"
+    )
+    prune_uploads.set_defaults(func=cmd_prune_uploads)
+
+    prune_idempotency_keys = subparsers.add_parser(
+        "prune-idempotency-keys", help="Hapus Idempotency-Key yang lebih tua dari IDEMPOTENCY_TTL_HOURS"
+    )
+    prune_idempotency_keys.set_defaults(func=cmd_prune_idempotency_keys)
+
+    prune_refresh_tokens = subparsers.add_parser(
+        "prune-refresh-tokens", help="Hapus catatan refresh token yang sudah kedaluwarsa"
+    )
+    prune_refresh_tokens.set_defaults(func=cmd_prune_refresh_tokens)
+
+    run_jobs = subparsers.add_parser("run-jobs", help="Jalankan runner job latar (lihat app/jobs.py) sampai dihentikan")
+    run_jobs.add_argument("--threads", type=int, default=4)
+    run_jobs.set_defaults(func=cmd_run_jobs)
+
+    seed = subparsers.add_parser("seed", help="Isi database dengan data contoh berukuran realistis")
+    seed.add_argument("--users", type=int, default=100)
+    seed.set_defaults(func=cmd_seed)
+
+    check_budgets = subparsers.add_parser(
+        "check-budgets",
+        help="Panggil setiap route terhadap database ter-seed dan gagal jika ada yang melampaui @query_budget",
+    )
+    check_budgets.add_argument("--database-url", help="Database kosong untuk pengujian (default: SQLite sementara)")
+    check_budgets.add_argument("--users", type=int, default=100)
+    check_budgets.set_defaults(func=cmd_check_budgets)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
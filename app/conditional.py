@@ -0,0 +1,43 @@
+# app/conditional.py
+#
+# Conditional GET: ETag dibangun dari cap versi murah (users.version, chats.updated_at, jumlah
+# peserta) yang dibaca dengan satu query agregat, sehingga If-None-Match yang cocok bisa dijawab
+# 304 sebelum baris dimuat atau diserialisasi.
+
+import hashlib
+from typing import Dict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# private: respons bergantung pada token; no-cache: klien wajib revalidasi (murah lewat 304)
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Perbandingan lemah (RFC 9110 13.1.2): prefix W/ diabaikan
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -0,0 +1,138 @@
+# app/data_query.py
+#
+# Filter, urutan, dan pagination keyset untuk GET /data_entries/:
+#   ?filter=int_field1:gte:10&filter=string_field1:prefix:Jak&sort=-int_field2&limit=50
+#   ?...&cursor=<next_cursor dari halaman sebelumnya>
+# - Operator: eq, lt, lte, gt, gte untuk semua kolom di FIELDS, prefix untuk kolom string.
+#   Beberapa filter digabung dengan AND.
+# - Urutan: satu kolom (awalan "-" = menurun) dengan id sebagai pemutus seri. Halaman berikutnya
+#   dilanjutkan dari (nilai, id) baris terakhir, bukan OFFSET, sehingga biayanya sama untuk halaman
+#   mana pun dan tidak ada baris yang terlewat/terulang saat data berubah di antara halaman.
+# - String dibandingkan dan diurutkan per code point (collation "C" di PostgreSQL, BINARY di SQLite),
+#   sehingga prefix menjadi range yang bisa memakai index.
+# Index (owner_id, kolom, id) untuk baris yang belum dihapus didefinisikan di models.DataEntry.
+
+import base64
+import json
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+from . import models
+
+FIELDS = {
+    "id": int,
+    **{f"int_field{k}": int for k in range(1, 9)},
+    **{f"string_field{k}": str for k in range(1, 4)},
+}
+OPERATORS = ("eq", "lt", "lte", "gt", "gte", "prefix")
+MAX_FILTERS = 8
+# Batas atas range prefix: karakter Unicode terbesar, sehingga "abc" <= x < "abc\U0010ffff"
+PREFIX_END = "\U0010ffff"
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Filter(NamedTuple):
+    field: str
+    operator: str
+    value: Any
+
+
+class Sort(NamedTuple):
+    field: str
+    descending: bool
+
+    def __str__(self) -> str:
+        return f"-{self.field}" if self.descending else self.field
+
+
+def _convert(field: str, raw: str) -> Any:
+    if FIELDS[field] is int:
+        try:
+            return int(raw)
+        except ValueError:
+            raise QueryError(f"{field} harus bilangan bulat: {raw!r}")
+    return raw
+
+
+def parse_filters(values: Optional[List[str]]) -> List[Filter]:
+    filters = []
+    for value in values or []:
+        field, _, rest = value.partition(":")
+        operator, _, raw = rest.partition(":")
+        if field not in FIELDS:
+            raise QueryError(f"Filter tidak dikenal: {field!r} (kolom: {', '.join(FIELDS)})")
+        if operator not in OPERATORS:
+            raise QueryError(f"Operator tidak dikenal: {operator!r} (operator: {', '.join(OPERATORS)})")
+        if operator == "prefix" and FIELDS[field] is not str:
+            raise QueryError(f"prefix hanya untuk kolom string, bukan {field}")
+        filters.append(Filter(field, operator, _convert(field, raw)))
+    if len(filters) > MAX_FILTERS:
+        raise QueryError(f"Maksimal {MAX_FILTERS} filter")
+    return filters
+
+
+def parse_sort(value: str) -> Sort:
+    descending = value.startswith("-")
+    field = value[1:] if descending else value
+    if field not in FIELDS:
+        raise QueryError(f"Urutan tidak dikenal: {value!r} (kolom: {', '.join(FIELDS)})")
+    return Sort(field, descending)
+
+
+def encode_cursor(sort: Sort, row) -> str:
+    payload = json.dumps([str(sort), getattr(row, sort.field), row.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort: Sort, cursor: str) -> Tuple[Any, int]:
+    try:
+        spec, value, last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise QueryError("cursor tidak valid")
+    if spec != str(sort):
+        raise QueryError("cursor berasal dari urutan lain; mulai lagi tanpa cursor")
+    if not isinstance(value, FIELDS[sort.field]) or not isinstance(last_id, int):
+        raise QueryError("cursor tidak valid")
+    return value, last_id
+
+
+def _column(field: str, dialect: str):
+    column = getattr(models.DataEntry, field)
+    if FIELDS[field] is str and dialect == "postgresql":
+        # Harus sama dengan ekspresi index agar index terpakai
+        column = column.collate("C")
+    return column
+
+
+def apply(query: Query, dialect: str, filters: List[Filter], sort: Sort, cursor: Optional[str]) -> Query:
+    """
+    Menambahkan filter, urutan, dan posisi cursor ke query data entry milik satu pemilik.
+    """
+    for item in filters:
+        column = _column(item.field, dialect)
+        if item.operator == "eq":
+            query = query.filter(column == item.value)
+        elif item.operator == "lt":
+            query = query.filter(column < item.value)
+        elif item.operator == "lte":
+            query = query.filter(column <= item.value)
+        elif item.operator == "gt":
+            query = query.filter(column > item.value)
+        elif item.operator == "gte":
+            query = query.filter(column >= item.value)
+        else:
+            query = query.filter(column >= item.value, column < item.value + PREFIX_END)
+
+    # id unik, jadi cukup sebagai kunci urutan sendiri; kolom lain ditambah id sebagai pemutus seri
+    keys = [models.DataEntry.id] if sort.field == "id" else [_column(sort.field, dialect), models.DataEntry.id]
+    if cursor is not None:
+        value, last_id = decode_cursor(sort, cursor)
+        position = tuple_(*keys)
+        after = (last_id,) if sort.field == "id" else (value, last_id)
+        query = query.filter(position < after if sort.descending else position > after)
+    return query.order_by(*[key.desc() if sort.descending else key for key in keys])
@@ -0,0 +1,54 @@
+# app/data_sync.py
+#
+# Sinkronisasi inkremental data entry untuk aplikasi lapangan. Setiap create/update/delete
+# memberi baris versi baru dari clock milik pemiliknya (tabel data_entry_clocks), dan delete hanya
+# menandai deleted_at (tombstone). Klien menyimpan `next_since` dari respons terakhir lalu memanggil
+# GET /data_entries/changes?since=<next_since>; query membaca index (owner_id, version) sehingga
+# biayanya sebanding jumlah perubahan, bukan jumlah seluruh data klien.
+#
+# Upsert clock mengunci baris clock pemilik sampai commit: penulisan berikutnya menunggu, sehingga
+# versi yang lebih kecil selalu sudah ter-commit saat versi yang lebih besar terlihat dan klien
+# tidak pernah melewatkan perubahan.
+
+from datetime import datetime
+from typing import List, Tuple
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+
+CHANGES_MAX_LIMIT = 1000
+
+
+def next_version(db: Session, owner_id: int) -> int:
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    clock = models.DataEntryClock
+    statement = insert(clock).values(owner_id=owner_id, version=1).on_conflict_do_update(
+        index_elements=[clock.owner_id],
+        set_={"version": clock.version + 1},
+    ).returning(clock.version)
+    return db.execute(statement).scalar_one()
+
+
+def touch(db: Session, entry: models.DataEntry) -> None:
+    entry.version = next_version(db, entry.owner_id)
+    entry.updated_at = datetime.utcnow()
+
+
+def soft_delete(db: Session, entry: models.DataEntry) -> None:
+    touch(db, entry)
+    entry.deleted_at = entry.updated_at
+
+
+def changes(db: Session, owner_id: int, since: int, limit: int, columns: list) -> Tuple[List, int, bool]:
+    """
+    Mengembalikan (baris yang berubah setelah `since` terurut menurut versi, next_since, has_more).
+    """
+    rows = db.query(*columns).filter(
+        models.DataEntry.owner_id == owner_id,
+        models.DataEntry.version > since,
+    ).order_by(models.DataEntry.version).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1].version if rows else since), has_more
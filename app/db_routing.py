@@ -0,0 +1,179 @@
+# app/db_routing.py
+#
+# Routing baca ke replika (DATABASE_REPLICA_URLS):
+# - Hanya endpoint bertanda @read_only yang mendapat replika; penulisan di dalamnya (activity log,
+#   tanda terbaca) tetap ke primary lewat RoutingSession.
+#   Endpoint publik yang cache-nya diinvalidasi saat commit sengaja tidak ditandai: bacaan dari
+#   replika yang tertinggal tepat setelah invalidasi akan mengisi cache dengan data lama.
+# - Replika dicek paling lama setiap DB_REPLICA_CHECK_INTERVAL detik: tidak bisa dihubungi atau lag
+#   melebihi DB_REPLICA_MAX_LAG detik berarti request dibaca dari primary sampai cek berikutnya.
+# - Read-your-writes: setelah request klien meng-commit, request klien itu dibaca dari primary selama
+#   DB_REPLICA_STICKY_SECONDS. Dicatat di cookie db_last_write (berlaku di semua worker) dan di memori
+#   worker per subject token (untuk klien yang tidak menyimpan cookie).
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .database import replica_engines
+
+logger = logging.getLogger(__name__)
+
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", 10))
+# Query lag (detik) kustom, mis. dari tabel heartbeat; default PostgreSQL memakai posisi replay WAL
+DB_REPLICA_LAG_QUERY = os.getenv("DB_REPLICA_LAG_QUERY")
+POSTGRES_LAG_QUERY = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+STICKY_COOKIE = "db_last_write"
+STICKY_MAX_CLIENTS = 10000
+
+
+def read_only(func):
+    """
+    Menandai endpoint yang boleh membaca dari replika. Letakkan di bawah dekorator route.
+    """
+    func.__read_only__ = True
+    return func
+
+
+class _Replica:
+    __slots__ = ("engine", "healthy", "lag", "checked_at", "lock")
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.healthy = False
+        self.lag = None
+        self.checked_at = float("-inf")
+        self.lock = threading.Lock()
+
+    def refresh(self, now: float) -> None:
+        # Satu thread yang mengecek; thread lain memakai status terakhir tanpa menunggu
+        if now - self.checked_at < DB_REPLICA_CHECK_INTERVAL or not self.lock.acquire(blocking=False):
+            return
+        try:
+            query = DB_REPLICA_LAG_QUERY or (POSTGRES_LAG_QUERY if self.engine.dialect.name == "postgresql" else "SELECT 0")
+            with self.engine.connect() as conn:
+                self.lag = float(conn.execute(text(query)).scalar() or 0)
+            healthy = self.lag <= DB_REPLICA_MAX_LAG
+            if healthy != self.healthy:
+                logger.warning("Replika %s %s (lag %.1f s)", self.engine.url.host or self.engine.url.database,
+                               "dipakai lagi" if healthy else "tertinggal", self.lag)
+            self.healthy = healthy
+        except Exception as exc:
+            if self.healthy or self.checked_at == float("-inf"):
+                logger.warning("Replika %s tidak tersedia: %s", self.engine.url.host or self.engine.url.database, exc)
+            self.healthy = False
+            self.lag = None
+        finally:
+            self.checked_at = time.monotonic()
+            self.lock.release()
+
+    def mark_down(self) -> None:
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+_replicas: List[_Replica] = [_Replica(engine) for engine in replica_engines]
+_round_robin = itertools.count()
+_recent_writes: "OrderedDict[str, float]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def choose_replica() -> Optional[Engine]:
+    if not _replicas:
+        return None
+    now = time.monotonic()
+    start = next(_round_robin)
+    for i in range(len(_replicas)):
+        replica = _replicas[(start + i) % len(_replicas)]
+        replica.refresh(now)
+        if replica.healthy:
+            return replica.engine
+    return None
+
+
+def mark_down(engine: Engine) -> None:
+    # Dipanggil saat query ke replika gagal di tengah request; request berikutnya ke primary
+    for replica in _replicas:
+        if replica.engine is engine:
+            replica.mark_down()
+
+
+def _client(request: Request) -> Optional[str]:
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        return None
+    # Import di sini: admission -> auth -> dependencies -> modul ini
+    from .admission import client_key
+    return client_key(credentials)
+
+
+def _is_sticky(request: Request) -> bool:
+    cutoff = time.time() - DB_REPLICA_STICKY_SECONDS
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > cutoff:
+            return True
+    except ValueError:
+        pass
+    client = _client(request)
+    return client is not None and _recent_writes.get(client, 0) > cutoff
+
+
+def replica_for(request: Request) -> Optional[Engine]:
+    if not _replicas or not getattr(request.scope.get("endpoint"), "__read_only__", False):
+        return None
+    if _is_sticky(request):
+        return None
+    return choose_replica()
+
+
+def record_write(request: Request) -> None:
+    if not _replicas:
+        return
+    now = time.time()
+    request.state.db_last_write = now
+    client = _client(request)
+    if client is None:
+        return
+    with _recent_lock:
+        _recent_writes[client] = now
+        _recent_writes.move_to_end(client)
+        while len(_recent_writes) > STICKY_MAX_CLIENTS:
+            _recent_writes.popitem(last=False)
+
+
+class StickinessMiddleware:
+    """
+    Menambahkan cookie db_last_write pada respons request yang meng-commit (lihat record_write).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                written = scope.get("state", {}).get("db_last_write")
+                if written is not None:
+                    cookie = (f"{STICKY_COOKIE}={written:.3f}; Max-Age={int(DB_REPLICA_STICKY_SECONDS)}; "
+                              "Path=/; HttpOnly; SameSite=Lax")
+                    message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,12 +1,68 @@
 # app/dependencies.py
 
 from .database import SessionLocal
+from . import db_routing
+from .models import ActivityLog, Job
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import Session
-from fastapi import Depends
+from fastapi import Depends, Request
 
-def get_db() -> Session:
+# Unit of work per request: handler dan log_activity hanya flush; get_db melakukan satu commit
+# setelah handler selesai (atau rollback jika handler melempar exception), sehingga tidak ada
+# state setengah jadi dan request tulis hanya membayar satu commit. Request yang tidak menulis
+# apa pun tidak di-commit sama sekali.
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_written(session, flush_context):
+    session.info["written"] = True
+
+@event.listens_for(SessionLocal, "before_flush")
+def _mark_visible_write(session, flush_context, instances):
+    # Activity log dan job antrean tidak dibaca balik oleh klien; penulisan lain membuat klien membaca
+    # dari primary selama beberapa detik (read-your-writes, lihat db_routing)
+    if session.dirty or session.deleted or any(not isinstance(obj, (ActivityLog, Job)) for obj in session.new):
+        session.info["sticky"] = True
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    # UPDATE/DELETE massal lewat query().update() tidak melewati flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["written"] = True
+        orm_execute_state.session.info["sticky"] = True
+
+def on_commit(db: Session, callback) -> None:
+    """
+    Menjalankan callback setelah transaksi request berhasil di-commit, misalnya invalidasi cache
+    yang tidak boleh terjadi sebelum data baru terlihat oleh request lain.
+    """
+    db.info.setdefault("on_commit", []).append(callback)
+
+def discard(db: Session) -> None:
+    """
+    Membatalkan seluruh penulisan request: rollback, lalu get_db tidak commit dan callback on_commit dibuang.
+    """
+    db.rollback()
+    for name in ("written", "sticky", "on_commit"):
+        db.info.pop(name, None)
+
+def get_db(request: Request) -> Session:
     db = SessionLocal()
+    # Route @read_only membaca dari replika yang sehat (None = primary); lihat db_routing
+    replica = db_routing.replica_for(request)
+    db.info["replica"] = replica
     try:
         yield db
+        if db.info.pop("written", False):
+            db.commit()
+            if db.info.pop("sticky", False):
+                db_routing.record_write(request)
+            for callback in db.info.pop("on_commit", []):
+                callback()
+    except Exception as exc:
+        db.rollback()
+        if replica is not None and isinstance(exc, DBAPIError) and exc.connection_invalidated:
+            db_routing.mark_down(replica)
+        raise
     finally:
         db.close()
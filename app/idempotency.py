@@ -0,0 +1,137 @@
+# app/idempotency.py
+#
+# Header Idempotency-Key untuk endpoint POST yang membuat data (POST /messages, /data_entries/,
+# /reports/). Klien mobile yang mengulang request setelah timeout mengirim key yang sama dan
+# menerima respons asli (dengan header Idempotent-Replayed: true) tanpa penulisan kedua:
+#
+#   idempotent = idempotency.Idempotency(db, current_user.id, "POST /messages", idempotency_key, request)
+#   replay = idempotent.replay()
+#   if replay is not None:
+#       return replay
+#   ...
+#   return idempotent.remember(envelope)
+#
+# - Hasil disimpan di tabel idempotency_keys dalam transaksi yang sama dengan penulisannya, jadi
+#   berlaku di semua worker. Constraint unik (user_id, key) membuat request kembar yang berjalan
+#   bersamaan menunggu yang pertama lalu mengembalikan hasilnya.
+# - Setiap worker menyimpan IDEMPOTENCY_CACHE_SIZE hasil terbaru di memori; retry yang kembali ke
+#   worker yang sama dijawab tanpa query.
+# - Key yang sama dengan body berbeda ditolak dengan 422. Hanya respons sukses yang disimpan.
+# - Key disimpan minimal IDEMPOTENCY_TTL_HOURS jam; `python -m app.cli prune-idempotency-keys`
+#   menghapus yang lebih lama.
+# Request tanpa header tidak membayar apa pun.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .dependencies import discard, on_commit
+from .models import IdempotencyKey
+from .serializers import JSONBytesResponse, render
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# (user_id, key) -> (scope, hash request, status, body)
+_lock = threading.Lock()
+_recent: "OrderedDict[Tuple[int, str], Tuple[str, str, int, bytes]]" = OrderedDict()
+
+
+def _remember_locally(user_id: int, key: str, entry: Tuple[str, str, int, bytes]) -> None:
+    with _lock:
+        _recent[(user_id, key)] = entry
+        _recent.move_to_end((user_id, key))
+        while len(_recent) > IDEMPOTENCY_CACHE_SIZE:
+            _recent.popitem(last=False)
+
+
+class Idempotency:
+    def __init__(self, db: Session, user_id: int, scope: str, key: Optional[str], request: BaseModel):
+        if key is not None and not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key harus 1-{IDEMPOTENCY_KEY_MAX_LENGTH} karakter")
+        self.db = db
+        self.user_id = user_id
+        self.scope = scope
+        self.key = key
+        self.request_hash = (
+            hashlib.blake2b(request.__pydantic_serializer__.to_json(request), digest_size=16).hexdigest()
+            if key is not None else None
+        )
+
+    def _response(self, entry: Tuple[str, str, int, bytes]) -> Response:
+        scope, request_hash, status_code, body = entry
+        if scope != self.scope or request_hash != self.request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key sudah dipakai untuk request yang berbeda")
+        return JSONBytesResponse(content=body, status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+    def _stored(self) -> Optional[Tuple[str, str, int, bytes]]:
+        with _lock:
+            entry = _recent.get((self.user_id, self.key))
+        if entry is not None:
+            return entry
+        row = self.db.execute(
+            select(IdempotencyKey.scope, IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response)
+            .where(IdempotencyKey.user_id == self.user_id, IdempotencyKey.key == self.key)
+        ).first()
+        if row is None:
+            return None
+        entry = (row.scope, row.request_hash, row.status_code, row.response.encode())
+        _remember_locally(self.user_id, self.key, entry)
+        return entry
+
+    def replay(self) -> Optional[Response]:
+        """
+        Respons tersimpan untuk key ini, atau None jika request harus dijalankan.
+        """
+        if self.key is None:
+            return None
+        entry = self._stored()
+        return self._response(entry) if entry is not None else None
+
+    def remember(self, envelope: BaseModel, status_code: int = 200) -> Response:
+        """
+        Menyimpan hasil bersama penulisan request ini dan mengembalikannya sebagai Response.
+        """
+        response = render(envelope, status_code=status_code)
+        if self.key is None:
+            return response
+        entry = (self.scope, self.request_hash, status_code, response.body)
+        self.db.add(IdempotencyKey(
+            user_id=self.user_id,
+            key=self.key,
+            scope=self.scope,
+            request_hash=self.request_hash,
+            status_code=status_code,
+            response=response.body.decode(),
+        ))
+        try:
+            self.db.flush()
+        except IntegrityError:
+            # Request kembar dengan key yang sama sudah commit lebih dulu: penulisan ini dibatalkan
+            discard(self.db)
+            entry = self._stored()
+            if entry is None:
+                raise
+            return self._response(entry)
+        on_commit(self.db, lambda: _remember_locally(self.user_id, self.key, entry))
+        return response
+
+
+def prune(db: Session, now: Optional[datetime] = None) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    deleted = db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
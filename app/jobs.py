@@ -0,0 +1,288 @@
+# app/jobs.py
+#
+# Job latar belakang yang disimpan di tabel jobs, agar request bisa menyerahkan pekerjaan lambat
+# (tanda terbaca, turunan gambar, ...) dan langsung menjawab:
+#
+#   @jobs.handler("chat.mark_read", concurrency=2)
+#   def mark_read(db, payload): ...
+#
+#   jobs.enqueue(db, "chat.mark_read", {"chat_id": ...})   # ikut di-commit bersama request
+#   jobs.enqueue(db, "chat.mark_read", {...}, key="...")   # dilewati jika job yang sama masih antre
+#
+# Runner menjalankan JOBS_WORKER_THREADS thread di setiap worker aplikasi (dimulai dari lifespan),
+# atau di proses terpisah lewat `python -m app.cli run-jobs` (set JOBS_WORKER_THREADS=0 di worker web).
+# - Klaim job memakai UPDATE bersyarat status='queued' (ditambah FOR UPDATE SKIP LOCKED di PostgreSQL),
+#   sehingga beberapa runner di beberapa proses/host aman berjalan bersamaan.
+# - Batas concurrency per tipe berlaku per runner.
+# - Handler menerima sesi sendiri; pekerjaan dan status selesai di-commit dalam satu transaksi.
+#   Exception membuat job dijadwalkan ulang dengan backoff eksponensial sampai max_attempts, lalu failed.
+# - Job berstatus running lebih lama dari JOBS_LOCK_TIMEOUT (runner mati) diantrekan ulang, jadi
+#   handler harus idempoten.
+# - Job done/failed dihapus setelah JOBS_RETENTION_HOURS.
+
+import importlib
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .dependencies import on_commit
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOBS_WORKER_THREADS = int(os.getenv("JOBS_WORKER_THREADS", 2))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", 1))
+JOBS_LOCK_TIMEOUT = int(os.getenv("JOBS_LOCK_TIMEOUT", 600))
+JOBS_BACKOFF_BASE = float(os.getenv("JOBS_BACKOFF_BASE", 5))
+JOBS_BACKOFF_MAX = float(os.getenv("JOBS_BACKOFF_MAX", 3600))
+JOBS_RETENTION_HOURS = int(os.getenv("JOBS_RETENTION_HOURS", 7 * 24))
+MAINTENANCE_INTERVAL = 60
+
+# Modul yang mendaftarkan handler; di-import saat runner dimulai
+HANDLER_MODULES = ("app.chat_routes", "app.media_service")
+
+
+class JobType:
+    __slots__ = ("name", "func", "concurrency", "max_attempts")
+
+    def __init__(self, name: str, func: Callable[[Session, dict], Any], concurrency: int, max_attempts: int):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+
+_registry: Dict[str, JobType] = {}
+_wakeup = threading.Event()
+
+
+def handler(name: str, concurrency: int = 1, max_attempts: int = 5):
+    """
+    Mendaftarkan fungsi `func(db, payload)` sebagai handler tipe job `name`. Nilai kembaliannya
+    (harus bisa di-JSON-kan) disimpan di kolom result.
+    """
+    def decorator(func):
+        _registry[name] = JobType(name, func, concurrency, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(db: Session, job_type: str, payload: Optional[dict] = None, delay: float = 0,
+            key: Optional[str] = None) -> Optional[Job]:
+    """
+    Menambahkan job ke transaksi `db`; job baru terlihat oleh runner setelah commit.
+    Dengan `key`, tidak ada yang ditambahkan (None) selama job bertipe sama dengan key itu masih antre.
+    Dua request bersamaan masih bisa sama-sama menambah job, jadi handler tetap harus idempoten.
+    """
+    if key is not None and db.execute(
+        select(Job.id).where(Job.type == job_type, Job.dedupe_key == key, Job.status == "queued").limit(1)
+    ).first():
+        return None
+    job = Job(
+        type=job_type,
+        payload=json.dumps(payload or {}),
+        dedupe_key=key,
+        max_attempts=_registry[job_type].max_attempts if job_type in _registry else 5,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.add(job)
+    db.flush()
+    # Runner di worker ini langsung bangun tanpa menunggu JOBS_POLL_INTERVAL
+    on_commit(db, _wakeup.set)
+    return job
+
+
+def backoff(attempts: int) -> float:
+    # 5 s, 10 s, 20 s, ... dengan jitter agar job yang gagal bersamaan tidak kembali bersamaan
+    delay = min(JOBS_BACKOFF_MAX, JOBS_BACKOFF_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def load_handlers() -> None:
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+class Runner:
+    def __init__(self, threads: int):
+        self.threads = threads
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.running: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.maintained_at = float("-inf")
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        load_handlers()
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._loop, name=f"jobs-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Runner job %s: %d thread, tipe %s", self.worker_id, self.threads, ", ".join(sorted(_registry)))
+
+    def stop(self, timeout: float = 30) -> None:
+        # Job yang sedang berjalan diselesaikan; yang belum diklaim tetap antre di database
+        self.stopping.set()
+        _wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+    def _loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                self._maintain()
+                job = self._claim()
+            except Exception:
+                logger.exception("Gagal mengambil job")
+                job = None
+            if job is None:
+                _wakeup.wait(JOBS_POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+            try:
+                self._run(*job)
+            except Exception:
+                # Mis. database tidak bisa dihubungi saat mencatat kegagalan; job diambil lagi oleh _maintain
+                logger.exception("Gagal menjalankan job %s #%d", job[1], job[0])
+
+    def _available_types(self) -> List[str]:
+        with self.lock:
+            return [name for name, job_type in _registry.items() if self.running.get(name, 0) < job_type.concurrency]
+
+    def _claim(self) -> Optional[tuple]:
+        types = self._available_types()
+        if not types:
+            return None
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            candidates = db.execute(
+                select(Job.id, Job.type)
+                .where(Job.status == "queued", Job.run_at <= now, Job.type.in_(types))
+                .order_by(Job.run_at)
+                .limit(len(types))
+                .with_for_update(skip_locked=True)
+            ).all()
+            for job_id, job_type in candidates:
+                with self.lock:
+                    if self.running.get(job_type, 0) >= _registry[job_type].concurrency:
+                        continue
+                    self.running[job_type] = self.running.get(job_type, 0) + 1
+                claimed = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", locked_by=self.worker_id, locked_at=now, attempts=Job.attempts + 1)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if claimed:
+                    payload, attempts = db.execute(select(Job.payload, Job.attempts).where(Job.id == job_id)).one()
+                    db.commit()
+                    return job_id, job_type, json.loads(payload), attempts
+                # Diklaim runner lain di antara SELECT dan UPDATE
+                self._release(job_type)
+            db.commit()
+        return None
+
+    def _release(self, job_type: str) -> None:
+        with self.lock:
+            self.running[job_type] -= 1
+
+    def _run(self, job_id: int, job_type: str, payload: dict, attempts: int) -> None:
+        started = time.perf_counter()
+        try:
+            with SessionLocal() as db:
+                try:
+                    result = _registry[job_type].func(db, payload)
+                    db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.locked_by == self.worker_id)
+                        .values(status="done", finished_at=datetime.utcnow(), last_error=None,
+                                result=json.dumps(result) if result is not None else None)
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.commit()
+                except Exception as exc:
+                    db.rollback()
+                    self._fail(db, job_id, job_type, attempts, exc)
+                    return
+            logger.debug("Job %s #%d selesai dalam %.1f ms", job_type, job_id, (time.perf_counter() - started) * 1000)
+        finally:
+            self._release(job_type)
+
+    def _fail(self, db: Session, job_id: int, job_type: str, attempts: int, exc: Exception) -> None:
+        final = attempts >= _registry[job_type].max_attempts
+        if final:
+            logger.error("Job %s #%d gagal permanen setelah %d percobaan: %r", job_type, job_id, attempts, exc)
+            values = {"status": "failed", "finished_at": datetime.utcnow()}
+        else:
+            delay = backoff(attempts)
+            logger.warning("Job %s #%d gagal (percobaan %d), dicoba lagi dalam %.1f s: %r", job_type, job_id, attempts, delay, exc)
+            values = {"status": "queued", "run_at": datetime.utcnow() + timedelta(seconds=delay)}
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.locked_by == self.worker_id)
+            .values(locked_by=None, locked_at=None, last_error=repr(exc)[:2000], **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    def _maintain(self) -> None:
+        # Satu thread per MAINTENANCE_INTERVAL: antrekan ulang job milik runner yang mati, hapus job lama
+        now = time.monotonic()
+        with self.lock:
+            if now - self.maintained_at < MAINTENANCE_INTERVAL:
+                return
+            self.maintained_at = now
+        utcnow = datetime.utcnow()
+        stale = utcnow - timedelta(seconds=JOBS_LOCK_TIMEOUT)
+        with SessionLocal() as db:
+            running_stale = (Job.status == "running", Job.locked_at < stale)
+            failed = db.execute(
+                update(Job).where(*running_stale, Job.attempts >= Job.max_attempts)
+                .values(status="failed", finished_at=utcnow, locked_by=None, last_error="Runner berhenti saat job berjalan")
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            requeued = db.execute(
+                update(Job).where(*running_stale)
+                .values(status="queued", run_at=utcnow, locked_by=None, locked_at=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            pruned = db.execute(
+                delete(Job).where(Job.status.in_(("done", "failed")),
+                                  Job.finished_at < utcnow - timedelta(hours=JOBS_RETENTION_HOURS))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+        if failed or requeued or pruned:
+            logger.info("Job: %d diantrekan ulang, %d gagal (runner mati), %d dihapus", requeued, failed, pruned)
+
+
+_runner: Optional[Runner] = None
+
+
+def start(threads: int = JOBS_WORKER_THREADS) -> Optional[Runner]:
+    global _runner
+    if threads <= 0 or _runner is not None:
+        return _runner
+    _runner = Runner(threads)
+    _runner.start()
+    return _runner
+
+
+def stop() -> None:
+    global _runner
+    if _runner is not None:
+        _runner.stop()
+        _runner = None
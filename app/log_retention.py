@@ -0,0 +1,266 @@
+# app/log_retention.py
+#
+# Partisi bulanan dan retensi untuk tabel activity_logs.
+#
+# Di PostgreSQL, activity_logs adalah tabel induk `PARTITION BY RANGE (timestamp)` dengan satu
+# partisi per bulan (activity_logs_YYYYMM) ditambah partisi DEFAULT (activity_logs_default) yang
+# menampung baris di luar bulan yang sudah dibuat, sehingga insert tetap berhasil walaupun
+# `prune-logs` terlambat dijalankan. Run berikutnya memindahkan baris itu ke partisi bulannya. Retensi cukup men-DROP partisi yang seluruhnya lebih
+# tua dari jendela retensi, setelah (opsional) diarsipkan ke file NDJSON terkompresi gzip.
+# Di database lain (SQLite untuk pengembangan) retensi dilakukan dengan DELETE biasa.
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+# 0 berarti log disimpan selamanya
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", 90))
+# Jika kosong, partisi lama langsung dihapus tanpa arsip
+ACTIVITY_LOG_ARCHIVE_DIR = os.getenv("ACTIVITY_LOG_ARCHIVE_DIR")
+# Jumlah partisi bulan depan yang dibuat lebih awal agar insert tidak pernah gagal
+ACTIVITY_LOG_PARTITIONS_AHEAD = int(os.getenv("ACTIVITY_LOG_PARTITIONS_AHEAD", 3))
+
+TABLE_NAME = ActivityLog.__tablename__
+SEQUENCE_NAME = f"{TABLE_NAME}_id_seq"
+DEFAULT_SUFFIX = "_default"
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Batas bawah timestamp yang masih berada di dalam jendela retensi, atau None jika
+    retensi dimatikan. Dipakai juga sebagai filter query agar partisi lama dipangkas.
+    """
+    if ACTIVITY_LOG_RETENTION_DAYS <= 0:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=ACTIVITY_LOG_RETENTION_DAYS)
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{TABLE_NAME}_{month.year:04d}{month.month:02d}"
+
+
+def is_postgres(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def _is_partitioned(conn: Connection, name: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)"),
+        {"name": name},
+    ).first() is not None
+
+
+def _create_parent_table(conn: Connection, name: str) -> None:
+    # Primary key partisi wajib memuat kolom partisi, sehingga PK di database adalah (id, timestamp).
+    # ORM tetap memetakan `id` sebagai identitas karena nilainya unik dari sequence.
+    conn.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME}"))
+    conn.execute(text(f"""
+        CREATE TABLE {name} (
+            id INTEGER NOT NULL DEFAULT nextval('{SEQUENCE_NAME}'),
+            action VARCHAR NOT NULL,
+            "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            user_id INTEGER REFERENCES users (id),
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    """))
+    conn.execute(text(f"ALTER SEQUENCE {SEQUENCE_NAME} OWNED BY {name}.id"))
+
+
+def _create_default_partition(conn: Connection, parent: str) -> None:
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {parent}{DEFAULT_SUFFIX} PARTITION OF {parent} DEFAULT"))
+
+
+def _create_partition(conn: Connection, parent: str, month: datetime) -> None:
+    name = partition_name(month)
+    if _table_exists(conn, name):
+        return
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+    default = f"{parent}{DEFAULT_SUFFIX}"
+    in_range = f"\"timestamp\" >= '{month:%Y-%m-%d}' AND \"timestamp\" < '{add_months(month, 1):%Y-%m-%d}'"
+    if _table_exists(conn, default) and conn.execute(text(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1")).first():
+        # PostgreSQL menolak partisi baru selama partisi DEFAULT masih memuat baris rentangnya:
+        # baris dipindahkan ke tabel bulan itu dulu, lalu tabelnya dipasang sebagai partisi
+        conn.execute(text(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING id, action, \"timestamp\", user_id) "
+            f"INSERT INTO {name} (id, action, \"timestamp\", user_id) SELECT * FROM moved"
+        ))
+        conn.execute(text(f"ALTER TABLE {parent} ATTACH PARTITION {name} {bounds}"))
+        logger.info("Baris %s dipindahkan dari partisi default ke %s", month.strftime("%Y-%m"), name)
+        return
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF {parent} {bounds}"))
+
+
+def ensure_partitions(conn: Connection, parent: str = TABLE_NAME,
+                      start: Optional[datetime] = None, now: Optional[datetime] = None) -> None:
+    current = month_start(now or datetime.utcnow())
+    default = f"{parent}{DEFAULT_SUFFIX}"
+    if start is None and _table_exists(conn, default):
+        # Baris yang masuk ke partisi default (jadwal prune-logs terlewat) dipindahkan ke bulannya
+        start = conn.execute(text(f'SELECT min("timestamp") FROM {default}')).scalar()
+    month = min(month_start(start), current) if start else current
+    last = add_months(current, ACTIVITY_LOG_PARTITIONS_AHEAD)
+    while month <= last:
+        _create_partition(conn, parent, month)
+        month = add_months(month, 1)
+
+
+def _convert_legacy_table(conn: Connection) -> None:
+    # Tabel lama (tidak terpartisi) disalin ke tabel induk baru dalam satu transaksi
+    new_name = f"{TABLE_NAME}_new"
+    oldest = conn.execute(text(f'SELECT min("timestamp") FROM {TABLE_NAME}')).scalar()
+    _create_parent_table(conn, new_name)
+    _create_default_partition(conn, new_name)
+    ensure_partitions(conn, parent=new_name, start=oldest)
+    conn.execute(text(
+        f'INSERT INTO {new_name} (id, action, "timestamp", user_id) '
+        f'SELECT id, action, coalesce("timestamp", now() AT TIME ZONE \'utc\'), user_id FROM {TABLE_NAME}'
+    ))
+    conn.execute(text(f"DROP TABLE {TABLE_NAME}"))
+    conn.execute(text(f"ALTER TABLE {new_name} RENAME TO {TABLE_NAME}"))
+    conn.execute(text(f"ALTER INDEX {new_name}_pkey RENAME TO {TABLE_NAME}_pkey"))
+    conn.execute(text(f"ALTER TABLE {new_name}{DEFAULT_SUFFIX} RENAME TO {TABLE_NAME}{DEFAULT_SUFFIX}"))
+    logger.info("Tabel %s dikonversi menjadi tabel terpartisi", TABLE_NAME)
+
+
+def setup_partitioned_table(engine: Engine) -> None:
+    """
+    Membuat (atau mengonversi) activity_logs menjadi tabel terpartisi bulanan di PostgreSQL,
+    lengkap dengan index dari model dan partisi untuk bulan berjalan serta beberapa bulan ke depan.
+    """
+    with engine.begin() as conn:
+        if not _table_exists(conn, TABLE_NAME):
+            _create_parent_table(conn, TABLE_NAME)
+        elif not _is_partitioned(conn, TABLE_NAME):
+            _convert_legacy_table(conn)
+        # Index pada tabel induk otomatis diturunkan ke setiap partisi
+        for index in ActivityLog.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        _create_default_partition(conn, TABLE_NAME)
+        ensure_partitions(conn)
+
+
+def _archive_path(month: datetime) -> str:
+    return os.path.join(ACTIVITY_LOG_ARCHIVE_DIR, f"{partition_name(month)}.ndjson.gz")
+
+
+def _archive_rows(conn: Connection, month: datetime, query) -> int:
+    """
+    Menulis hasil query ke file arsip bulan tersebut. File ditulis ke path sementara lalu di-rename,
+    sehingga partisi hanya di-drop setelah arsipnya lengkap di disk.
+    """
+    os.makedirs(ACTIVITY_LOG_ARCHIVE_DIR, exist_ok=True)
+    path = _archive_path(month)
+    tmp_path = f"{path}.tmp"
+    count = 0
+    # Mode "ab": pada SQLite satu bulan bisa diarsipkan bertahap; gzip multi-member tetap valid
+    existing = os.path.exists(path)
+    if existing:
+        os.replace(path, tmp_path)
+    rows = conn.execute(query, execution_options={"stream_results": True})
+    with gzip.open(tmp_path, "ab") as archive:
+        for row in rows:
+            archive.write(json.dumps({
+                "id": row.id,
+                "action": row.action,
+                "timestamp": row.timestamp.isoformat(),
+                "user_id": row.user_id,
+            }).encode() + b"\n")
+            count += 1
+    if count == 0 and not existing:
+        os.remove(tmp_path)
+        return 0
+    with open(tmp_path, "rb") as archive_file:
+        os.fsync(archive_file.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def _expired_partitions(conn: Connection, cutoff: datetime) -> List[datetime]:
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:parent)"
+    ), {"parent": TABLE_NAME}).scalars().all()
+    prefix = f"{TABLE_NAME}_"
+    months = []
+    for name in names:
+        suffix = name[len(prefix):]
+        if not (name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit()):
+            continue
+        month = datetime(int(suffix[:4]), int(suffix[4:]), 1)
+        # Partisi hanya dibuang jika seluruh rentangnya sudah di luar jendela retensi
+        if add_months(month, 1) <= cutoff:
+            months.append(month)
+    return sorted(months)
+
+
+def apply_retention(engine: Engine, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+    """
+    Mengarsipkan (jika ACTIVITY_LOG_ARCHIVE_DIR diisi) lalu menghapus log di luar jendela retensi,
+    dan memastikan partisi bulan-bulan berikutnya sudah ada. Aman dijalankan berulang kali.
+    """
+    result = {"dropped": [], "archived": []}
+    cutoff = retention_cutoff(now)
+
+    if is_postgres(engine):
+        with engine.begin() as conn:
+            ensure_partitions(conn, now=now)
+        if cutoff is None:
+            return result
+        with engine.connect() as conn:
+            months = _expired_partitions(conn, cutoff)
+        for month in months:
+            name = partition_name(month)
+            with engine.begin() as conn:
+                if ACTIVITY_LOG_ARCHIVE_DIR:
+                    query = text(f'SELECT id, action, "timestamp", user_id FROM {name} ORDER BY "timestamp"')
+                    count = _archive_rows(conn, month, query)
+                    result["archived"].append(f"{_archive_path(month)} ({count} rows)")
+                conn.execute(text(f"ALTER TABLE {TABLE_NAME} DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            result["dropped"].append(name)
+            logger.info("Partisi %s dihapus (cutoff %s)", name, cutoff.isoformat())
+        return result
+
+    if cutoff is None:
+        return result
+    table = ActivityLog.__table__
+    with engine.begin() as conn:
+        oldest = conn.execute(select(func.min(table.c.timestamp))).scalar()
+        if oldest is None or oldest >= cutoff:
+            return result
+        month = month_start(oldest)
+        while month < cutoff:
+            in_range = (table.c.timestamp >= month) & (table.c.timestamp < min(add_months(month, 1), cutoff))
+            if ACTIVITY_LOG_ARCHIVE_DIR:
+                query = select(table).where(in_range).order_by(table.c.timestamp)
+                count = _archive_rows(conn, month, query)
+                if count:
+                    result["archived"].append(f"{_archive_path(month)} ({count} rows)")
+            if conn.execute(delete(table).where(in_range)).rowcount:
+                result["dropped"].append(partition_name(month))
+            month = add_months(month, 1)
+    return result
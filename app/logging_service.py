@@ -10,8 +10,8 @@ def log_activity(db: Session, log: ActivityLogCreate, user_id: int) -> ActivityL
         user_id=user_id
     )
     db.add(activity_log)
-    db.commit()
-    db.refresh(activity_log)
+    # Flush saja (untuk id dan timestamp); commit dilakukan sekali oleh get_db di akhir request
+    db.flush()
     return ActivityLogResponse(
         id=activity_log.id,
         user_id=activity_log.user_id,
@@ -1,37 +1,100 @@
 # app/main.py
 
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, status
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, status
 from . import models, schemas, auth
-from .database import engine
+from .database import engine, prewarm_pool, replica_engines
 from sqlalchemy.orm import Session
-from .dependencies import get_db
+from .dependencies import get_db, on_commit
 from .logging_service import log_activity
+from .log_retention import retention_cutoff
 from sqlalchemy.exc import IntegrityError
-from datetime import timedelta
+from sqlalchemy.orm.exc import StaleDataError
+import logging
+import os
 import re
 from . import chat_models
 from .chat_routes import router as chat_router
+from .upload_routes import router as upload_router
+from .storage_routes import router as storage_router
+from .presence_routes import router as presence_router
+from .admin_routes import router as admin_router
+from .media_service import UPLOAD_DIR
 from fastapi.staticfiles import StaticFiles
-import os
-# Membuat semua tabel (gunakan Alembic di produksi)
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="User Management API dengan Static Bearer Token dan JWT")
-# Importar modelos de chat
-from .chat_models import Chat, ChatParticipant, Message
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from . import admission, conditional, data_query, data_sync, db_routing, idempotency, jobs, media_derivatives, metrics, passwords, response_cache, serializers, structured_logging
+from .query_budget import query_budget
+from .db_routing import read_only
+
+logger = logging.getLogger(__name__)
+
+# Skema tidak lagi dibuat saat import; jalankan `python -m app.cli migrate` sebelum start gunicorn
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Log JSON lewat thread penulis milik worker ini (setelah fork, lihat structured_logging.py)
+    structured_logging.start()
+    # Buka koneksi pool dan muat backend bcrypt sebelum request pertama masuk
+    connections = prewarm_pool()
+    auth.prewarm_password_context()
+    auth.prewarm_revocations()
+    if jobs.start() is None:
+        # Tanda terbaca dan turunan gambar hanya diproses jika ada `python -m app.cli run-jobs`
+        logger.warning("JOBS_WORKER_THREADS=0: job antre hanya dijalankan oleh proses `python -m app.cli run-jobs`")
+    ready = time.perf_counter()
+    logger.info(
+        "Worker siap: import %.1f ms, prewarm %.1f ms (%d koneksi), total %.1f ms",
+        (started - _IMPORT_STARTED) * 1000,
+        (ready - started) * 1000,
+        connections,
+        (ready - _IMPORT_STARTED) * 1000,
+    )
+    yield
+    jobs.stop()
+    media_derivatives.shutdown()
+    passwords.shutdown()
+    engine.dispose()
+    for replica in replica_engines:
+        replica.dispose()
+    structured_logging.stop()
+
+app = FastAPI(
+    title="User Management API dengan Static Bearer Token dan JWT",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+# Kolom yang dibaca endpoint list sebagai tuple ringan (tanpa identity map ORM)
+USER_COLUMNS = serializers.columns_for(models.User, schemas.UserResponse)
+DATA_ENTRY_COLUMNS = serializers.columns_for(models.DataEntry, schemas.DataEntryResponse)
+DATA_ENTRY_CHANGE_COLUMNS = serializers.columns_for(models.DataEntry, schemas.DataEntryChange)
+ACTIVITY_LOG_COLUMNS = serializers.columns_for(models.ActivityLog, schemas.ActivityLogResponse)
+USER_REPORT_COLUMNS = serializers.columns_for(models.UserReport, schemas.UserReportResponse)
+
+# Urutan: middleware yang ditambahkan terakhir berada paling luar, sehingga metrik juga mencatat 429/503
+# dan setiap baris log (termasuk baris akses dari MetricsMiddleware) membawa request id
+app.add_middleware(db_routing.StickinessMiddleware)
+app.add_middleware(admission.AdmissionMiddleware, router=app.router)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(structured_logging.RequestContextMiddleware)
 
 # Include the chat router
 app.include_router(chat_router, tags=["chats"])
-# Cek dan buat direktori uploads jika belum ada
-if not os.path.exists("uploads"):
-    os.makedirs("uploads")
+app.include_router(upload_router, tags=["uploads"])
+app.include_router(storage_router, tags=["storage"])
+app.include_router(presence_router, tags=["presence"])
+app.include_router(admin_router, tags=["admin"])
 
-# Kemudian mount direktori
-app.mount("/media", StaticFiles(directory="uploads"), name="media")
+# Direktori uploads dibuat oleh preflight; check_dir=False agar import tidak menyentuh disk
+app.mount("/media", StaticFiles(directory=UPLOAD_DIR, check_dir=False), name="media")
 
 # Endpoint untuk registrasi pengguna baru
 @app.post("/register", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=3, commits=1)
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # Cek apakah username atau email sudah ada
     existing_user = db.query(models.User).filter(
@@ -53,12 +116,13 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     )
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        db.flush()
     except IntegrityError as e:
         db.rollback()
         return schemas.ResponseModel(success=False, error="Username atau email sudah digunakan")
     
+    on_commit(db, lambda: response_cache.invalidate("users"))
+    
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"User {db_user.email} telah mendaftar."
@@ -69,25 +133,15 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 # Endpoint untuk login - Mengembalikan JWT token dan profil pengguna
 @app.post("/login", response_model=schemas.TokenResponse, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=3, commits=1)
 def login_for_access_token(form_data: schemas.LoginRequest, db: Session = Depends(get_db)):
     user = auth.authenticate_user(db, form_data.identifier, form_data.password)
     if not user:
         return schemas.ResponseModel(success=False, error="Email atau password tidak valid")
     
-    # Deteksi apakah identifier adalah email atau username
-    if re.match(r'[^@]+@[^@]+\.[^@]+', form_data.identifier):
-        sub = user.email
-        action_identifier = user.email
-    else:
-        sub = user.username
-        action_identifier = user.username
-
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": sub},
-        expires_delta=access_token_expires
-    )
-    
+    # Identifier yang dipakai saat login hanya untuk log; token memakai id user
+    action_identifier = user.email if re.match(r'[^@]+@[^@]+\.[^@]+', form_data.identifier) else user.username
+
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
         action=f"User {action_identifier} telah melakukan login."
@@ -96,41 +150,63 @@ def login_for_access_token(form_data: schemas.LoginRequest, db: Session = Depend
 
     # Menyusun data respons
     response_data = {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **auth.issue_tokens(db, user),
         "user_profile": schemas.UserResponse.from_orm(user)
     }
 
     return schemas.TokenResponse(success=True, data=response_data)
 
+# Endpoint untuk menukar refresh token dengan pasangan token baru
+@app.post("/token/refresh", response_model=schemas.TokenResponse, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=3, commits=1)
+def refresh_access_token(request: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    user = auth.user_for_refresh_token(db, request.refresh_token)
+    return schemas.TokenResponse(success=True, data=auth.issue_tokens(db, user))
+
+# Endpoint logout - Mencabut semua token pengguna (di semua perangkat)
+@app.post("/logout", response_model=schemas.ResponseModel)
+@query_budget(statements=2, commits=1)
+def logout(db: Session = Depends(get_db), current_user: auth.Principal = Depends(auth.get_current_principal)):
+    auth.revoke_tokens(db, current_user)
+    log_activity(db, schemas.ActivityLogCreate(action="User telah logout."), current_user.id)
+    return schemas.ResponseModel(success=True, data=None)
+
 # Endpoint yang dilindungi menggunakan JWT
-@app.get("/users/me/", response_model=schemas.ResponseModel)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
-    user_data = schemas.UserResponse.from_orm(current_user)
-    return schemas.ResponseModel(success=True, data=user_data)
+@app.get("/users/me/", response_model=schemas.UserEnvelope)
+@query_budget(statements=1)
+def read_users_me(request: Request, current_user: models.User = Depends(auth.get_current_user)):
+    # Baris user sudah dimuat oleh autentikasi; versinya cukup untuk menjawab 304 tanpa serialisasi
+    etag = conditional.make_etag("user", current_user.id, current_user.version)
+    if conditional.is_fresh(request, etag):
+        return conditional.not_modified(etag)
+    user_data = schemas.UserResponse.model_validate(current_user)
+    return serializers.render(schemas.UserEnvelope(success=True, data=user_data), headers=conditional.etag_headers(etag))
 
 # Endpoint untuk memvalidasi token JWT
 @app.get("/token/validate", response_model=schemas.ResponseModel)
-def validate_token(current_user: models.User = Depends(auth.get_current_user)):
+@query_budget(statements=0)
+def validate_token(current_user: auth.Principal = Depends(auth.get_current_principal)):
     # Jika token valid, current_user akan terisi
     return schemas.ResponseModel(success=True, data="Token is valid")
 
 # Endpoint untuk mencari user berdasarkan nama dan user ID
-@app.get("/users/search", response_model=schemas.ResponseModel)
+@app.get("/users/search", response_model=schemas.UserListEnvelope)
+@query_budget(statements=2, commits=1)
+@read_only
 def search_users(
     name: Optional[str] = None,
     user_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     # Verifikasi bahwa setidaknya satu parameter pencarian diberikan
     if not name and not user_id:
-        return schemas.ResponseModel(success=False, error="Berikan setidaknya satu parameter pencarian (nama atau user_id)")
+        return schemas.UserListEnvelope(success=False, error="Berikan setidaknya satu parameter pencarian (nama atau user_id)")
     
     # Buat query dasar
-    query = db.query(models.User)
+    query = db.query(*USER_COLUMNS)
     
     # Filter berdasarkan nama jika parameter name diberikan
     if name:
@@ -150,13 +226,13 @@ def search_users(
     log_activity(db, activity_log, current_user.id)
     
     # Konversi hasil query ke format response
-    users_response = [schemas.UserResponse.from_orm(user) for user in users]
-    
-    return schemas.ResponseModel(success=True, data=users_response)
+    return serializers.users.render(users)
 
 # Endpoint untuk mencari user berdasarkan nama dan user ID (menggunakan Static Bearer Token)
-@app.get("/users/search/public", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@app.get("/users/search/public", response_model=schemas.UserListEnvelope, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=1)
 def search_users_public(
+    request: Request,
     name: Optional[str] = None,
     user_id: Optional[int] = None,
     skip: int = 0,
@@ -165,10 +241,16 @@ def search_users_public(
 ):
     # Verifikasi bahwa setidaknya satu parameter pencarian diberikan
     if not name and not user_id:
-        return schemas.ResponseModel(success=False, error="Berikan setidaknya satu parameter pencarian (nama atau user_id)")
+        return schemas.UserListEnvelope(success=False, error="Berikan setidaknya satu parameter pencarian (nama atau user_id)")
+    
+    cache_key = response_cache.key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation("users")
     
     # Buat query dasar
-    query = db.query(models.User)
+    query = db.query(*USER_COLUMNS)
     
     # Filter berdasarkan nama jika parameter name diberikan
     if name:
@@ -182,18 +264,61 @@ def search_users_public(
     users = query.offset(skip).limit(limit).all()
     
     # Konversi hasil query ke format response
-    users_response = [schemas.UserResponse.from_orm(user) for user in users]
+    return response_cache.put(cache_key, serializers.users.render(users), "users", generation)
+
+USERS_BATCH_MAX_IDS = int(os.getenv("USERS_BATCH_MAX_IDS", 500))
+
+def _users_by_id(db: Session, ids: List[int], current_user: auth.Principal):
+    # Satu query IN untuk semua id; id duplikat digabung dan id yang tidak ada dilewati
+    unique_ids = list(dict.fromkeys(ids))
+    if not unique_ids or len(unique_ids) > USERS_BATCH_MAX_IDS:
+        return schemas.UserMapEnvelope(success=False, error=f"Berikan 1 sampai {USERS_BATCH_MAX_IDS} user id")
+    users = db.query(*USER_COLUMNS).filter(models.User.id.in_(unique_ids)).all()
+    
+    # Satu log aktivitas untuk seluruh batch
+    activity_log = schemas.ActivityLogCreate(
+        action=f"Mengambil {len(users)} dari {len(unique_ids)} user berdasarkan id."
+    )
+    log_activity(db, activity_log, current_user.id)
     
-    return schemas.ResponseModel(success=True, data=users_response)
+    return serializers.users_by_id.render({str(user.id): user for user in users})
+
+# Endpoint untuk mengambil banyak user sekaligus berdasarkan id: /users/batch?ids=1,2,3
+@app.get("/users/batch", response_model=schemas.UserMapEnvelope)
+@query_budget(statements=2, commits=1)
+@read_only
+def get_users_batch(
+    ids: str,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    try:
+        user_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        return schemas.UserMapEnvelope(success=False, error="ids harus berupa daftar angka dipisahkan koma")
+    return _users_by_id(db, user_ids, current_user)
+
+# Varian POST untuk daftar id yang terlalu panjang untuk query string
+@app.post("/users/batch", response_model=schemas.UserMapEnvelope)
+@query_budget(statements=2, commits=1)
+@read_only
+def post_users_batch(
+    request: schemas.UserBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    return _users_by_id(db, request.ids, current_user)
 
 # Endpoint untuk menampilkan semua list user
-@app.get("/users/all", response_model=schemas.ResponseModel)
+@app.get("/users/all", response_model=schemas.UserListEnvelope)
+@query_budget(statements=2, commits=1)
+@read_only
 def get_all_users(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     # Query semua user tanpa pagination
-    users = db.query(models.User).all()
+    users = db.query(*USER_COLUMNS).all()
     
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -202,46 +327,52 @@ def get_all_users(
     log_activity(db, activity_log, current_user.id)
     
     # Konversi hasil query ke format response
-    users_response = [schemas.UserResponse.from_orm(user) for user in users]
-    
-    return schemas.ResponseModel(success=True, data=users_response)
+    return serializers.users.render(users)
 
 # Endpoint untuk menampilkan semua list user dengan Static Bearer Token
-@app.get("/users/all/public", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@app.get("/users/all/public", response_model=schemas.UserListEnvelope, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=1)
 def get_all_users_public(
+    request: Request,
     db: Session = Depends(get_db)
 ):
+    cache_key = response_cache.key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation("users")
+    
     # Query semua user tanpa pagination
-    users = db.query(models.User).all()
+    users = db.query(*USER_COLUMNS).all()
     
     # Konversi hasil query ke format response
-    users_response = [schemas.UserResponse.from_orm(user) for user in users]
-    
-    return schemas.ResponseModel(success=True, data=users_response)
+    return response_cache.put(cache_key, serializers.users.render(users), "users", generation)
 
 # Endpoint untuk melihat report berdasarkan ID user
-@app.get("/reports/user/{user_id}", response_model=schemas.ResponseModel)
+@app.get("/reports/user/{user_id}", response_model=schemas.UserReportListEnvelope)
+@query_budget(statements=3, commits=1)
+@read_only
 def get_reports_by_user_id(
     user_id: int,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     # Opsional: Cek apakah pengguna adalah admin atau melihat reportnya sendiri
     if current_user.role != "admin" and current_user.id != user_id:
-        return schemas.ResponseModel(
+        return schemas.UserReportListEnvelope(
             success=False, 
             error="Tidak memiliki izin untuk melihat report pengguna lain"
         )
     
     # Cek apakah user dengan ID tersebut ada
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.query(models.User.id).filter(models.User.id == user_id).first()
     if not user:
-        return schemas.ResponseModel(success=False, error=f"User dengan ID {user_id} tidak ditemukan")
+        return schemas.UserReportListEnvelope(success=False, error=f"User dengan ID {user_id} tidak ditemukan")
     
     # Query report user berdasarkan ID
-    reports = db.query(models.UserReport)\
+    reports = db.query(*USER_REPORT_COLUMNS)\
               .filter(models.UserReport.user_id == user_id)\
               .order_by(models.UserReport.timestamp.desc())\
               .offset(skip).limit(limit).all()
@@ -252,38 +383,51 @@ def get_reports_by_user_id(
     )
     log_activity(db, activity_log, current_user.id)
 
-    reports_response = [schemas.UserReportResponse.from_orm(report) for report in reports]
-    return schemas.ResponseModel(success=True, data=reports_response)
+    return serializers.user_reports.render(reports)
 
 # Endpoint untuk melihat report berdasarkan ID user (dengan Static Bearer Token)
-@app.get("/reports/user/{user_id}/public", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@app.get("/reports/user/{user_id}/public", response_model=schemas.UserReportListEnvelope, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=2)
 def get_reports_by_user_id_public(
     user_id: int,
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
+    cache_key = response_cache.key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation(f"reports:{user_id}")
+    
     # Cek apakah user dengan ID tersebut ada
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = db.query(models.User.id).filter(models.User.id == user_id).first()
     if not user:
-        return schemas.ResponseModel(success=False, error=f"User dengan ID {user_id} tidak ditemukan")
+        return schemas.UserReportListEnvelope(success=False, error=f"User dengan ID {user_id} tidak ditemukan")
     
     # Query report user berdasarkan ID
-    reports = db.query(models.UserReport)\
+    reports = db.query(*USER_REPORT_COLUMNS)\
               .filter(models.UserReport.user_id == user_id)\
               .order_by(models.UserReport.timestamp.desc())\
               .offset(skip).limit(limit).all()
 
-    reports_response = [schemas.UserReportResponse.from_orm(report) for report in reports]
-    return schemas.ResponseModel(success=True, data=reports_response)
+    return response_cache.put(cache_key, serializers.user_reports.render(reports), f"reports:{user_id}", generation)
 
 # Endpoint untuk membuat data entry baru
 @app.post("/data_entries/", response_model=schemas.ResponseModel)
+@query_budget(statements=5, commits=1)
 def create_data_entry(
     data_entry: schemas.DataEntryCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    idempotent = idempotency.Idempotency(db, current_user.id, "POST /data_entries/", idempotency_key, data_entry)
+    replay = idempotent.replay()
+    if replay is not None:
+        return replay
+
     new_data_entry = models.DataEntry(
         string_field1=data_entry.string_field1,
         string_field2=data_entry.string_field2,
@@ -296,11 +440,11 @@ def create_data_entry(
         int_field6=data_entry.int_field6,
         int_field7=data_entry.int_field7,
         int_field8=data_entry.int_field8,
-        owner_id=current_user.id
+        owner_id=current_user.id,
+        version=data_sync.next_version(db, current_user.id)
     )
     db.add(new_data_entry)
-    db.commit()
-    db.refresh(new_data_entry)
+    db.flush()
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -308,17 +452,47 @@ def create_data_entry(
     )
     log_activity(db, activity_log, current_user.id)
 
-    return schemas.ResponseModel(success=True, data=schemas.DataEntryResponse.from_orm(new_data_entry))
+    return idempotent.remember(schemas.ResponseModel(success=True, data=schemas.DataEntryResponse.from_orm(new_data_entry)))
 
 # Endpoint untuk mendapatkan semua data entry pengguna saat ini
-@app.get("/data_entries/", response_model=schemas.ResponseModel)
+@app.get("/data_entries/", response_model=schemas.DataEntryListEnvelope)
+@query_budget(statements=2, commits=1)
+@read_only
 def read_data_entries(
     skip: int = 0,
     limit: int = 100,
+    filters: Optional[List[str]] = Query(None, alias="filter"),
+    sort: str = "id",
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
-    data_entries = db.query(models.DataEntry).filter(models.DataEntry.owner_id == current_user.id).offset(skip).limit(limit).all()
+    # Filter, urutan, dan cursor keyset dikompilasi ke SQL oleh data_query
+    try:
+        if limit < 1:
+            raise data_query.QueryError("limit harus >= 1")
+        if cursor is not None and skip:
+            raise data_query.QueryError("skip tidak bisa dipakai bersama cursor")
+        order = data_query.parse_sort(sort)
+        query = data_query.apply(
+            db.query(*DATA_ENTRY_COLUMNS).filter(
+                models.DataEntry.owner_id == current_user.id,
+                models.DataEntry.deleted_at.is_(None)
+            ),
+            db.get_bind().dialect.name,
+            data_query.parse_filters(filters),
+            order,
+            cursor,
+        )
+    except data_query.QueryError as exc:
+        return schemas.DataEntryListEnvelope(success=False, error=str(exc))
+
+    # Satu baris ekstra menandakan masih ada halaman berikutnya
+    data_entries = query.offset(skip).limit(limit + 1).all()
+    next_cursor = None
+    if len(data_entries) > limit:
+        data_entries = data_entries[:limit]
+        next_cursor = data_query.encode_cursor(order, data_entries[-1])
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -326,19 +500,47 @@ def read_data_entries(
     )
     log_activity(db, activity_log, current_user.id)
 
-    data_response = [schemas.DataEntryResponse.from_orm(entry) for entry in data_entries]
-    return schemas.ResponseModel(success=True, data=data_response)
+    return serializers.data_entries.render(data_entries, next_cursor=next_cursor)
+
+# Endpoint sinkronisasi inkremental: perubahan (termasuk tombstone) setelah versi `since`.
+# Harus dideklarasikan sebelum /data_entries/{data_entry_id}
+@app.get("/data_entries/changes", response_model=schemas.DataEntryChangesEnvelope)
+@query_budget(statements=1)
+@read_only
+def read_data_entry_changes(
+    since: int = 0,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    if since < 0 or not 1 <= limit <= data_sync.CHANGES_MAX_LIMIT:
+        return schemas.DataEntryChangesEnvelope(
+            success=False, error=f"since harus >= 0 dan limit antara 1 dan {data_sync.CHANGES_MAX_LIMIT}"
+        )
+    # Tidak dicatat ke activity log: endpoint ini dipanggil berkala oleh setiap perangkat
+    rows, next_since, has_more = data_sync.changes(db, current_user.id, since, limit, DATA_ENTRY_CHANGE_COLUMNS)
+    return serializers.render(schemas.DataEntryChangesEnvelope(
+        success=True,
+        data=schemas.DataEntryChanges(
+            changes=[schemas.DataEntryChange.model_validate(row) for row in rows],
+            next_since=next_since,
+            has_more=has_more,
+        ),
+    ))
 
 # Endpoint untuk mendapatkan data entry spesifik
 @app.get("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel)
+@query_budget(statements=2, commits=1)
+@read_only
 def read_data_entry(
     data_entry_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     data_entry = db.query(models.DataEntry).filter(
         models.DataEntry.id == data_entry_id,
-        models.DataEntry.owner_id == current_user.id
+        models.DataEntry.owner_id == current_user.id,
+        models.DataEntry.deleted_at.is_(None)
     ).first()
     if data_entry is None:
         return schemas.ResponseModel(success=False, error="Data entry tidak ditemukan")
@@ -353,15 +555,17 @@ def read_data_entry(
 
 # Endpoint untuk memperbarui data entry
 @app.put("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel)
+@query_budget(statements=4, commits=1)
 def update_data_entry(
     data_entry_id: int,
     data_entry: schemas.DataEntryUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     db_data_entry = db.query(models.DataEntry).filter(
         models.DataEntry.id == data_entry_id,
-        models.DataEntry.owner_id == current_user.id
+        models.DataEntry.owner_id == current_user.id,
+        models.DataEntry.deleted_at.is_(None)
     ).first()
     if db_data_entry is None:
         return schemas.ResponseModel(success=False, error="Data entry tidak ditemukan")
@@ -369,9 +573,8 @@ def update_data_entry(
     # Update field jika diberikan
     for field, value in data_entry.dict(exclude_unset=True).items():
         setattr(db_data_entry, field, value)
-    
-    db.commit()
-    db.refresh(db_data_entry)
+    data_sync.touch(db, db_data_entry)
+    db.flush()
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -383,19 +586,22 @@ def update_data_entry(
 
 # Endpoint untuk menghapus data entry
 @app.delete("/data_entries/{data_entry_id}", response_model=schemas.ResponseModel, status_code=status.HTTP_200_OK)
+@query_budget(statements=4, commits=1)
 def delete_data_entry(
     data_entry_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     db_data_entry = db.query(models.DataEntry).filter(
         models.DataEntry.id == data_entry_id,
-        models.DataEntry.owner_id == current_user.id
+        models.DataEntry.owner_id == current_user.id,
+        models.DataEntry.deleted_at.is_(None)
     ).first()
     if db_data_entry is None:
         return schemas.ResponseModel(success=False, error="Data entry tidak ditemukan")
-    db.delete(db_data_entry)
-    db.commit()
+    # Tombstone, bukan DELETE: perangkat lain mengetahui penghapusan lewat /data_entries/changes
+    data_sync.soft_delete(db, db_data_entry)
+    db.flush()
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -407,10 +613,11 @@ def delete_data_entry(
 
 # Endpoint untuk memperbarui profil pengguna
 @app.put("/users/me/profile", response_model=schemas.ResponseModel)
+@query_budget(statements=3, commits=1)
 def update_user_profile(
     profile_update: schemas.UserProfileUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     user = db.query(models.User).filter(models.User.id == current_user.id).first()
     if not user:
@@ -449,11 +656,18 @@ def update_user_profile(
         user.place_of_birth = profile_update.place_of_birth
 
     try:
-        db.commit()
-        db.refresh(user)
+        db.flush()
     except IntegrityError:
         db.rollback()
         raise HTTPException(status_code=400, detail="Terjadi kesalahan saat memperbarui profil")
+    except StaleDataError:
+        # users.version berubah di antara load dan commit: profil diperbarui oleh request lain
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Profil baru saja diperbarui, silakan coba lagi")
+    on_commit(db, lambda: response_cache.invalidate("users"))
+    if profile_update.new_password:
+        # Password lama mungkin bocor: semua sesi (access dan refresh token) harus login ulang
+        auth.revoke_tokens(db, current_user)
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -465,26 +679,31 @@ def update_user_profile(
 
 # Endpoint untuk membuat log aktivitas (opsional, jika ingin membuat log secara manual)
 @app.post("/logs/", response_model=schemas.ResponseModel)
+@query_budget(statements=1, commits=1)
 def create_activity_log(
     log: schemas.ActivityLogCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
     created_log = log_activity(db, log, current_user.id)
     return schemas.ResponseModel(success=True, data=schemas.ActivityLogResponse.from_orm(created_log))
 
 # Endpoint untuk membaca log aktivitas pengguna
-@app.get("/logs/", response_model=schemas.ResponseModel)
+@app.get("/logs/", response_model=schemas.ActivityLogListEnvelope)
+@query_budget(statements=2, commits=1)
+@read_only
 def read_activity_logs(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
-    logs = db.query(models.ActivityLog)\
-             .filter(models.ActivityLog.user_id == current_user.id)\
-             .order_by(models.ActivityLog.timestamp.desc())\
-             .offset(skip).limit(limit).all()
+    query = db.query(*ACTIVITY_LOG_COLUMNS).filter(models.ActivityLog.user_id == current_user.id)
+    # Batasi ke jendela retensi agar partisi lama dipangkas dari rencana query
+    cutoff = retention_cutoff()
+    if cutoff is not None:
+        query = query.filter(models.ActivityLog.timestamp >= cutoff)
+    logs = query.order_by(models.ActivityLog.timestamp.desc()).offset(skip).limit(limit).all()
 
     # Log aktivitas
     activity_log = schemas.ActivityLogCreate(
@@ -492,29 +711,47 @@ def read_activity_logs(
     )
     log_activity(db, activity_log, current_user.id)
 
-    logs_response = [schemas.ActivityLogResponse.from_orm(log) for log in logs]
-    return schemas.ResponseModel(success=True, data=logs_response)
+    return serializers.activity_logs.render(logs)
 
 # Endpoint untuk membaca log aktivitas menggunakan Static Bearer Token
-@app.get("/logs/public", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@app.get("/logs/public", response_model=schemas.ActivityLogListEnvelope, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=1)
+@read_only
 def read_activity_logs_public(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
 ):
-    logs = db.query(models.ActivityLog)\
-             .order_by(models.ActivityLog.timestamp.desc())\
-             .offset(skip).limit(limit).all()
+    # Log hanya bertambah dan hampir setiap request menulis log, jadi entri ini tidak diinvalidasi
+    # per penulisan; kesegarannya dibatasi RESPONSE_CACHE_TTL
+    cache_key = response_cache.key(request)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation("logs")
+    
+    query = db.query(*ACTIVITY_LOG_COLUMNS)
+    cutoff = retention_cutoff()
+    if cutoff is not None:
+        query = query.filter(models.ActivityLog.timestamp >= cutoff)
+    logs = query.order_by(models.ActivityLog.timestamp.desc()).offset(skip).limit(limit).all()
 
-    logs_response = [schemas.ActivityLogResponse.from_orm(log) for log in logs]
-    return schemas.ResponseModel(success=True, data=logs_response)
+    return response_cache.put(cache_key, serializers.activity_logs.render(logs), "logs", generation)
 
 @app.post("/reports/", response_model=schemas.ResponseModel)
+@query_budget(statements=4, commits=1)
 def create_report(
     report: schemas.UserReportCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
+    idempotent = idempotency.Idempotency(db, current_user.id, "POST /reports/", idempotency_key, report)
+    replay = idempotent.replay()
+    if replay is not None:
+        return replay
+
     db_report = models.UserReport(
         int_value1=report.int_value1,
         int_value2=report.int_value2,
@@ -527,23 +764,34 @@ def create_report(
         user_id=current_user.id
     )
     db.add(db_report)
-    db.commit()
-    db.refresh(db_report)
+    db.flush()
+    on_commit(db, lambda: response_cache.invalidate(f"reports:{db_report.user_id}"))
     
-    return schemas.ResponseModel(success=True, data=schemas.UserReportResponse.from_orm(db_report))
+    return idempotent.remember(schemas.ResponseModel(success=True, data=schemas.UserReportResponse.from_orm(db_report)))
 
-@app.get("/reports/", response_model=schemas.ResponseModel)
+@app.get("/reports/", response_model=schemas.UserReportListEnvelope)
+@query_budget(statements=1)
+@read_only
 def get_user_reports(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_principal)
 ):
-    reports = db.query(models.UserReport).filter(
+    reports = db.query(*USER_REPORT_COLUMNS).filter(
         models.UserReport.user_id == current_user.id
     ).offset(skip).limit(limit).all()
     
-    return schemas.ResponseModel(
-        success=True, 
-        data=[schemas.UserReportResponse.from_orm(r) for r in reports]
-    )
\ No newline at end of file
+    return serializers.user_reports.render(reports)
+
+# Statistik cache respons endpoint publik (hit ratio total dan per route)
+@app.get("/cache/stats", response_model=schemas.ResponseModel, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=0)
+def read_cache_stats():
+    return schemas.ResponseModel(success=True, data=response_cache.stats())
+
+# Endpoint metrik dalam format teks Prometheus (latensi, query SQL, waktu DB dan commit per route)
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False, dependencies=[Depends(auth.verify_static_token)])
+@query_budget(statements=0)
+def read_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,146 @@
+# app/media_derivatives.py
+#
+# Turunan gambar untuk tampilan yang tidak butuh resolusi asli:
+#   thumb   (daftar chat, avatar)   sisi terpanjang 160 px
+#   preview (gelembung pesan)       sisi terpanjang 640 px
+#   full    (layar penuh)           sisi terpanjang 1600 px
+# Ukuran diatur lewat MEDIA_DERIVATIVE_SIZES="thumb:160,preview:640,full:1600".
+#
+# Upload hanya mengantrekan job media.derivatives (lihat jobs.py); runner job menjalankan decode/resize,
+# yang merupakan kerja CPU murni, di process pool (MEDIA_DERIVATIVE_WORKERS proses, 0 = nonaktif).
+# Hasilnya disimpan di media storage di samping aslinya dengan nama yang bisa diturunkan dari
+# media_url: image_<uuid>.png -> image_<uuid>_thumb.webp. Selama turunan belum selesai (atau untuk
+# gambar yang diunggah sebelum fitur ini ada) klien memakai media_url.
+#
+# Modul ini sengaja hanya meng-import stdlib di level atas: proses anak (spawn) meng-import-nya
+# untuk menjalankan render() tanpa memuat aplikasi. Membutuhkan Pillow.
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_sizes(value: str) -> List[Tuple[str, int]]:
+    sizes = []
+    for item in value.split(","):
+        name, _, edge = item.strip().partition(":")
+        if name and edge:
+            sizes.append((name, int(edge)))
+    return sizes
+
+
+MEDIA_DERIVATIVE_SIZES = _parse_sizes(os.getenv("MEDIA_DERIVATIVE_SIZES", "thumb:160,preview:640,full:1600"))
+MEDIA_DERIVATIVE_WORKERS = int(os.getenv("MEDIA_DERIVATIVE_WORKERS", 2))
+MEDIA_DERIVATIVE_QUALITY = int(os.getenv("MEDIA_DERIVATIVE_QUALITY", 80))
+DERIVATIVE_CONTENT_TYPE = "image/webp"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_available: Optional[bool] = None
+
+
+def derivative_name(media_url: str, size: str) -> str:
+    stem, _ = os.path.splitext(media_url)
+    return f"{stem}_{size}.webp"
+
+
+def derivative_names(media_url: str) -> Dict[str, str]:
+    return {size: derivative_name(media_url, size) for size, _ in MEDIA_DERIVATIVE_SIZES}
+
+
+def enabled() -> bool:
+    global _available
+    if MEDIA_DERIVATIVE_WORKERS <= 0 or not MEDIA_DERIVATIVE_SIZES:
+        return False
+    if _available is None:
+        _available = importlib.util.find_spec("PIL") is not None
+        if not _available:
+            logger.warning("Pillow tidak terpasang; turunan gambar tidak dibuat (pip install Pillow)")
+    return _available
+
+
+def render(source: str, out_dir: str, sizes: List[Tuple[str, int]], quality: int) -> List[Tuple[str, str]]:
+    """
+    Dijalankan di proses anak: membuat turunan WebP dari `source` ke `out_dir`.
+    Mengembalikan [(nama ukuran, path file)].
+    """
+    import warnings
+    from PIL import Image, ImageOps
+
+    # Gambar berdimensi ekstrem (decompression bomb) ditolak, bukan hanya diberi peringatan
+    warnings.simplefilter("error", Image.DecompressionBombWarning)
+    largest = max(edge for _, edge in sizes)
+    outputs = []
+    with Image.open(source) as original:
+        # JPEG: decoder langsung menskalakan ke kelipatan 1/8 terdekat, jauh lebih cepat dari decode penuh
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        # Dari yang terbesar ke terkecil: setiap ukuran di-resize dari hasil sebelumnya
+        for name, edge in sorted(sizes, key=lambda size: -size[1]):
+            image.thumbnail((edge, edge), Image.LANCZOS, reducing_gap=3.0)
+            path = os.path.join(out_dir, f"{name}.webp")
+            image.save(path, "WEBP", quality=quality, method=4)
+            outputs.append((name, path))
+    return outputs
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                # spawn: proses anak tidak mewarisi lock/thread/koneksi milik worker
+                _pool = ProcessPoolExecutor(MEDIA_DERIVATIVE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def generate(media_url: str) -> Dict[str, str]:
+    """
+    Membuat dan menyimpan turunan gambar `media_url` yang sudah ada di media storage; memblokir
+    sampai selesai (dipanggil dari job media.derivatives, lihat media_service).
+    """
+    from .media_storage import LocalStorage, get_storage
+
+    storage = get_storage()
+    out_dir = tempfile.mkdtemp(prefix="kanapp-derivatives-")
+    copy = None
+    try:
+        if isinstance(storage, LocalStorage):
+            source = storage.path(media_url)
+        else:
+            # Proses anak membaca dari disk lokal
+            fd, copy = tempfile.mkstemp(prefix="kanapp-source-", suffix=os.path.splitext(media_url)[1])
+            os.close(fd)
+            storage.download(media_url, copy)
+            source = copy
+        try:
+            outputs = _get_pool().submit(render, source, out_dir, MEDIA_DERIVATIVE_SIZES, MEDIA_DERIVATIVE_QUALITY).result()
+        except BrokenProcessPool:
+            # Proses anak mati (mis. kehabisan memori); pool baru dibuat untuk job berikutnya
+            shutdown()
+            raise
+        for size, path in outputs:
+            storage.save_file(derivative_name(media_url, size), path, DERIVATIVE_CONTENT_TYPE)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        if copy is not None:
+            os.remove(copy)
+    return derivative_names(media_url)
+
+
+def shutdown() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
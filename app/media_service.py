@@ -1,14 +1,44 @@
 # app/media_service.py
 
-import os
+import logging
 import uuid
 from fastapi import UploadFile, HTTPException
-import aiofiles
-import shutil
+from typing import Dict, Tuple
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from . import jobs, media_derivatives
+from .media_storage import get_storage
+
+logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = "uploads"
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+def classify_media(content_type: str) -> Tuple[str, str]:
+    # (tipe pesan, ekstensi file) dari content type upload
+    content_type = content_type or ""
+    if content_type.startswith("image/"):
+        return "image", content_type.split("/")[1]
+    elif content_type.startswith("video/"):
+        return "video", content_type.split("/")[1]
+    elif content_type.startswith("audio/"):
+        return "audio", content_type.split("/")[1] or "mp4"
+    raise HTTPException(status_code=400, detail="Unsupported file type")
+
+def media_filename(file_type: str, ext: str) -> str:
+    return f"{file_type}_{uuid.uuid4()}.{ext}"
+
+def schedule_derivatives(db: Session, media_url: str) -> Dict[str, str]:
+    # Thumbnail/preview dibuat oleh runner job; namanya langsung dikembalikan ke klien
+    if not media_derivatives.enabled():
+        return {}
+    jobs.enqueue(db, "media.derivatives", {"media_url": media_url})
+    return media_derivatives.derivative_names(media_url)
+
+@jobs.handler("media.derivatives", concurrency=max(1, media_derivatives.MEDIA_DERIVATIVE_WORKERS), max_attempts=3)
+def _generate_derivatives(db: Session, payload: dict) -> dict:
+    return media_derivatives.generate(payload["media_url"])
+
 async def save_media(file: UploadFile) -> str:
     try:
         # Validate file size
@@ -20,32 +50,18 @@ async def save_media(file: UploadFile) -> str:
             raise HTTPException(status_code=400, detail=f"File size exceeds the limit of {MAX_FILE_SIZE/1024/1024}MB")
         
         # Validate content type
-        content_type = file.content_type
-        if content_type.startswith("image/"):
-            file_type = "image"
-            ext = content_type.split("/")[1]
-        elif content_type.startswith("video/"):
-            file_type = "video"
-            ext = content_type.split("/")[1]
-        elif content_type.startswith("audio/"):
-            file_type = "audio"
-            ext = content_type.split("/")[1] if "/" in content_type else "mp4"
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
+        file_type, ext = classify_media(file.content_type)
         
         # Create unique filename
-        filename = f"{file_type}_{uuid.uuid4()}.{ext}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        
-        # Ensure upload directory exists
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        filename = media_filename(file_type, ext)
         
-        # Save file
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Save file (disk lokal atau S3, lihat media_storage); di thread agar event loop tidak terblokir
+        await run_in_threadpool(get_storage().save, filename, file.file, file.content_type)
         
         # Return the file path relative to the media endpoint
         return filename
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error saving media: {str(e)}")
+        logger.exception("Gagal menyimpan media")
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
\ No newline at end of file
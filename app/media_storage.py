@@ -0,0 +1,186 @@
+# app/media_storage.py
+#
+# Penyimpanan media di balik satu antarmuka, dipilih lewat MEDIA_STORAGE:
+#   local : file di UPLOAD_DIR, disajikan mount /media. Upload langsung memakai URL PUT
+#           /storage/local/{name} yang ditandatangani HMAC (worker tetap menerima byte-nya).
+#   s3    : bucket S3 atau server kompatibel S3 (MinIO, moto) lewat S3_ENDPOINT_URL. Klien upload
+#           dengan presigned POST dan download dengan presigned GET langsung ke storage, sehingga
+#           worker API tidak pernah meneruskan byte media. Membutuhkan boto3 (pip install boto3).
+#
+# Nama objek sama dengan media_url di pesan ("video_<uuid>.mp4"); S3_PREFIX ditambahkan di depan
+# key bucket.
+
+import hashlib
+import hmac
+import os
+import shutil
+import threading
+import time
+from typing import BinaryIO, Optional
+from urllib.parse import urlencode
+
+from . import auth
+
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "local")
+# Masa berlaku URL upload/download yang ditandatangani (detik)
+MEDIA_PRESIGN_TTL = int(os.getenv("MEDIA_PRESIGN_TTL", 900))
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # kosong = AWS; isi untuk MinIO/moto
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+
+
+class StorageBackend:
+    name = ""
+
+    def save(self, name: str, fileobj: BinaryIO, content_type: str) -> None:
+        raise NotImplementedError
+
+    def save_file(self, name: str, path: str, content_type: str) -> None:
+        # Memindahkan file lokal yang sudah lengkap (mis. hasil upload bertahap) ke storage
+        raise NotImplementedError
+
+    def download(self, name: str, path: str) -> None:
+        # Menyalin objek ke file lokal (mis. untuk diproses turunan gambar)
+        raise NotImplementedError
+
+    def presign_upload(self, name: str, content_type: str, max_size: int) -> dict:
+        # {"method", "url", "fields", "headers"}: fields dikirim sebagai form multipart (POST),
+        # headers dikirim bersama body mentah (PUT)
+        raise NotImplementedError
+
+    def download_url(self, name: str) -> str:
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Nama media tidak valid: {name!r}")
+        return os.path.join(self.root, name)
+
+    def save(self, name: str, fileobj: BinaryIO, content_type: str) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.path(name), "wb") as buffer:
+            shutil.copyfileobj(fileobj, buffer)
+
+    def save_file(self, name: str, path: str, content_type: str) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        # rename jika satu filesystem, selain itu salin lalu hapus
+        shutil.move(path, self.path(name))
+
+    def download(self, name: str, path: str) -> None:
+        shutil.copyfile(self.path(name), path)
+
+    @staticmethod
+    def _signature(name: str, content_type: str, max_size: int, expires: int) -> str:
+        message = f"{name}|{content_type}|{max_size}|{expires}".encode()
+        return hmac.new(auth.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    def presign_upload(self, name: str, content_type: str, max_size: int) -> dict:
+        expires = int(time.time()) + MEDIA_PRESIGN_TTL
+        query = urlencode({
+            "content_type": content_type,
+            "max_size": max_size,
+            "expires": expires,
+            "signature": self._signature(name, content_type, max_size, expires),
+        })
+        return {
+            "method": "PUT",
+            "url": f"/storage/local/{name}?{query}",
+            "fields": {},
+            "headers": {"Content-Type": content_type},
+        }
+
+    def verify_upload(self, name: str, content_type: str, max_size: int, expires: int, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(name, content_type, max_size, expires), signature)
+
+    def download_url(self, name: str) -> str:
+        return f"/media/{name}"
+
+
+class _KeepOpen:
+    # s3transfer menutup fileobj setelah upload; seperti LocalStorage, file tetap milik pemanggil
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def close(self) -> None:
+        pass
+
+
+class S3Storage(StorageBackend):
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: str = "us-east-1", prefix: str = ""):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("MEDIA_STORAGE=s3 membutuhkan boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("MEDIA_STORAGE=s3 membutuhkan S3_BUCKET")
+        self.bucket = bucket
+        self.prefix = prefix
+        # Kredensial dari rantai default boto3 (AWS_ACCESS_KEY_ID/..., profil, IAM role)
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint_url, region_name=region, config=Config(signature_version="s3v4")
+        )
+
+    def key(self, name: str) -> str:
+        return self.prefix + name
+
+    def save(self, name: str, fileobj: BinaryIO, content_type: str) -> None:
+        self.client.upload_fileobj(_KeepOpen(fileobj), self.bucket, self.key(name), ExtraArgs={"ContentType": content_type})
+
+    def save_file(self, name: str, path: str, content_type: str) -> None:
+        self.client.upload_file(path, self.bucket, self.key(name), ExtraArgs={"ContentType": content_type})
+        os.remove(path)
+
+    def download(self, name: str, path: str) -> None:
+        self.client.download_file(self.bucket, self.key(name), path)
+
+    def presign_upload(self, name: str, content_type: str, max_size: int) -> dict:
+        # Presigned POST (bukan PUT) agar batas ukuran ditegakkan oleh storage lewat policy
+        post = self.client.generate_presigned_post(
+            self.bucket,
+            self.key(name),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_size]],
+            ExpiresIn=MEDIA_PRESIGN_TTL,
+        )
+        return {"method": "POST", "url": post["url"], "fields": post["fields"], "headers": {}}
+
+    def download_url(self, name: str) -> str:
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self.key(name)}, ExpiresIn=MEDIA_PRESIGN_TTL
+        )
+
+
+_storage: Optional[StorageBackend] = None
+_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                if MEDIA_STORAGE == "s3":
+                    _storage = S3Storage(S3_BUCKET, S3_ENDPOINT_URL, S3_REGION, S3_PREFIX)
+                elif MEDIA_STORAGE == "local":
+                    # Import di sini: media_service memakai modul ini
+                    from .media_service import UPLOAD_DIR
+                    _storage = LocalStorage(UPLOAD_DIR)
+                else:
+                    raise RuntimeError(f"MEDIA_STORAGE tidak dikenal: {MEDIA_STORAGE}")
+    return _storage
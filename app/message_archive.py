@@ -0,0 +1,238 @@
+# app/message_archive.py
+#
+# Arsip dingin untuk pesan chat lama. `python -m app.cli archive-messages` (jalankan harian) memindahkan
+# pesan yang lebih tua dari MESSAGE_ARCHIVE_DAYS hari ke segmen NDJSON terkompresi gzip per chat:
+#
+#   MESSAGE_ARCHIVE_DIR/<2 huruf awal chat_id>/<chat_id>/index.json
+#   MESSAGE_ARCHIVE_DIR/<2 huruf awal chat_id>/<chat_id>/000001.ndjson.gz, 000002.ndjson.gz, ...
+#
+# - Yang diarsipkan selalu awalan riwayat chat (urut timestamp, id): pesan di luar jendela hari DAN
+#   di luar MESSAGE_ARCHIVE_KEEP_RECENT pesan terbaru chat itu. Daftar chat (pesan terakhir, belum
+#   terbaca) dan halaman pertama riwayat karenanya tetap dilayani tabel messages saja.
+# - Segmen berisi paling banyak MESSAGE_ARCHIVE_SEGMENT_SIZE pesan dan tidak pernah diubah setelah
+#   ditulis. index.json mencatat rentang (timestamp, id) setiap segmen.
+# - Urutan per segmen: tulis segmen (tmp + fsync + rename), perbarui index.json dengan cara yang sama,
+#   lalu DELETE baris dari tabel. Jika proses mati di antaranya, run berikutnya menghapus baris yang
+#   sudah tercatat di index lebih dulu; pembaca hanya mengambil arsip sebelum pesan tertua di tabel,
+#   sehingga baris seperti itu tidak pernah muncul dua kali.
+# - Pembaca (GET /chats/{id}/messages) menyambung riwayat dari arsip saat halaman yang diminta
+#   melewati pesan tertua di tabel. Tanpa limit, arsip hanya dibaca lewat cursor `before`. Pencarian (/chats/search) hanya mencakup pesan di tabel.
+#
+# Seperti uploads/, direktori arsip harus bisa dibaca semua worker (disk bersama pada multi-host).
+
+import base64
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from .chat_models import Message
+
+logger = logging.getLogger(__name__)
+
+# 0 berarti pesan tidak pernah diarsipkan
+MESSAGE_ARCHIVE_DAYS = int(os.getenv("MESSAGE_ARCHIVE_DAYS", 180))
+MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "message_archive")
+MESSAGE_ARCHIVE_KEEP_RECENT = int(os.getenv("MESSAGE_ARCHIVE_KEEP_RECENT", 50))
+MESSAGE_ARCHIVE_SEGMENT_SIZE = int(os.getenv("MESSAGE_ARCHIVE_SEGMENT_SIZE", 1000))
+# Pesan arsip paling banyak per respons GET /chats/{id}/messages tanpa limit
+MESSAGE_ARCHIVE_PAGE_SIZE = int(os.getenv("MESSAGE_ARCHIVE_PAGE_SIZE", 100))
+# Segmen yang sudah didekompresi dan disimpan di memori per worker
+MESSAGE_ARCHIVE_CACHE_SEGMENTS = int(os.getenv("MESSAGE_ARCHIVE_CACHE_SEGMENTS", 64))
+
+FIELDS = ("id", "chat_id", "sender_id", "content", "message_type", "media_url", "timestamp", "read")
+
+# (timestamp, id): urutan riwayat chat
+Key = Tuple[datetime, str]
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(key: Key) -> str:
+    payload = json.dumps([key[0].isoformat(), key[1]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Key:
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), str(message_id)
+    except (ValueError, TypeError):
+        raise CursorError("cursor tidak valid")
+
+
+def _chat_dir(chat_id: str) -> str:
+    # chat_id dibuat server (uuid), tetapi tetap dijaga agar tidak bisa keluar dari direktori arsip
+    safe = chat_id.replace("/", "_").replace("\\", "_").lstrip(".")
+    return os.path.join(MESSAGE_ARCHIVE_DIR, safe[:2], safe)
+
+
+def _index_path(chat_id: str) -> str:
+    return os.path.join(_chat_dir(chat_id), "index.json")
+
+
+def read_index(chat_id: str) -> List[dict]:
+    """
+    Segmen arsip chat, dari yang tertua: [{"file", "count", "first": [ts, id], "last": [ts, id]}].
+    """
+    try:
+        with open(_index_path(chat_id)) as f:
+            return json.load(f)["segments"]
+    except FileNotFoundError:
+        return []
+
+
+def has_archive(chat_id: str) -> bool:
+    return os.path.exists(_index_path(chat_id))
+
+
+def _segment_key(value: list) -> Key:
+    return datetime.fromisoformat(value[0]), value[1]
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@lru_cache(maxsize=MESSAGE_ARCHIVE_CACHE_SEGMENTS)
+def _load_segment(path: str) -> Tuple[dict, ...]:
+    # Segmen tidak pernah diubah setelah ditulis, jadi aman di-cache berdasarkan path
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    for row in rows:
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return tuple(rows)
+
+
+def read_archived(chat_id: str, before: Optional[Key] = None, limit: Optional[int] = None) -> List[dict]:
+    """
+    Pesan arsip chat dengan kunci < before (semua jika None), paling banyak `limit` yang terbaru,
+    urut dari yang tertua. sender_id masih berupa int; nama pengirim diisi pemanggil.
+    """
+    segments = read_index(chat_id)
+    picked: List[dict] = []
+    # Dari segmen terbaru ke belakang, berhenti begitu `limit` terpenuhi
+    for segment in reversed(segments):
+        if before is not None and _segment_key(segment["first"]) >= before:
+            continue
+        rows = _load_segment(os.path.join(_chat_dir(chat_id), segment["file"]))
+        if before is not None and _segment_key(segment["last"]) >= before:
+            rows = [row for row in rows if (row["timestamp"], row["id"]) < before]
+        picked[:0] = rows
+        if limit is not None and len(picked) >= limit:
+            return picked[-limit:]
+    return picked
+
+
+def _column_key(dialect: str):
+    # Di PostgreSQL id dibandingkan per byte (collation "C") agar urutannya sama dengan Python
+    message_id = Message.id.collate("C") if dialect == "postgresql" else Message.id
+    return Message.timestamp, message_id
+
+
+def keyset_columns(db: Session):
+    return _column_key(db.get_bind().dialect.name)
+
+
+def _boundary(db: Session, chat_id: str, cutoff: datetime) -> Optional[Key]:
+    """
+    Kunci pertama yang harus tetap di tabel: semua pesan dengan kunci lebih kecil boleh diarsipkan.
+    None jika chat belum punya lebih dari KEEP_RECENT pesan.
+    """
+    # id "" lebih kecil dari id mana pun, jadi (cutoff, "") berarti "timestamp < cutoff"
+    boundary = (cutoff, "")
+    if MESSAGE_ARCHIVE_KEEP_RECENT > 0:
+        timestamp, message_id = keyset_columns(db)
+        keep = db.execute(
+            select(Message.timestamp, Message.id).where(Message.chat_id == chat_id)
+            .order_by(timestamp.desc(), message_id.desc())
+            .offset(MESSAGE_ARCHIVE_KEEP_RECENT - 1).limit(1)
+        ).first()
+        if keep is None:
+            return None
+        boundary = min(boundary, (keep.timestamp, keep.id))
+    return boundary
+
+
+def _archive_chat(engine: Engine, chat_id: str, cutoff: datetime) -> int:
+    directory = _chat_dir(chat_id)
+    archived = 0
+    with Session(engine) as db:
+        timestamp, message_id = keyset_columns(db)
+        segments = read_index(chat_id)
+        if segments:
+            # Pemulihan: baris yang sudah ada di arsip tetapi belum sempat dihapus
+            last = _segment_key(segments[-1]["last"])
+            db.execute(delete(Message).where(
+                Message.chat_id == chat_id, tuple_(timestamp, message_id) <= last
+            ).execution_options(synchronize_session=False))
+            db.commit()
+
+        boundary = _boundary(db, chat_id, cutoff)
+        if boundary is None:
+            return 0
+        while True:
+            rows = db.execute(
+                select(*[getattr(Message, name) for name in FIELDS])
+                .where(Message.chat_id == chat_id, tuple_(timestamp, message_id) < boundary)
+                .order_by(timestamp, message_id)
+                .limit(MESSAGE_ARCHIVE_SEGMENT_SIZE)
+            ).all()
+            if not rows:
+                return archived
+            os.makedirs(directory, exist_ok=True)
+            number = int(segments[-1]["file"].split(".")[0]) + 1 if segments else 1
+            name = f"{number:06d}.ndjson.gz"
+            # Pesan disimpan sebagai terbaca: tanda terbaca (job chat.mark_read) hanya mengubah tabel,
+            # jadi pesan yang diarsipkan sebelum dibuka penerimanya tidak akan pernah ditandai lagi
+            payload = "".join(
+                json.dumps({**row._asdict(), "timestamp": row.timestamp.isoformat(), "read": True}, ensure_ascii=False) + "\n"
+                for row in rows
+            )
+            _write_atomic(os.path.join(directory, name), gzip.compress(payload.encode(), mtime=0))
+            segments.append({
+                "file": name,
+                "count": len(rows),
+                "first": [rows[0].timestamp.isoformat(), rows[0].id],
+                "last": [rows[-1].timestamp.isoformat(), rows[-1].id],
+            })
+            _write_atomic(_index_path(chat_id), json.dumps({"segments": segments}).encode())
+            db.execute(delete(Message).where(Message.id.in_([row.id for row in rows])).execution_options(synchronize_session=False))
+            db.commit()
+            archived += len(rows)
+
+
+def archive_messages(engine: Engine, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Mengarsipkan pesan di luar jendela MESSAGE_ARCHIVE_DAYS untuk setiap chat; jumlah pesan per chat.
+    Aman dijalankan berulang kali, tetapi jangan dua proses bersamaan.
+    """
+    if MESSAGE_ARCHIVE_DAYS <= 0:
+        return {}
+    cutoff = (now or datetime.utcnow()) - timedelta(days=MESSAGE_ARCHIVE_DAYS)
+    with Session(engine) as db:
+        # Hanya chat yang punya pesan di luar jendela hari (memakai index (chat_id, timestamp))
+        chat_ids = db.execute(
+            select(Message.chat_id).where(Message.timestamp < cutoff).distinct()
+        ).scalars().all()
+    result = {}
+    for chat_id in chat_ids:
+        count = _archive_chat(engine, chat_id, cutoff)
+        if count:
+            result[chat_id] = count
+            logger.info("%d pesan chat %s diarsipkan", count, chat_id)
+    return result
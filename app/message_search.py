@@ -0,0 +1,262 @@
+# app/message_search.py
+#
+# Pencarian full-text isi pesan untuk GET /chats/search, dibatasi ke chat yang diikuti pemanggil.
+#   PostgreSQL : index GIN to_tsvector(CHAT_SEARCH_CONFIG, content) + websearch_to_tsquery,
+#                ranking ts_rank_cd, highlight ts_headline hanya untuk baris di halaman hasil.
+#   SQLite     : inverted index di memori worker, diisi bertahap dari rowid terakhir yang sudah
+#                diindeks (watermark) setiap kali ada pencarian; ranking BM25, semua kata wajib ada.
+#                Pesan yang dihapus atau diarsipkan (archive-messages) dikeluarkan dari hasil begitu
+#                ketahuan hilang dari tabel, dan index dibangun ulang dari tabel paling lama setiap
+#                MESSAGE_SEARCH_REBUILD_SECONDS agar memorinya mengikuti isi tabel.
+#
+# Snippet dikembalikan HTML-escaped dengan kata yang cocok dibungkus <mark>...</mark>.
+
+import html
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy import String, and_, cast, func, literal, literal_column, select
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session
+
+from . import chat_models, models
+from .chat_models import CHAT_SEARCH_CONFIG
+
+SEARCH_MAX_TERMS = 8
+# 0 = tidak pernah dibangun ulang (pesan yang hilang tetap hanya disaring dari hasil)
+MESSAGE_SEARCH_REBUILD_SECONDS = int(os.getenv("MESSAGE_SEARCH_REBUILD_SECONDS", 3600))
+SNIPPET_MAX_WORDS = 35
+# Penanda sementara dari ts_headline/snippet Python; diganti <mark> setelah isi pesan di-escape
+MARK_START, MARK_STOP = "\x02", "\x03"
+HEADLINE_OPTIONS = f'StartSel="{MARK_START}", StopSel="{MARK_STOP}", MaxWords={SNIPPET_MAX_WORDS}, MinWords=15'
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.casefold() for token in _TOKEN.findall(text)]
+
+
+def render_snippet(marked: str) -> str:
+    return html.escape(marked).replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
+def _hit_columns():
+    return (
+        chat_models.Message.id,
+        chat_models.Message.chat_id,
+        cast(chat_models.Message.sender_id, String).label("sender_id"),
+        models.User.name.label("sender_name"),
+        chat_models.Message.message_type,
+        chat_models.Message.timestamp,
+    )
+
+
+# --- PostgreSQL ---
+
+def search_vector():
+    # Harus identik dengan ekspresi index ix_messages_content_fts agar planner memakai index GIN
+    return func.to_tsvector(literal(CHAT_SEARCH_CONFIG).cast(REGCONFIG), chat_models.Message.content)
+
+
+def _search_postgres(db: Session, user_id: int, q: str, skip: int, limit: int) -> List[dict]:
+    config = literal(CHAT_SEARCH_CONFIG).cast(REGCONFIG)
+    tsquery = func.websearch_to_tsquery(config, q)
+    rank = func.ts_rank_cd(search_vector(), tsquery)
+    # Halaman dipilih dulu (hanya id + rank); ts_headline yang mahal dihitung untuk baris halaman saja
+    page = db.query(
+        chat_models.Message.id, rank.label("rank"), chat_models.Message.timestamp
+    ).join(
+        chat_models.ChatParticipant,
+        and_(chat_models.ChatParticipant.chat_id == chat_models.Message.chat_id,
+             chat_models.ChatParticipant.user_id == user_id),
+    ).filter(
+        search_vector().op("@@")(tsquery)
+    ).order_by(
+        rank.desc(), chat_models.Message.timestamp.desc(), chat_models.Message.id
+    ).offset(skip).limit(limit).subquery()
+
+    rows = db.query(
+        *_hit_columns(),
+        page.c.rank,
+        func.ts_headline(config, chat_models.Message.content, tsquery, HEADLINE_OPTIONS).label("snippet"),
+    ).join(
+        page, page.c.id == chat_models.Message.id
+    ).join(
+        models.User, models.User.id == chat_models.Message.sender_id
+    ).order_by(page.c.rank.desc(), page.c.timestamp.desc(), page.c.id).all()
+    return [dict(row._mapping, rank=float(row.rank), snippet=render_snippet(row.snippet)) for row in rows]
+
+
+# --- SQLite: inverted index di memori ---
+
+class InvertedIndex:
+    BATCH_SIZE = 5000
+    K1, B = 1.2, 0.75
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # token -> {chat_id: {message_id: frekuensi}}: pencarian hanya menyentuh chat milik pemanggil
+        self.postings: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self.frequencies: Dict[str, int] = {}  # token -> jumlah pesan yang memuatnya (untuk idf)
+        self.documents: Dict[str, Tuple[int, int]] = {}  # message_id -> (panjang, rowid)
+        self.total_length = 0
+        # rowid SQLite naik monoton untuk setiap insert, jadi pesan baru selalu di atas watermark
+        # (berbeda dengan timestamp yang bisa mundur antar worker). Pesan tidak pernah diubah.
+        self.watermark = 0
+        self.built = time.monotonic()
+
+    def catch_up(self, db: Session) -> int:
+        rowid = literal_column("messages.rowid")
+        result = db.execute(
+            select(rowid, chat_models.Message.id, chat_models.Message.chat_id, chat_models.Message.content)
+            .where(rowid > self.watermark)
+            .order_by(rowid)
+            .execution_options(yield_per=self.BATCH_SIZE)
+        )
+        indexed = 0
+        # Satu statement yang di-stream; lock dipegang per batch agar pencarian lain tetap berjalan
+        for batch in result.partitions():
+            with self.lock:
+                for row_id, message_id, chat_id, content in batch:
+                    if row_id <= self.watermark:
+                        continue
+                    tokens = tokenize(content)
+                    counts: Dict[str, int] = {}
+                    for token in tokens:
+                        counts[token] = counts.get(token, 0) + 1
+                    for token, count in counts.items():
+                        self.postings.setdefault(token, {}).setdefault(chat_id, {})[message_id] = count
+                        self.frequencies[token] = self.frequencies.get(token, 0) + 1
+                    self.documents[message_id] = (len(tokens), row_id)
+                    self.total_length += len(tokens)
+                    self.watermark = row_id
+                    indexed += 1
+        return indexed
+
+    def discard(self, message_ids) -> None:
+        # Posting dan frekuensi kata pesan yang hilang baru dibersihkan saat index dibangun ulang;
+        # sampai saat itu pesan ini hanya dilewati oleh search()
+        with self.lock:
+            for message_id in message_ids:
+                document = self.documents.pop(message_id, None)
+                if document is not None:
+                    self.total_length -= document[0]
+
+    def search(self, terms: List[str], chat_ids: set, skip: int, limit: int) -> List[Tuple[str, float]]:
+        with self.lock:
+            by_chat = [self.postings.get(term) for term in terms]
+            if any(not postings for postings in by_chat):
+                return []
+            total = len(self.documents)
+            if not total:
+                return []
+            average = self.total_length / total
+            idfs = [
+                math.log(1 + (total - self.frequencies[term] + 0.5) / (self.frequencies[term] + 0.5))
+                for term in terms
+            ]
+            # Chat yang perlu diperiksa: irisan chat pemanggil dengan chat yang memuat kata paling jarang
+            rarest = min(by_chat, key=len)
+            candidates = chat_ids if len(chat_ids) < len(rarest) else rarest.keys()
+            scored = []
+            for chat_id in candidates:
+                if chat_id not in chat_ids:
+                    continue
+                lists = [postings.get(chat_id) for postings in by_chat]
+                if any(not postings for postings in lists):
+                    continue
+                # Iterasi daftar posting terpendek di chat ini, lalu cek kata lain (AND)
+                for message_id in min(lists, key=len):
+                    document = self.documents.get(message_id)
+                    if document is None:
+                        continue
+                    length, row_id = document
+                    score = 0.0
+                    for postings, idf in zip(lists, idfs):
+                        frequency = postings.get(message_id)
+                        if frequency is None:
+                            break
+                        norm = frequency + self.K1 * (1 - self.B + self.B * length / average)
+                        score += idf * frequency * (self.K1 + 1) / norm
+                    else:
+                        scored.append((-score, -row_id, message_id))
+        scored.sort()
+        return [(message_id, -score) for score, _, message_id in scored[skip:skip + limit]]
+
+
+_index = InvertedIndex()
+_rebuild_lock = threading.Lock()
+
+
+def _current_index(db: Session) -> InvertedIndex:
+    global _index
+    index = _index
+    expired = MESSAGE_SEARCH_REBUILD_SECONDS > 0 and time.monotonic() - index.built > MESSAGE_SEARCH_REBUILD_SECONDS
+    # Satu request membangun index baru; request lain tetap memakai index lama sampai selesai
+    if expired and _rebuild_lock.acquire(blocking=False):
+        try:
+            index = InvertedIndex()
+            index.catch_up(db)
+            _index = index
+        finally:
+            _rebuild_lock.release()
+    index.catch_up(db)
+    return index
+
+
+def highlight(content: str, terms: set) -> str:
+    words = list(re.finditer(r"\S+", content))
+    first = next((i for i, word in enumerate(words) if any(t.casefold() in terms for t in _TOKEN.findall(word.group()))), 0)
+    start = max(0, first - SNIPPET_MAX_WORDS // 3)
+    window = words[start:start + SNIPPET_MAX_WORDS]
+    marked = " ".join(
+        _TOKEN.sub(lambda m: f"{MARK_START}{m.group()}{MARK_STOP}" if m.group().casefold() in terms else m.group(), word.group())
+        for word in window
+    )
+    if start > 0:
+        marked = "… " + marked
+    if start + SNIPPET_MAX_WORDS < len(words):
+        marked += " …"
+    return marked
+
+
+def _search_memory(db: Session, user_id: int, q: str, skip: int, limit: int) -> List[dict]:
+    terms = list(dict.fromkeys(tokenize(q)))[:SEARCH_MAX_TERMS]
+    if not terms:
+        return []
+    index = _current_index(db)
+    chat_ids = {chat_id for (chat_id,) in db.query(chat_models.ChatParticipant.chat_id).filter(
+        chat_models.ChatParticipant.user_id == user_id
+    )}
+    page = index.search(terms, chat_ids, skip, limit)
+    if not page:
+        return []
+    rows = {row.id: row for row in db.query(*_hit_columns(), chat_models.Message.content).join(
+        models.User, models.User.id == chat_models.Message.sender_id
+    ).filter(chat_models.Message.id.in_([message_id for message_id, _ in page]))}
+    # Pesan yang sudah dihapus atau diarsipkan tidak dimunculkan lagi di pencarian berikutnya
+    missing = [message_id for message_id, _ in page if message_id not in rows]
+    if missing:
+        index.discard(missing)
+    term_set = set(terms)
+    hits = []
+    for message_id, score in page:
+        row = rows.get(message_id)
+        if row is None:
+            continue
+        hit = dict(row._mapping)
+        hit["snippet"] = render_snippet(highlight(hit.pop("content"), term_set))
+        hit["rank"] = round(score, 4)
+        hits.append(hit)
+    return hits
+
+
+def search(db: Session, user_id: int, q: str, skip: int = 0, limit: int = 20) -> List[dict]:
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgres(db, user_id, q, skip, limit)
+    return _search_memory(db, user_id, q, skip, limit)
@@ -0,0 +1,221 @@
+# app/metrics.py
+#
+# Metrik per route: histogram latensi, jumlah query SQL, waktu database dan jumlah commit.
+# Statistik per request dikumpulkan lewat ContextVar yang diisi oleh hook event SQLAlchemy,
+# lalu digabung ke registry proses ketika response selesai. Registry ini milik satu worker;
+# label `worker` (pid) menjaga setiap deret tetap monoton di belakang gunicorn multi-worker.
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import query_budget, structured_logging
+
+access_logger = logging.getLogger("app.access")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "commits", "statements")
+
+    def __init__(self, capture_statements: bool = False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.commits = 0
+        # Teks statement hanya disimpan saat pemeriksaan query budget aktif
+        self.statements = [] if capture_statements else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries_per_request", "statuses", "queries", "db_time", "commits")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries_per_request = Histogram(QUERY_COUNT_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.commits = 0
+
+
+_routes: Dict[Tuple[str, str], RouteMetrics] = {}
+_lock = threading.Lock()
+
+
+def record(method: str, route: str, status: int, elapsed: float, stats: RequestStats) -> None:
+    with _lock:
+        metrics = _routes.get((method, route))
+        if metrics is None:
+            metrics = _routes[(method, route)] = RouteMetrics()
+        metrics.latency.observe(elapsed)
+        metrics.queries_per_request.observe(stats.queries)
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.queries += stats.queries
+        metrics.db_time += stats.db_time
+        metrics.commits += stats.commits
+
+
+# --- Hook SQLAlchemy: dipasang di kelas Engine sehingga berlaku untuk semua engine ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+        if stats.statements is not None:
+            stats.statements.append(statement)
+
+
+@event.listens_for(Engine, "commit")
+def _on_commit(conn):
+    stats = _current.get()
+    if stats is not None:
+        stats.commits += 1
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI murni (bukan BaseHTTPMiddleware) agar biaya per request hanya beberapa
+    pemanggilan perf_counter dan satu lock singkat saat mencatat.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(capture_statements=query_budget.enabled())
+        token = _current.set(stats)
+        status_holder = [500]
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # FastAPI menaruh route yang cocok di scope; template path menjaga kardinalitas label tetap kecil
+            route = scope.get("route")
+            elapsed = time.perf_counter() - started
+            record(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_holder[0],
+                elapsed,
+                stats,
+            )
+            if stats.statements is not None and route is not None:
+                query_budget.check(scope["method"], route, stats)
+            if structured_logging.access_enabled():
+                access_logger.info("request", extra={
+                    "status": status_holder[0],
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "queries": stats.queries,
+                    "db_ms": round(stats.db_time * 1000, 2),
+                    "commits": stats.commits,
+                })
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _histogram_lines(name: str, histogram: Histogram, labels: str) -> list:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    # pid dibaca saat render, bukan saat import, agar benar juga dengan gunicorn --preload
+    worker = os.getpid()
+    with _lock:
+        snapshot = list(_routes.items())
+        lines = [
+            "# HELP kanapp_http_request_duration_seconds Latensi request per route.",
+            "# TYPE kanapp_http_request_duration_seconds histogram",
+        ]
+        for (method, route), metrics in snapshot:
+            lines += _histogram_lines(
+                "kanapp_http_request_duration_seconds", metrics.latency,
+                _labels(worker=worker, method=method, route=route),
+            )
+        lines += [
+            "# HELP kanapp_db_queries_per_request Jumlah statement SQL per request.",
+            "# TYPE kanapp_db_queries_per_request histogram",
+        ]
+        for (method, route), metrics in snapshot:
+            lines += _histogram_lines(
+                "kanapp_db_queries_per_request", metrics.queries_per_request,
+                _labels(worker=worker, method=method, route=route),
+            )
+        lines += [
+            "# HELP kanapp_http_requests_total Jumlah request per route dan status.",
+            "# TYPE kanapp_http_requests_total counter",
+        ]
+        for (method, route), metrics in snapshot:
+            for status, count in sorted(metrics.statuses.items()):
+                labels = _labels(worker=worker, method=method, route=route, status=status)
+                lines.append(f"kanapp_http_requests_total{{{labels}}} {count}")
+        counters = (
+            ("kanapp_db_queries_total", "Jumlah statement SQL.", "queries"),
+            ("kanapp_db_time_seconds_total", "Waktu yang dihabiskan di database.", "db_time"),
+            ("kanapp_db_commits_total", "Jumlah commit transaksi.", "commits"),
+        )
+        for name, help_text, attribute in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (method, route), metrics in snapshot:
+                labels = _labels(worker=worker, method=method, route=route)
+                lines.append(f"{name}{{{labels}}} {getattr(metrics, attribute)}")
+    return "\n".join(lines) + "\n"
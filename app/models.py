@@ -1,9 +1,10 @@
 # app/models.py
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Date, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
+import os
 
 class User(Base):
     __tablename__ = "users"
@@ -17,13 +18,25 @@ class User(Base):
     disease = Column(String, nullable=True)
     date_of_birth = Column(Date, nullable=True)
     place_of_birth = Column(String, nullable=True)
+    # Naik setiap kali baris diubah lewat ORM; dipakai sebagai ETag /users/me/ dan nama di daftar chat
+    version = Column(Integer, nullable=False, server_default="1")
+    # Naik saat logout/ganti password; token dengan generasi lebih lama ditolak (lihat auth.py)
+    token_generation = Column(Integer, nullable=False, server_default="0")
+    tokens_revoked_at = Column(DateTime, nullable=True, index=True)
 
     data_entries = relationship("DataEntry", back_populates="owner")
     activity_logs = relationship("ActivityLog", back_populates="user")
     reports = relationship("UserReport", back_populates="user")
     chats = relationship("ChatParticipant", back_populates="user")
+
+    __mapper_args__ = {"version_id_col": version}
+
 class DataEntry(Base):
     __tablename__ = "data_entries"
+    # Sinkronisasi inkremental: GET /data_entries/changes?since=<version> membaca index ini
+    __table_args__ = (
+        Index("ix_data_entries_owner_id_version", "owner_id", "version"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     string_field1 = Column(String, nullable=False)
@@ -38,15 +51,59 @@ class DataEntry(Base):
     int_field7 = Column(Integer, nullable=False)
     int_field8 = Column(Integer, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Versi baris per pemilik, naik setiap create/update/delete (lihat data_sync.next_version)
+    version = Column(Integer, nullable=False, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    # Tombstone: baris yang dihapus tetap disimpan agar klien sync tahu harus menghapusnya
+    deleted_at = Column(DateTime, nullable=True)
 
     owner = relationship("User", back_populates="data_entries")
 
+# Filter/urutan GET /data_entries/ (lihat data_query.py): index (owner_id, kolom, id) hanya untuk baris
+# yang belum dihapus. Setiap index menambah biaya tulis, jadi defaultnya hanya urutan default (id) dan
+# pencarian prefix string_field1; operator bisa menambah kolom lain lewat DATA_ENTRY_INDEXED_FIELDS
+# (kolom lain tetap bisa difilter, tanpa index).
+DATA_ENTRY_INDEXED_FIELDS = os.getenv("DATA_ENTRY_INDEXED_FIELDS", "id,string_field1")
+
+
+def _data_entry_indexes(fields: str) -> None:
+    live = DataEntry.deleted_at.is_(None)
+    for field in filter(None, (name.strip() for name in fields.split(","))):
+        column = getattr(DataEntry, field)
+        name = f"ix_data_entries_owner_id_{field}"
+        if isinstance(column.type, String):
+            # PostgreSQL: collation "C" (urutan code point) agar prefix bisa dijawab sebagai range index
+            Index(name, DataEntry.owner_id, column.collate("C"), DataEntry.id,
+                  postgresql_where=live).ddl_if(dialect="postgresql")
+            Index(name, DataEntry.owner_id, column, DataEntry.id,
+                  sqlite_where=live).ddl_if(callable_=lambda ddl, target, bind, **kw: bind.dialect.name != "postgresql")
+        elif field == "id":
+            Index(name, DataEntry.owner_id, DataEntry.id, postgresql_where=live, sqlite_where=live)
+        else:
+            Index(name, DataEntry.owner_id, column, DataEntry.id, postgresql_where=live, sqlite_where=live)
+
+
+_data_entry_indexes(DATA_ENTRY_INDEXED_FIELDS)
+
+
+class DataEntryClock(Base):
+    # Versi terakhir data entry per pemilik; baris ini dikunci selama transaksi tulis sehingga
+    # urutan versi sama dengan urutan commit
+    __tablename__ = "data_entry_clocks"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, server_default="0")
+
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
+    # Di PostgreSQL tabel ini dipartisi per bulan berdasarkan timestamp (lihat log_retention.py)
+    __table_args__ = (
+        Index("ix_activity_logs_user_id_timestamp", "user_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     action = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
 
     user = relationship("User", back_populates="activity_logs")
@@ -66,4 +123,54 @@ class UserReport(Base):
     int_value8 = Column(Integer, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
 
-    user = relationship("User", back_populates="reports")
\ No newline at end of file
+    user = relationship("User", back_populates="reports")
+
+class Job(Base):
+    __tablename__ = "jobs"
+    # Runner mengambil job antre yang sudah jatuh tempo lewat index ini (lihat jobs.py)
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        # enqueue(key=...): cek job antre yang sama sebelum menambah job baru
+        Index("ix_jobs_type_dedupe_key", "type", "dedupe_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    dedupe_key = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # JSON, nilai kembali handler
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    # Satu hasil per (user, key); constraint ini juga yang menahan request kembar yang berjalan bersamaan
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    key = Column(String(255), nullable=False)
+    scope = Column(String, nullable=False)  # endpoint, mis. "POST /messages"
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)  # body JSON
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    # Satu baris per refresh token yang diterbitkan (jti dari JWT); used_at terisi saat ditukar sehingga
+    # setiap refresh token hanya berlaku sekali
+
+    jti = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime, nullable=True)
@@ -0,0 +1,62 @@
+# app/passwords.py
+#
+# Konteks hash password (bcrypt) yang dipakai auth, ditambah hash paralel untuk impor user massal.
+# Satu hash bcrypt memakan ~0,3 detik CPU, jadi 100 ribu user butuh berjam-jam di satu core;
+# hash_many() membaginya ke PASSWORD_HASH_WORKERS proses (default: jumlah CPU).
+#
+# Modul ini sengaja hanya meng-import stdlib dan passlib: proses anak (spawn) meng-import-nya
+# untuk menjalankan _hash_chunk() tanpa memuat aplikasi.
+
+import os
+import threading
+from typing import TYPE_CHECKING, List, Optional
+
+from passlib.context import CryptContext
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Password per tugas di pool: cukup besar agar biaya pickling tidak berarti, cukup kecil agar semua proses kebagian
+PASSWORD_HASH_CHUNK = 16
+
+_pool: Optional["ProcessPoolExecutor"] = None
+_lock = threading.Lock()
+
+
+def _hash_chunk(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _get_pool() -> "ProcessPoolExecutor":
+    global _pool
+    if _pool is None:
+        # multiprocessing baru di-import saat impor massal pertama, bukan saat worker start
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        with _lock:
+            if _pool is None:
+                # spawn: proses anak tidak mewarisi lock/thread/koneksi milik worker
+                _pool = ProcessPoolExecutor(PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def hash_many(passwords: List[str]) -> List[str]:
+    """
+    Hash bcrypt untuk setiap password, urutannya sama dengan input.
+    """
+    if PASSWORD_HASH_WORKERS <= 1 or len(passwords) <= PASSWORD_HASH_CHUNK:
+        return _hash_chunk(passwords)
+    chunks = [passwords[i:i + PASSWORD_HASH_CHUNK] for i in range(0, len(passwords), PASSWORD_HASH_CHUNK)]
+    return [hashed for chunk in _get_pool().map(_hash_chunk, chunks) for hashed in chunk]
+
+
+def shutdown() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,95 @@
+# app/preflight.py
+
+import logging
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from .database import Base
+from . import log_retention
+from .media_service import UPLOAD_DIR
+from .resumable_upload import RESUMABLE_UPLOAD_DIR
+# Model harus di-import agar semua tabel terdaftar di Base.metadata
+from . import models, chat_models  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_upload_dir() -> None:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(RESUMABLE_UPLOAD_DIR, exist_ok=True)
+
+
+# Isi awal untuk kolom yang baru ditambahkan ke tabel lama, dijalankan sekali (berurutan) saat kolom dibuat
+BACKFILLS = {
+    ("chats", "updated_at"): (
+        "UPDATE chats SET updated_at = COALESCE("
+        "(SELECT MAX(messages.timestamp) FROM messages WHERE messages.chat_id = chats.id), created_at)",
+    ),
+    # id unik dan naik, jadi cukup sebagai versi awal; clock pemilik dimulai dari versi tertingginya
+    ("data_entries", "version"): (
+        "UPDATE data_entries SET version = id",
+        "INSERT INTO data_entry_clocks (owner_id, version) "
+        "SELECT owner_id, MAX(version) FROM data_entries WHERE owner_id IS NOT NULL GROUP BY owner_id",
+    ),
+    ("data_entries", "updated_at"): (
+        "UPDATE data_entries SET updated_at = CURRENT_TIMESTAMP",
+    ),
+}
+
+
+def ensure_columns(engine: Engine) -> list:
+    """
+    Migrasi aditif: menambahkan kolom model yang belum ada di tabel lama (create_all tidak mengubah
+    tabel yang sudah ada). Kolom NOT NULL wajib punya server_default.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                for statement in BACKFILLS.get((table.name, column.name), ()):
+                    conn.execute(text(statement))
+                added.append(f"{table.name}.{column.name}")
+    for name in added:
+        logger.info("Kolom ditambahkan: %s", name)
+    return added
+
+
+def ensure_indexes(engine: Engine) -> None:
+    # create_all tidak menambahkan index baru ke tabel yang sudah ada
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def run_migrations(engine: Engine) -> None:
+    """
+    Menyiapkan skema database dan direktori media. Dijalankan sekali per deploy
+    (`python -m app.cli migrate`), bukan oleh setiap worker saat import.
+    """
+    if log_retention.is_postgres(engine):
+        # activity_logs dibuat sebagai tabel terpartisi, bukan lewat create_all
+        tables = [t for t in Base.metadata.sorted_tables if t.name != log_retention.TABLE_NAME]
+        Base.metadata.create_all(bind=engine, tables=tables)
+        log_retention.setup_partitioned_table(engine)
+    else:
+        Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    ensure_upload_dir()
+    logger.info("Preflight selesai: %d tabel diperiksa", len(Base.metadata.tables))
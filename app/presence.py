@@ -0,0 +1,171 @@
+# app/presence.py
+#
+# Presence (online, terakhir terlihat) dan indikator mengetik tanpa menulis ke database:
+# - heartbeat(user) membuat user online selama PRESENCE_TTL detik; klien mengirimnya kira-kira
+#   setiap PRESENCE_TTL/2 detik selama aplikasi terbuka.
+# - set_typing(chat, user) menandai user sedang mengetik di chat itu selama TYPING_TTL detik.
+# - wait_for_change() dipakai long-poll peserta chat: kembali segera jika state chat berbeda dari
+#   yang terakhir dilihat klien, atau setelah ada perubahan (user online/berhenti mengetik/TTL habis).
+# Heartbeat yang hanya memperpanjang TTL tidak membangunkan siapa pun.
+#
+# State hanya ada di memori satu proses dan hanya diakses dari event loop, sehingga tidak perlu lock.
+# Dengan gunicorn N worker, route /presence harus dilayani satu instance single-worker (lihat README).
+# Restart berarti semua user terlihat offline sampai heartbeat berikutnya.
+#
+# Keanggotaan chat (tetap sejak chat dibuat) di-cache per proses; hanya akses pertama ke sebuah chat
+# yang membaca chat_participants.
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+PRESENCE_TTL = float(os.getenv("PRESENCE_TTL", 60))
+TYPING_TTL = float(os.getenv("TYPING_TTL", 6))
+PRESENCE_MAX_WAIT = float(os.getenv("PRESENCE_MAX_WAIT", 30))
+# "Terakhir terlihat" dilupakan setelah selang ini agar memori tidak tumbuh dengan setiap user yang pernah login
+PRESENCE_FORGET_AFTER = float(os.getenv("PRESENCE_FORGET_AFTER", 24 * 3600))
+PRESENCE_MEMBERSHIP_CACHE_SIZE = int(os.getenv("PRESENCE_MEMBERSHIP_CACHE_SIZE", 10000))
+
+
+class UserPresence(NamedTuple):
+    user_id: int
+    online: bool
+    typing: bool
+    last_seen: Optional[float]  # unix time heartbeat terakhir, None jika belum pernah terlihat oleh proses ini
+
+
+class Snapshot(NamedTuple):
+    state: str  # berubah hanya jika online/typing salah satu peserta berubah
+    participants: List[UserPresence]
+    next_change: float  # waktu monotonic TTL terdekat yang akan mengubah state
+
+
+# user_id -> (online sampai [monotonic], terakhir terlihat [unix])
+_seen: Dict[int, Tuple[float, float]] = {}
+# chat_id -> {user_id: mengetik sampai [monotonic]}
+_typing: Dict[str, Dict[int, float]] = {}
+# ("user", id) / ("chat", id) -> future long-poll yang menunggu perubahan
+_waiters: Dict[tuple, Set[asyncio.Future]] = {}
+_members: "OrderedDict[str, Tuple[int, ...]]" = OrderedDict()
+_pruned_at = float("-inf")
+
+
+def _notify(key: tuple) -> None:
+    for future in _waiters.pop(key, ()):
+        if not future.done():
+            future.set_result(None)
+
+
+def _is_online(user_id: int, now: float) -> bool:
+    entry = _seen.get(user_id)
+    return entry is not None and entry[0] > now
+
+
+def _prune(now: float) -> None:
+    global _pruned_at
+    if now - _pruned_at < PRESENCE_TTL:
+        return
+    _pruned_at = now
+    forget = time.time() - PRESENCE_FORGET_AFTER
+    for user_id, (_, last_seen) in list(_seen.items()):
+        if last_seen < forget:
+            del _seen[user_id]
+    for chat_id, typists in list(_typing.items()):
+        for user_id, until in list(typists.items()):
+            if until <= now:
+                del typists[user_id]
+        if not typists:
+            del _typing[chat_id]
+
+
+def heartbeat(user_id: int) -> None:
+    now = time.monotonic()
+    _prune(now)
+    was_online = _is_online(user_id, now)
+    _seen[user_id] = (now + PRESENCE_TTL, time.time())
+    if not was_online:
+        _notify(("user", user_id))
+
+
+def set_typing(chat_id: str, user_id: int, typing: bool) -> None:
+    # Mengetik juga berarti aplikasi terbuka
+    heartbeat(user_id)
+    now = time.monotonic()
+    typists = _typing.setdefault(chat_id, {})
+    was_typing = typists.get(user_id, 0) > now
+    if typing:
+        typists[user_id] = now + TYPING_TTL
+    else:
+        typists.pop(user_id, None)
+        if not typists:
+            del _typing[chat_id]
+    if typing != was_typing:
+        _notify(("chat", chat_id))
+
+
+def snapshot(chat_id: str, participants: Iterable[int]) -> Snapshot:
+    now = time.monotonic()
+    typists = _typing.get(chat_id, {})
+    users = []
+    next_change = float("inf")
+    for user_id in participants:
+        online_until, last_seen = _seen.get(user_id, (0, None))
+        typing_until = typists.get(user_id, 0)
+        online, typing = online_until > now, typing_until > now
+        for until in (online_until, typing_until):
+            if until > now:
+                next_change = min(next_change, until)
+        users.append(UserPresence(user_id, online, typing, last_seen))
+    state = hashlib.blake2b(
+        "|".join(f"{user.user_id}:{user.online:d}{user.typing:d}" for user in users).encode(), digest_size=8
+    ).hexdigest()
+    return Snapshot(state, users, next_change)
+
+
+async def wait_for_change(chat_id: str, participants: Tuple[int, ...], since: Optional[str], timeout: float) -> Snapshot:
+    """
+    Mengembalikan snapshot chat begitu state-nya berbeda dari `since`, atau setelah `timeout` detik.
+    """
+    deadline = time.monotonic() + min(max(timeout, 0), PRESENCE_MAX_WAIT)
+    loop = asyncio.get_running_loop()
+    keys = [("chat", chat_id)] + [("user", user_id) for user_id in participants]
+    while True:
+        current = snapshot(chat_id, participants)
+        now = time.monotonic()
+        if current.state != since or now >= deadline:
+            return current
+        future = loop.create_future()
+        for key in keys:
+            _waiters.setdefault(key, set()).add(future)
+        try:
+            # Bangun saat ada notifikasi, saat TTL terdekat habis (user jadi offline), atau saat deadline
+            await asyncio.wait({future}, timeout=min(deadline, current.next_change) - now)
+        finally:
+            for key in keys:
+                waiters = _waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(future)
+                    if not waiters:
+                        del _waiters[key]
+
+
+def cached_members(chat_id: str) -> Optional[Tuple[int, ...]]:
+    members = _members.get(chat_id)
+    if members is not None:
+        _members.move_to_end(chat_id)
+    return members
+
+
+def remember_members(chat_id: str, user_ids: Iterable[int]) -> Tuple[int, ...]:
+    members = tuple(sorted(user_ids))
+    # Chat yang tidak ada tidak di-cache: id acak tidak boleh membuat cache tumbuh
+    if members:
+        _members[chat_id] = members
+        _members.move_to_end(chat_id)
+        while len(_members) > PRESENCE_MEMBERSHIP_CACHE_SIZE:
+            _members.popitem(last=False)
+    return members
+
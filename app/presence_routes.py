@@ -0,0 +1,87 @@
+# app/presence_routes.py
+#
+# Presence dan indikator mengetik (lihat presence.py), tanpa menulis ke database dan tanpa activity log:
+#   POST /presence/heartbeat                 tandai user online selama PRESENCE_TTL
+#   POST /presence/chats/{chat_id}/typing    {"typing": true|false}
+#   GET  /presence/chats/{chat_id}           ?since=<state>&wait=<detik>: long-poll status peserta chat
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Depends
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+
+from . import auth, chat_models, chat_schemas, presence, schemas
+from .admission import long_poll
+from .database import SessionLocal
+from .query_budget import query_budget
+
+router = APIRouter()
+
+NOT_PARTICIPANT = "Chat not found or you're not a participant"
+
+
+def _load_members(chat_id: str) -> List[int]:
+    # Sesi singkat, bukan get_db: long-poll tidak boleh menahan koneksi pool selama menunggu
+    with SessionLocal() as db:
+        return db.execute(
+            select(chat_models.ChatParticipant.user_id).where(chat_models.ChatParticipant.chat_id == chat_id)
+        ).scalars().all()
+
+
+async def _members_for(chat_id: str, user_id: int) -> Optional[Tuple[int, ...]]:
+    members = presence.cached_members(chat_id)
+    if members is None:
+        members = presence.remember_members(chat_id, await run_in_threadpool(_load_members, chat_id))
+    return members if user_id in members else None
+
+
+@router.post("/presence/heartbeat", response_model=schemas.ResponseModel)
+@query_budget(statements=0)
+async def heartbeat(current_user: auth.Principal = Depends(auth.get_current_principal)):
+    presence.heartbeat(current_user.id)
+    return schemas.ResponseModel(success=True, data={"ttl": presence.PRESENCE_TTL})
+
+
+@router.post("/presence/chats/{chat_id}/typing", response_model=schemas.ResponseModel)
+@query_budget(statements=1)
+async def typing(
+    chat_id: str,
+    request: chat_schemas.TypingRequest,
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    if await _members_for(chat_id, current_user.id) is None:
+        return schemas.ResponseModel(success=False, error=NOT_PARTICIPANT)
+    presence.set_typing(chat_id, current_user.id, request.typing)
+    return schemas.ResponseModel(success=True, data={"ttl": presence.TYPING_TTL if request.typing else 0})
+
+
+@router.get("/presence/chats/{chat_id}", response_model=chat_schemas.ChatPresenceResponse)
+@query_budget(statements=1)
+@long_poll
+async def chat_presence(
+    chat_id: str,
+    since: Optional[str] = None,
+    wait: float = 0,
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    members = await _members_for(chat_id, current_user.id)
+    if members is None:
+        return chat_schemas.ChatPresenceResponse(success=False, error=NOT_PARTICIPANT)
+    # Membuka layar chat juga berarti aplikasi terbuka
+    presence.heartbeat(current_user.id)
+    snapshot = await presence.wait_for_change(chat_id, members, since, wait)
+    return chat_schemas.ChatPresenceResponse(success=True, data=chat_schemas.ChatPresence(
+        chat_id=chat_id,
+        state=snapshot.state,
+        participants=[
+            chat_schemas.ParticipantPresence(
+                user_id=str(user.user_id),
+                online=user.online,
+                typing=user.typing,
+                last_seen=datetime.utcfromtimestamp(user.last_seen) if user.last_seen is not None else None,
+            )
+            for user in snapshot.participants
+        ],
+    ))
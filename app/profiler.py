@@ -0,0 +1,232 @@
+# app/profiler.py
+#
+# Profil cProfile sesuai permintaan untuk route yang lambat di produksi (lihat POST /admin/profiles):
+# admin memilih route dan jumlah request; N request berikutnya ke route itu di worker yang menerima
+# perintah diprofil, lalu hasil gabungannya ditulis ke PROFILE_DIR:
+#
+#   PROFILE_DIR/<id>.prof   data pstats mentah (snakeviz, `python -m pstats`)
+#   PROFILE_DIR/<id>.txt    ringkasan 50 fungsi teratas
+#
+# - Saat tidak ada sesi, tidak ada biaya sama sekali: fungsi endpoint route (route.dependant.call)
+#   hanya dibungkus selama sesi berjalan dan dikembalikan setelah request ke-N.
+# - Endpoint sinkron berjalan di threadpool dan diprofil di thread-nya sendiri, jadi hasilnya hanya
+#   berisi request itu. Endpoint async diprofil di event loop: coroutine lain yang berjalan di sela
+#   `await` ikut tercatat, dan hanya satu request async yang diprofil pada satu waktu.
+# - Sesi bisa dihentikan lebih awal (DELETE /admin/profiles); hasilnya berisi request yang sudah diprofil.
+# - Sesi hanya berlaku di worker yang menerima perintah; dengan gunicorn N worker, ulangi perintah
+#   atau gunakan requests yang cukup besar. PROFILE_DIR sebaiknya dibagi semua worker di host.
+
+import asyncio
+import io
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+# cProfile/pstats baru di-import saat sesi pertama dimulai, bukan saat worker start
+if TYPE_CHECKING:
+    import cProfile
+    import pstats
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_REQUESTS = int(os.getenv("PROFILE_MAX_REQUESTS", 100))
+# File hasil yang disimpan; yang tertua dihapus
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+SORT_KEYS = ("cumulative", "tottime", "calls")
+REPORT_LINES = 50
+
+_ID = re.compile(r"^[\w.-]+$")
+
+
+class ProfileError(ValueError):
+    pass
+
+
+class ProfileSession:
+    def __init__(self, route: APIRoute, method: str, requests: int, sort: str):
+        slug = re.sub(r"[^\w]+", "_", route.path).strip("_") or "root"
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S.%f}-{method.lower()}-{slug}-{os.getpid()}"
+        self.route = route
+        self.method = method
+        self.requests = requests
+        self.sort = sort
+        self.original = route.dependant.call
+        self.profiled = 0
+        self.in_flight = 0
+        self.total_time = 0.0
+        self.stats: Optional["pstats.Stats"] = None
+        self.lock = threading.Lock()
+        self.async_busy = False
+        self.closed = False
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.route.path,
+            "requests": self.requests,
+            "profiled": self.profiled,
+            "worker": os.getpid(),
+        }
+
+    def _claim(self) -> bool:
+        with self.lock:
+            if self.closed or self.profiled + self.in_flight >= self.requests:
+                return False
+            self.in_flight += 1
+            return True
+
+    def _record(self, profile: "cProfile.Profile", elapsed: float) -> None:
+        import pstats
+
+        profile.create_stats()
+        with self.lock:
+            self.in_flight -= 1
+            self.profiled += 1
+            self.total_time += elapsed
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            done = self.profiled >= self.requests
+        if done:
+            finish(self)
+
+    def wrap(self):
+        import cProfile
+
+        original = self.original
+        session = self
+
+        # Harus sama dengan sifat endpoint asli: FastAPI memutuskan await vs threadpool saat route dibuat
+        if asyncio.iscoroutinefunction(original):
+            async def profiled_call(*args, **kwargs):
+                if session.async_busy or not session._claim():
+                    return await original(*args, **kwargs)
+                session.async_busy = True
+                profile = cProfile.Profile()
+                started = time.perf_counter()
+                profile.enable()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    profile.disable()
+                    session.async_busy = False
+                    session._record(profile, time.perf_counter() - started)
+        else:
+            def profiled_call(*args, **kwargs):
+                if not session._claim():
+                    return original(*args, **kwargs)
+                profile = cProfile.Profile()
+                started = time.perf_counter()
+                profile.enable()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    profile.disable()
+                    session._record(profile, time.perf_counter() - started)
+
+        profiled_call.__wrapped__ = original
+        return profiled_call
+
+
+_lock = threading.Lock()
+_sessions: Dict[int, ProfileSession] = {}  # id(route) -> sesi aktif
+
+
+def _find_route(routes, method: str, path: str) -> APIRoute:
+    for route in routes:
+        if isinstance(route, APIRoute) and route.path == path and method in route.methods:
+            return route
+    raise ProfileError(f"Route {method} {path} tidak ditemukan (gunakan template path, misalnya /chats/{{chat_id}}/messages)")
+
+
+def start(routes, method: str, path: str, requests: int, sort: str = "cumulative") -> dict:
+    """
+    Memulai profil `requests` request berikutnya ke route (method, path template) di worker ini.
+    """
+    method = method.upper()
+    if not 1 <= requests <= PROFILE_MAX_REQUESTS:
+        raise ProfileError(f"requests harus antara 1 dan {PROFILE_MAX_REQUESTS}")
+    if sort not in SORT_KEYS:
+        raise ProfileError(f"sort harus salah satu dari: {', '.join(SORT_KEYS)}")
+    route = _find_route(routes, method, path)
+    with _lock:
+        if id(route) in _sessions:
+            raise ProfileError(f"Route {method} {path} sedang diprofil ({_sessions[id(route)].id})")
+        session = ProfileSession(route, method, requests, sort)
+        _sessions[id(route)] = session
+        # FastAPI memanggil dependant.call saat request masuk, jadi penggantian berlaku segera
+        route.dependant.call = session.wrap()
+    return session.info()
+
+
+def finish(session: ProfileSession) -> Optional[str]:
+    """
+    Mengembalikan endpoint asli dan menulis hasil sesi; id hasil, atau None jika belum ada request.
+    """
+    with _lock:
+        if _sessions.get(id(session.route)) is not session:
+            return None
+        del _sessions[id(session.route)]
+        session.route.dependant.call = session.original
+    with session.lock:
+        session.closed = True
+        stats = session.stats
+    if stats is None:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats.dump_stats(os.path.join(PROFILE_DIR, f"{session.id}.prof"))
+    report = io.StringIO()
+    report.write(
+        f"{session.method} {session.route.path}: {session.profiled} request, "
+        f"rata-rata {session.total_time / session.profiled * 1000:.1f} ms, worker {os.getpid()}\n"
+    )
+    stats.stream = report
+    stats.sort_stats(session.sort).print_stats(REPORT_LINES)
+    with open(os.path.join(PROFILE_DIR, f"{session.id}.txt"), "w") as f:
+        f.write(report.getvalue())
+    _prune()
+    return session.id
+
+
+def stop(routes, method: str, path: str) -> Optional[str]:
+    route = _find_route(routes, method.upper(), path)
+    with _lock:
+        session = _sessions.get(id(route))
+    if session is None:
+        raise ProfileError(f"Route {method.upper()} {path} tidak sedang diprofil")
+    return finish(session)
+
+
+def active() -> List[dict]:
+    with _lock:
+        return [session.info() for session in _sessions.values()]
+
+
+def results() -> List[str]:
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted((name[:-4] for name in names if name.endswith(".txt")), reverse=True)
+
+
+def result_path(profile_id: str, raw: bool = False) -> Optional[str]:
+    if not _ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{'prof' if raw else 'txt'}")
+    return path if os.path.exists(path) else None
+
+
+def _prune() -> None:
+    for profile_id in results()[PROFILE_KEEP:]:
+        for suffix in (".prof", ".txt"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,106 @@
+# app/query_budget.py
+#
+# Anggaran query per endpoint. Setiap route mendeklarasikan jumlah maksimum statement SQL dan
+# commit per pemanggilan lewat dekorator @query_budget; MetricsMiddleware memeriksanya setelah
+# request selesai bila pemeriksaan aktif (QUERY_BUDGET_MODE=warn, atau di dalam blok enforce()).
+# `python -m app.cli check-budgets` memanggil setiap route terhadap database berisi data realistis.
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# off: tidak ada biaya tambahan; warn: pelanggaran dicatat ke log beserta daftar statement
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off")
+
+
+class QueryBudget:
+    __slots__ = ("statements", "commits")
+
+    def __init__(self, statements: int, commits: int):
+        self.statements = statements
+        self.commits = commits
+
+
+class Violation:
+    __slots__ = ("method", "path", "budget", "queries", "commits", "statements")
+
+    def __init__(self, method: str, path: str, budget: QueryBudget, queries: int, commits: int, statements: List[str]):
+        self.method = method
+        self.path = path
+        self.budget = budget
+        self.queries = queries
+        self.commits = commits
+        self.statements = statements
+
+    def __str__(self) -> str:
+        lines = [
+            f"{self.method} {self.path}: {self.queries} statement (budget {self.budget.statements}), "
+            f"{self.commits} commit (budget {self.budget.commits})"
+        ]
+        lines += [f"  {i + 1:>3}. {' '.join(statement.split())}" for i, statement in enumerate(self.statements)]
+        return "\n".join(lines)
+
+
+class QueryBudgetExceeded(AssertionError):
+    def __init__(self, violations: List[Violation]):
+        self.violations = violations
+        super().__init__("Query budget terlampaui:\n" + "\n".join(str(v) for v in violations))
+
+
+def query_budget(statements: int, commits: int = 0):
+    """
+    Menandai endpoint dengan anggaran statement SQL dan commit per pemanggilan.
+    Letakkan di bawah dekorator route agar FastAPI mendaftarkan fungsi yang sudah ditandai.
+    """
+    def decorator(func):
+        func.__query_budget__ = QueryBudget(statements, commits)
+        return func
+    return decorator
+
+
+def budget_for(endpoint) -> Optional[QueryBudget]:
+    return getattr(endpoint, "__query_budget__", None)
+
+
+_lock = threading.Lock()
+_collectors: List[List[Violation]] = []
+
+
+def enabled() -> bool:
+    return QUERY_BUDGET_MODE != "off" or bool(_collectors)
+
+
+def check(method: str, route, stats) -> None:
+    budget = budget_for(getattr(route, "endpoint", None))
+    if budget is None:
+        return
+    if stats.queries <= budget.statements and stats.commits <= budget.commits:
+        return
+    violation = Violation(method, route.path, budget, stats.queries, stats.commits, list(stats.statements))
+    logger.warning("%s", violation)
+    with _lock:
+        for collector in _collectors:
+            collector.append(violation)
+
+
+@contextmanager
+def enforce():
+    """
+    Mengaktifkan pemeriksaan selama blok berjalan dan melempar QueryBudgetExceeded di akhir blok
+    jika ada request yang melampaui anggarannya. Dipakai check-budgets dan fixture pytest
+    query_budget_guard (tests/conftest.py).
+    """
+    collected: List[Violation] = []
+    with _lock:
+        _collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        with _lock:
+            _collectors.remove(collected)
+    if collected:
+        raise QueryBudgetExceeded(collected)
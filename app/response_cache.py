@@ -0,0 +1,140 @@
+# app/response_cache.py
+#
+# Cache respons untuk endpoint publik (static token) yang dipanggil integrasi back-office dengan
+# parameter yang sama setiap beberapa detik. Kunci: template route + path params + query params.
+# Entri kedaluwarsa setelah RESPONSE_CACHE_TTL detik dan dibuang lebih awal lewat invalidate(tag)
+# oleh endpoint tulis yang memengaruhinya. Ukuran dibatasi jumlah entri dan total byte (LRU).
+#
+# Cache ini milik satu worker: invalidasi hanya berlaku di worker yang menangani penulisan,
+# worker lain paling lama tertinggal RESPONSE_CACHE_TTL detik. RESPONSE_CACHE_TTL=0 mematikan cache.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .serializers import JSONBytesResponse
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 30))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+class _Entry:
+    __slots__ = ("body", "tag", "expires")
+
+    def __init__(self, body: bytes, tag: str, expires: float):
+        self.body = body
+        self.tag = tag
+        self.expires = expires
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+_bytes = 0
+# Generasi per tag: naik setiap invalidate, agar hasil query yang dimulai sebelum penulisan
+# tidak disimpan setelah invalidasi terjadi
+_generations: Dict[str, int] = {}
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+_route_stats: Dict[str, list] = {}
+
+
+def key(request: Request) -> tuple:
+    route = request.scope["route"].path
+    return (
+        route,
+        tuple(sorted(request.path_params.items())),
+        tuple(sorted(request.query_params.multi_items())),
+    )
+
+
+def _remove(cache_key: tuple) -> None:
+    global _bytes
+    entry = _entries.pop(cache_key)
+    _bytes -= len(entry.body)
+
+
+def get(cache_key: tuple) -> Optional[Response]:
+    now = time.monotonic()
+    with _lock:
+        counts = _route_stats.setdefault(cache_key[0], [0, 0])
+        entry = _entries.get(cache_key)
+        if entry is not None and entry.expires <= now:
+            _remove(cache_key)
+            _stats["expirations"] += 1
+            entry = None
+        if entry is None:
+            _stats["misses"] += 1
+            counts[1] += 1
+            return None
+        _entries.move_to_end(cache_key)
+        _stats["hits"] += 1
+        counts[0] += 1
+        body = entry.body
+    return JSONBytesResponse(content=body, headers={"X-Cache": "HIT"})
+
+
+def generation(tag: str) -> int:
+    with _lock:
+        return _generations.get(tag, 0)
+
+
+def put(cache_key: tuple, response: Response, tag: str, started_generation: int) -> Response:
+    """
+    Menyimpan body respons lalu mengembalikan respons itu sendiri. Tidak menyimpan apa pun jika tag
+    sudah diinvalidasi sejak `started_generation` dibaca (sebelum query dijalankan).
+    """
+    global _bytes
+    body = response.body
+    if RESPONSE_CACHE_TTL <= 0 or len(body) > RESPONSE_CACHE_MAX_BYTES:
+        return response
+    with _lock:
+        if _generations.get(tag, 0) != started_generation:
+            return response
+        if cache_key in _entries:
+            _remove(cache_key)
+        _entries[cache_key] = _Entry(body, tag, time.monotonic() + RESPONSE_CACHE_TTL)
+        _bytes += len(body)
+        _stats["stores"] += 1
+        while len(_entries) > RESPONSE_CACHE_MAX_ENTRIES or _bytes > RESPONSE_CACHE_MAX_BYTES:
+            _remove(next(iter(_entries)))
+            _stats["evictions"] += 1
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+
+def invalidate(tag: str) -> int:
+    with _lock:
+        _generations[tag] = _generations.get(tag, 0) + 1
+        stale = [cache_key for cache_key, entry in _entries.items() if entry.tag == tag]
+        for cache_key in stale:
+            _remove(cache_key)
+        _stats["invalidations"] += len(stale)
+    return len(stale)
+
+
+def _ratio(hits: int, misses: int) -> Optional[float]:
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+def stats() -> dict:
+    with _lock:
+        result = dict(_stats)
+        result.update({
+            "entries": len(_entries),
+            "bytes": _bytes,
+            "max_entries": RESPONSE_CACHE_MAX_ENTRIES,
+            "max_bytes": RESPONSE_CACHE_MAX_BYTES,
+            "ttl_seconds": RESPONSE_CACHE_TTL,
+            "hit_ratio": _ratio(_stats["hits"], _stats["misses"]),
+            "routes": {
+                route: {"hits": hits, "misses": misses, "hit_ratio": _ratio(hits, misses)}
+                for route, (hits, misses) in _route_stats.items()
+            },
+        })
+    return result
@@ -0,0 +1,189 @@
+# app/resumable_upload.py
+#
+# Upload media bertahap ala tus untuk file besar (video) dari jaringan seluler yang sering putus:
+#   POST   /messages/uploads                   buat upload (ukuran total + content type)
+#   PATCH  /messages/uploads/{id}              kirim potongan berikutnya, header Upload-Offset wajib
+#                                              sama dengan offset server
+#   HEAD   /messages/uploads/{id}              offset saat ini (untuk melanjutkan setelah putus)
+#   POST   /messages/uploads/{id}/finalize     pindahkan file lengkap ke media storage
+#   DELETE /messages/uploads/{id}              batalkan
+#
+# State disimpan di disk lokal (RESUMABLE_UPLOAD_DIR, di luar direktori /media yang disajikan
+# publik): <id>.json berisi pemilik, ukuran dan content type; <id>.part berisi byte yang sudah
+# diterima. Offset adalah ukuran file .part, sehingga byte yang sudah tertulis sebelum koneksi
+# putus tetap dihitung. flock pada <id>.json mencegah dua PATCH menulis upload yang sama.
+# Semua worker harus berbagi direktori yang sama (satu host).
+
+import asyncio
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Tuple
+
+import aiofiles
+from fastapi import HTTPException
+
+from .media_service import classify_media, media_filename
+from .media_storage import get_storage
+
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", "uploads_partial")
+RESUMABLE_MAX_SIZE = int(os.getenv("RESUMABLE_MAX_SIZE", 1024 * 1024 * 1024))  # 1GB
+# Upload yang belum di-finalize dibuang setelah sekian detik sejak dibuat (python -m app.cli prune-uploads)
+RESUMABLE_UPLOAD_TTL = int(os.getenv("RESUMABLE_UPLOAD_TTL", 24 * 3600))
+ALLOWED_TYPES = ("image", "video")
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _paths(upload_id: str) -> Tuple[str, str]:
+    base = os.path.join(RESUMABLE_UPLOAD_DIR, upload_id)
+    return base + ".json", base + ".part"
+
+
+def status(upload_id: str, meta: dict) -> dict:
+    _, data_path = _paths(upload_id)
+    return {
+        "upload_id": upload_id,
+        "offset": os.path.getsize(data_path),
+        "length": meta["length"],
+        "content_type": meta["content_type"],
+        "expires_at": datetime.utcfromtimestamp(meta["created_at"] + RESUMABLE_UPLOAD_TTL),
+    }
+
+
+def create(user_id: int, length: int, content_type: str) -> Tuple[str, dict]:
+    # Mengembalikan (upload_id, metadata)
+    file_type, _ = classify_media(content_type)
+    if file_type not in ALLOWED_TYPES:
+        raise HTTPException(status_code=400, detail="Only image and video files are allowed")
+    if length <= 0:
+        raise HTTPException(status_code=400, detail="length harus lebih dari 0")
+    if length > RESUMABLE_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"File size exceeds the limit of {RESUMABLE_MAX_SIZE / 1024 / 1024}MB")
+
+    os.makedirs(RESUMABLE_UPLOAD_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    meta_path, data_path = _paths(upload_id)
+    meta = {"user_id": user_id, "length": length, "content_type": content_type, "created_at": time.time()}
+    open(data_path, "wb").close()
+    # Metadata ditulis terakhir dan atomik: upload baru terlihat setelah kedua file siap
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return upload_id, meta
+
+
+def discard(upload_id: str) -> None:
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def locked(upload_id: str, user_id: int) -> Iterator[dict]:
+    """
+    Membuka upload milik `user_id` dengan kunci eksklusif dan menghasilkan metadatanya.
+    404 jika tidak ada/milik user lain/kedaluwarsa, 423 jika sedang dipakai request lain.
+    """
+    meta_path, _ = _paths(upload_id)
+    if not _UPLOAD_ID.match(upload_id):
+        raise HTTPException(status_code=404, detail="Upload tidak ditemukan")
+    try:
+        f = open(meta_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload tidak ditemukan")
+    with f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(status_code=423, detail="Upload sedang ditulis oleh request lain")
+        # File bisa saja sudah di-finalize/dihapus request lain sebelum kunci didapat
+        if not os.path.exists(meta_path):
+            raise HTTPException(status_code=404, detail="Upload tidak ditemukan")
+        meta = json.load(f)
+        if meta["user_id"] != user_id:
+            raise HTTPException(status_code=404, detail="Upload tidak ditemukan")
+        if meta["created_at"] + RESUMABLE_UPLOAD_TTL < time.time():
+            discard(upload_id)
+            raise HTTPException(status_code=404, detail="Upload tidak ditemukan")
+        yield meta
+
+
+async def append(upload_id: str, meta: dict, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """
+    Menambahkan body request ke file .part mulai dari `offset` dan mengembalikan offset baru.
+    Byte yang sudah diterima tetap tersimpan jika klien putus di tengah jalan.
+    """
+    _, data_path = _paths(upload_id)
+    current = os.path.getsize(data_path)
+    if offset != current:
+        raise HTTPException(status_code=409, detail=f"Upload-Offset {offset} tidak sesuai, offset server {current}")
+    remaining = meta["length"] - current
+    written = 0
+    async with aiofiles.open(data_path, "ab") as f:
+        try:
+            async for chunk in chunks:
+                if written + len(chunk) > remaining:
+                    # Potongan melebihi ukuran yang diumumkan: buang seluruh isi PATCH ini
+                    await f.truncate(current)
+                    raise HTTPException(status_code=413, detail="Data melebihi ukuran upload")
+                await f.write(chunk)
+                written += len(chunk)
+        finally:
+            await f.flush()
+            # Offset yang dilaporkan ke klien harus tetap benar setelah server mati mendadak
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, f.fileno())
+    return current + written
+
+
+def finalize(upload_id: str, meta: dict) -> Tuple[str, str]:
+    # Mengembalikan (media_url, tipe pesan); upload harus sudah lengkap
+    _, data_path = _paths(upload_id)
+    received = os.path.getsize(data_path)
+    if received != meta["length"]:
+        raise HTTPException(status_code=409, detail=f"Upload belum lengkap ({received}/{meta['length']} byte)")
+    file_type, ext = classify_media(meta["content_type"])
+    filename = media_filename(file_type, ext)
+    get_storage().save_file(filename, data_path, meta["content_type"])
+    discard(upload_id)
+    return filename, file_type
+
+
+def prune(now: float = None) -> List[str]:
+    """
+    Menghapus upload yang kedaluwarsa (dan file .part yatim) dari RESUMABLE_UPLOAD_DIR.
+    """
+    now = now or time.time()
+    removed = []
+    if not os.path.isdir(RESUMABLE_UPLOAD_DIR):
+        return removed
+    for name in os.listdir(RESUMABLE_UPLOAD_DIR):
+        upload_id, ext = os.path.splitext(name)
+        path = os.path.join(RESUMABLE_UPLOAD_DIR, name)
+        if ext == ".json":
+            try:
+                with open(path) as f:
+                    expired = json.load(f)["created_at"] + RESUMABLE_UPLOAD_TTL < now
+            except (OSError, ValueError, KeyError):
+                continue
+        elif ext in (".part", ".tmp"):
+            # .part tanpa metadata (create yang gagal di tengah) dibuang setelah TTL berdasarkan mtime
+            meta_path, _ = _paths(upload_id)
+            expired = not os.path.exists(meta_path) and os.path.getmtime(path) + RESUMABLE_UPLOAD_TTL < now
+        else:
+            continue
+        if not expired:
+            continue
+        if ext == ".json":
+            discard(upload_id)
+        else:
+            os.remove(path)
+        removed.append(upload_id)
+    return removed
@@ -1,7 +1,7 @@
 # app/schemas.py
 
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, Any
+from typing import Any, Dict, List, Optional
 from datetime import date, datetime
 
 # Skema Respons Umum
@@ -60,6 +60,12 @@ class LoginRequest(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+# Skema untuk menukar refresh token
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., description="Refresh token dari /login atau /token/refresh")
 
 # Skema untuk login dengan profil pengguna
 class TokenResponse(ResponseModel):
@@ -115,10 +121,21 @@ class DataEntryResponse(BaseModel):
     int_field7: int
     int_field8: int
     owner_id: int
+    version: int = 0
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+# Satu perubahan untuk sinkronisasi inkremental; deleted_at terisi berarti baris sudah dihapus
+class DataEntryChange(DataEntryResponse):
+    deleted_at: Optional[datetime] = None
+
+class DataEntryChanges(BaseModel):
+    changes: List[DataEntryChange]
+    next_since: int  # kirim sebagai `since` pada sync berikutnya
+    has_more: bool
+
 # Skema untuk log aktivitas
 class ActivityLogCreate(BaseModel):
     action: str
@@ -181,6 +198,54 @@ class UserReportResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Envelope respons bertipe: data bukan Any, sehingga serializer Pydantic dapat dikompilasi sekali
+class UserEnvelope(BaseModel):
+    success: bool
+    data: Optional[UserResponse] = None
+    error: Optional[str] = None
+
+class UserListEnvelope(BaseModel):
+    success: bool
+    data: Optional[List[UserResponse]] = None
+    error: Optional[str] = None
+
+# Lookup banyak user sekaligus (GET/POST /users/batch)
+class UserBatchRequest(BaseModel):
+    ids: List[int]
+
+class UserMapEnvelope(BaseModel):
+    success: bool
+    data: Optional[Dict[str, UserResponse]] = None  # id (string) -> user; id yang tidak ada tidak muncul
+    error: Optional[str] = None
+
+class DataEntryListEnvelope(BaseModel):
+    success: bool
+    data: Optional[List[DataEntryResponse]] = None
+    error: Optional[str] = None
+    next_cursor: Optional[str] = None  # kirim sebagai `cursor` untuk halaman berikutnya; null = halaman terakhir
+
+# Profil route sesuai permintaan (POST /admin/profiles, lihat profiler.py)
+class ProfileRequest(BaseModel):
+    method: str = Field(..., description="Method HTTP route, misalnya GET")
+    path: str = Field(..., description="Template path route, misalnya /chats/{chat_id}/messages")
+    requests: int = Field(10, description="Jumlah request berikutnya yang diprofil")
+    sort: str = Field("cumulative", description="Urutan ringkasan: cumulative, tottime, atau calls")
+
+class DataEntryChangesEnvelope(BaseModel):
+    success: bool
+    data: Optional[DataEntryChanges] = None
+    error: Optional[str] = None
+
+class ActivityLogListEnvelope(BaseModel):
+    success: bool
+    data: Optional[List[ActivityLogResponse]] = None
+    error: Optional[str] = None
+
+class UserReportListEnvelope(BaseModel):
+    success: bool
+    data: Optional[List[UserReportResponse]] = None
+    error: Optional[str] = None
+
 
 class Message(BaseModel):
     id: str
@@ -0,0 +1,106 @@
+# app/seed.py
+#
+# Mengisi database dengan data yang menyerupai produksi (banyak user, chat, pesan, data entry,
+# report dan log) untuk pengujian query budget dan benchmark lokal.
+
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import auth, chat_models, models
+
+SEED_PASSWORD = "password123"
+
+
+def seed(db: Session, users: int = 100, chats_per_user: int = 5, messages_per_chat: int = 30,
+         entries_per_user: int = 20, reports_per_user: int = 10, logs_per_user: int = 50) -> Dict[str, int]:
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    hashed_password = auth.pwd_context.hash(SEED_PASSWORD)
+
+    db.execute(insert(models.User), [
+        {
+            "name": f"Seed User {i}",
+            "username": f"seed{i}",
+            "email": f"seed{i}@example.com",
+            "hashed_password": hashed_password,
+            "role": "admin" if i == 0 else "user",
+            "disease": rng.choice([None, "diabetes", "hipertensi", "asma"]),
+            "place_of_birth": rng.choice(["Jakarta", "Bandung", "Surabaya", "Medan"]),
+        }
+        for i in range(users)
+    ])
+    user_ids = [row[0] for row in db.query(models.User.id).filter(models.User.username.like("seed%")).order_by(models.User.id)]
+
+    chats, participants, messages, pairs = [], [], [], set()
+    for user_id in user_ids:
+        for other_id in rng.sample(user_ids, min(chats_per_user, len(user_ids))):
+            pair = tuple(sorted((user_id, other_id)))
+            if other_id == user_id or pair in pairs:
+                continue
+            pairs.add(pair)
+            chat_id = str(uuid.uuid4())
+            started = now - timedelta(days=rng.randint(1, 365))
+            chats.append({
+                "id": chat_id,
+                "created_at": started,
+                "updated_at": started + timedelta(minutes=(messages_per_chat - 1) * 7),
+            })
+            participants += [{"chat_id": chat_id, "user_id": user_id}, {"chat_id": chat_id, "user_id": other_id}]
+            for n in range(messages_per_chat):
+                messages.append({
+                    "id": str(uuid.uuid4()),
+                    "chat_id": chat_id,
+                    "sender_id": rng.choice(pair),
+                    "content": f"Pesan {n} tentang jadwal kontrol dan obat",
+                    "message_type": "text",
+                    "timestamp": started + timedelta(minutes=n * 7),
+                    "read": n < messages_per_chat - 3,
+                })
+    db.execute(insert(chat_models.Chat), chats)
+    db.execute(insert(chat_models.ChatParticipant), participants)
+    db.execute(insert(chat_models.Message), messages)
+
+    db.execute(insert(models.DataEntry), [
+        {
+            **{f"string_field{k}": f"nilai {rng.randint(0, 999)}" for k in range(1, 4)},
+            **{f"int_field{k}": rng.randint(0, 1000) for k in range(1, 9)},
+            "owner_id": user_id,
+            "version": n + 1,
+            "updated_at": now - timedelta(minutes=entries_per_user - n),
+        }
+        for user_id in user_ids for n in range(entries_per_user)
+    ])
+    if entries_per_user:
+        db.execute(insert(models.DataEntryClock), [
+            {"owner_id": user_id, "version": entries_per_user} for user_id in user_ids
+        ])
+    db.execute(insert(models.UserReport), [
+        {
+            **{f"int_value{k}": rng.randint(0, 100) for k in range(1, 9)},
+            "user_id": user_id,
+            "timestamp": now - timedelta(hours=rng.randint(0, 24 * 60)),
+        }
+        for user_id in user_ids for _ in range(reports_per_user)
+    ])
+    db.execute(insert(models.ActivityLog), [
+        {
+            "action": "Seed activity",
+            "user_id": user_id,
+            "timestamp": now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+        }
+        for user_id in user_ids for _ in range(logs_per_user)
+    ])
+    db.commit()
+    return {
+        "users": len(user_ids),
+        "chats": len(chats),
+        "messages": len(messages),
+        "data_entries": len(user_ids) * entries_per_user,
+        "reports": len(user_ids) * reports_per_user,
+        "activity_logs": len(user_ids) * logs_per_user,
+    }
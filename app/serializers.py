@@ -0,0 +1,71 @@
+# app/serializers.py
+#
+# Jalur respons cepat: baris hasil query (tuple ringan, bukan instance ORM) divalidasi lewat
+# skema yang dikompilasi sekali saat import, lalu envelope bertipe diserialisasi langsung
+# ke bytes JSON oleh pydantic-core. Endpoint yang mengembalikan Response ini melewati validasi
+# ulang dan jsonable_encoder milik FastAPI.
+
+from typing import Dict, List, Optional, Sequence, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict, EmailStr, TypeAdapter, create_model
+
+from . import chat_schemas, schemas
+
+
+class JSONBytesResponse(Response):
+    media_type = "application/json"
+
+
+def columns_for(model, schema: Type[BaseModel]) -> list:
+    # Kolom model yang namanya sama dengan field skema, untuk query berbentuk tuple
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def render(envelope: BaseModel, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    return JSONBytesResponse(
+        content=envelope.__pydantic_serializer__.to_json(envelope),
+        status_code=status_code,
+        headers=headers,
+    )
+
+
+class ListSerializer:
+    """
+    Serializer list yang dikompilasi sekali per skema. Data berasal dari database dan sudah divalidasi
+    saat ditulis, sehingga EmailStr diperlakukan sebagai str (validasi email adalah bagian termahal);
+    bentuk JSON yang dihasilkan tetap sama dengan envelope bertipe di schemas.
+    """
+
+    def __init__(self, schema: Type[BaseModel], keyed: bool = False, **extra_fields):
+        fields = {
+            name: (str if field.annotation is EmailStr else field.annotation, field.default if not field.is_required() else ...)
+            for name, field in schema.model_fields.items()
+        }
+        item = create_model(f"{schema.__name__}Row", __config__=ConfigDict(from_attributes=True), **fields)
+        envelope = create_model(
+            f"{schema.__name__}{'Map' if keyed else 'List'}Body",
+            success=(bool, ...),
+            # keyed: data berupa objek {id: baris} alih-alih list
+            data=(Optional[Dict[str, item]] if keyed else Optional[List[item]], None),
+            error=(Optional[str], None),
+            **extra_fields,
+        )
+        self.adapter = TypeAdapter(envelope)
+
+    def dump(self, rows: Sequence, **extra) -> bytes:
+        # Satu panggilan validasi (di pydantic-core) untuk seluruh baris, lalu langsung ke bytes
+        envelope = self.adapter.validate_python({"success": True, "data": rows, **extra}, from_attributes=True)
+        return self.adapter.dump_json(envelope)
+
+    def render(self, rows: Sequence, headers: Optional[Dict[str, str]] = None, **extra) -> Response:
+        return JSONBytesResponse(content=self.dump(rows, **extra), headers=headers)
+
+
+users = ListSerializer(schemas.UserResponse)
+users_by_id = ListSerializer(schemas.UserResponse, keyed=True)
+data_entries = ListSerializer(schemas.DataEntryResponse, next_cursor=(Optional[str], None))
+activity_logs = ListSerializer(schemas.ActivityLogResponse)
+user_reports = ListSerializer(schemas.UserReportResponse)
+messages = ListSerializer(chat_schemas.Message, next_cursor=(Optional[str], None))
+chats = ListSerializer(chat_schemas.Chat)
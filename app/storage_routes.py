@@ -0,0 +1,89 @@
+# app/storage_routes.py
+#
+# Upload dan download media langsung ke storage (lihat media_storage.py):
+#   POST /storage/uploads          minta URL upload bertanda tangan + media_url untuk pesan
+#   GET  /storage/media/{name}     redirect ke URL download (presigned GET di S3, /media di lokal)
+#   PUT  /storage/local/{name}     tujuan URL upload untuk backend lokal (otorisasi lewat signature)
+
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import aiofiles
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import RedirectResponse
+
+from . import chat_schemas, auth, schemas, media_storage
+from .media_service import classify_media, media_filename
+from .media_storage import LocalStorage, get_storage
+from .query_budget import query_budget
+
+router = APIRouter()
+
+MEDIA_DIRECT_MAX_SIZE = int(os.getenv("MEDIA_DIRECT_MAX_SIZE", 1024 * 1024 * 1024))  # 1GB
+
+
+@router.post("/storage/uploads", response_model=chat_schemas.DirectUploadResponse)
+@query_budget(statements=0)
+def create_direct_upload(
+    request: chat_schemas.MediaUploadCreate,
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    file_type, ext = classify_media(request.content_type)
+    if file_type not in ("image", "video"):
+        raise HTTPException(status_code=400, detail="Only image and video files are allowed")
+    if not 0 < request.length <= MEDIA_DIRECT_MAX_SIZE:
+        raise HTTPException(status_code=413, detail=f"File size exceeds the limit of {MEDIA_DIRECT_MAX_SIZE / 1024 / 1024}MB")
+    filename = media_filename(file_type, ext)
+    upload = get_storage().presign_upload(filename, request.content_type, request.length)
+    return chat_schemas.DirectUploadResponse(success=True, data=chat_schemas.DirectUpload(
+        media_url=filename,
+        message_type=file_type,
+        upload=chat_schemas.PresignedUpload(**upload),
+        expires_at=datetime.utcnow() + timedelta(seconds=media_storage.MEDIA_PRESIGN_TTL),
+    ))
+
+
+@router.get("/storage/media/{name}")
+@query_budget(statements=0)
+def download_media(name: str, current_user: auth.Principal = Depends(auth.get_current_principal)):
+    return RedirectResponse(get_storage().download_url(name), status_code=307)
+
+
+@router.put("/storage/local/{name}", response_model=schemas.ResponseModel)
+@query_budget(statements=0)
+async def put_local_media(
+    name: str,
+    request: Request,
+    content_type: str,
+    max_size: int,
+    expires: int,
+    signature: str,
+):
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage) or not storage.verify_upload(name, content_type, max_size, expires, signature):
+        raise HTTPException(status_code=403, detail="URL upload tidak valid atau kedaluwarsa")
+    if request.headers.get("content-type") != content_type:
+        raise HTTPException(status_code=400, detail=f"Content-Type harus {content_type}")
+    path = storage.path(name)
+    if os.path.exists(path):
+        raise HTTPException(status_code=409, detail="Media sudah diunggah")
+
+    os.makedirs(storage.root, exist_ok=True)
+    # Ditulis ke file sementara lalu di-rename: /media tidak pernah menyajikan file setengah jadi
+    temp_path = os.path.join(storage.root, f".{uuid.uuid4().hex}.tmp")
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail="Data melebihi ukuran upload")
+                await f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Body kosong")
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return schemas.ResponseModel(success=True, data={"media_url": name, "size": size})
@@ -0,0 +1,169 @@
+# app/structured_logging.py
+#
+# Log aplikasi terstruktur: satu objek JSON per baris di stdout, siap dibaca log shipper.
+#   {"ts": "...", "level": "ERROR", "logger": "app.chat_routes", "message": "...",
+#    "request_id": "...", "method": "POST", "route": "/messages/upload-media", "elapsed_ms": 12.3,
+#    "exc": "Traceback ..."}
+# - Pemanggil hanya membuat record dan memasukkannya ke antrean (QueueHandler); format JSON dan
+#   penulisan ke stdout dikerjakan thread penulis (QueueListener), sehingga log tidak pernah
+#   memblokir event loop atau menambah latensi request.
+# - RequestContextMiddleware memberi setiap request id (header X-Request-ID dari proxy, atau dibuat
+#   baru) yang dikembalikan di respons dan dicatat di setiap baris log selama request berjalan.
+# - MetricsMiddleware menulis satu baris "request" per request dengan status, durasi dan jumlah query
+#   (matikan dengan LOG_ACCESS=0).
+# LOG_FORMAT=text mengembalikan format teks biasa (pengembangan lokal); LOG_LEVEL default INFO.
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_ACCESS = os.getenv("LOG_ACCESS", "1") != "0"
+# Baris yang dibuang jika penulis tertinggal sejauh ini (mis. stdout macet), daripada memblokir request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Atribut LogRecord bawaan; sisanya (dari `extra=`) ikut ditulis sebagai field JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class RequestContext:
+    __slots__ = ("request_id", "scope", "started")
+
+    def __init__(self, request_id: str, scope: dict):
+        self.request_id = request_id
+        self.scope = scope
+        self.started = time.perf_counter()
+
+
+_context: ContextVar[Optional[RequestContext]] = ContextVar("log_context", default=None)
+
+
+def request_id() -> Optional[str]:
+    context = _context.get()
+    return context.request_id if context is not None else None
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI murni: mengisi konteks log request dan menambahkan X-Request-ID ke respons.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER)
+        # Id dari proxy dipakai ulang (dibatasi) agar log nginx dan aplikasi bisa digabung
+        value = incoming.decode("latin-1")[:128] if incoming else uuid.uuid4().hex
+        token = _context.set(RequestContext(value, scope))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, value.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _context.reset(token)
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Dijalankan di thread pemanggil: hanya yang harus diambil di sini (konteks request, pesan
+        # dengan argumennya, traceback) yang dikerjakan; format JSON menunggu di thread penulis
+        context = _context.get()
+        if context is not None:
+            route = context.scope.get("route")
+            record.request_id = context.request_id
+            record.method = context.scope.get("method")
+            record.route = getattr(route, "path", None) or context.scope.get("path")
+            record.elapsed_ms = round((time.perf_counter() - context.started) * 1000, 2)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def start() -> None:
+    """
+    Memasang handler antrean di root logger dan menjalankan thread penulis. Dipanggil sekali per
+    proses (lifespan worker atau runner job), setelah fork.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    records: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = _ContextQueueHandler(records)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    # Log server uvicorn ikut format yang sama; baris akses diganti baris "request" dari MetricsMiddleware
+    for name in ("uvicorn", "uvicorn.error"):
+        logging.getLogger(name).handlers = []
+        logging.getLogger(name).propagate = True
+    if LOG_ACCESS:
+        logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+    _listener.start()
+
+
+def access_enabled() -> bool:
+    return LOG_ACCESS and _listener is not None
+
+
+def stop() -> None:
+    # Menulis sisa antrean sebelum proses keluar; log setelahnya ditulis langsung tanpa antrean
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
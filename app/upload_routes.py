@@ -0,0 +1,102 @@
+# app/upload_routes.py
+#
+# Endpoint upload media bertahap (lihat resumable_upload.py untuk protokolnya). Hasil finalize sama
+# dengan /messages/upload-media: media_url yang dikirim lewat POST /messages.
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+
+from . import chat_schemas, auth, schemas, serializers, resumable_upload
+from .dependencies import get_db
+from .logging_service import log_activity
+from .media_service import schedule_derivatives
+from .query_budget import query_budget
+
+router = APIRouter()
+
+CHUNK_CONTENT_TYPE = "application/offset+octet-stream"
+
+
+def _status_response(upload_id: str, meta: dict, status_code: int = 200, headers: dict = None) -> Response:
+    data = chat_schemas.ResumableUploadStatus(**resumable_upload.status(upload_id, meta))
+    headers = {
+        "Upload-Offset": str(data.offset),
+        "Upload-Length": str(data.length),
+        "Cache-Control": "no-store",
+        **(headers or {}),
+    }
+    return serializers.render(
+        chat_schemas.ResumableUploadResponse(success=True, data=data), status_code=status_code, headers=headers
+    )
+
+
+@router.post("/messages/uploads", response_model=chat_schemas.ResumableUploadResponse, status_code=201)
+@query_budget(statements=0)
+def create_upload(
+    request: chat_schemas.MediaUploadCreate,
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    upload_id, meta = resumable_upload.create(current_user.id, request.length, request.content_type)
+    return _status_response(upload_id, meta, status_code=201, headers={"Location": f"/messages/uploads/{upload_id}"})
+
+
+@router.api_route("/messages/uploads/{upload_id}", methods=["GET", "HEAD"], response_model=chat_schemas.ResumableUploadResponse)
+@query_budget(statements=0)
+def read_upload(upload_id: str, current_user: auth.Principal = Depends(auth.get_current_principal)):
+    with resumable_upload.locked(upload_id, current_user.id) as meta:
+        return _status_response(upload_id, meta)
+
+
+@router.patch("/messages/uploads/{upload_id}", response_model=chat_schemas.ResumableUploadResponse)
+@query_budget(statements=0)
+async def append_upload(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    # Tanpa sesi database: body bisa di-stream lama dari jaringan lambat tanpa menahan koneksi pool
+    if request.headers.get("content-type") != CHUNK_CONTENT_TYPE:
+        raise HTTPException(status_code=415, detail=f"Content-Type harus {CHUNK_CONTENT_TYPE}")
+    with resumable_upload.locked(upload_id, current_user.id) as meta:
+        try:
+            await resumable_upload.append(upload_id, meta, upload_offset, request.stream())
+        except ClientDisconnect:
+            # Byte yang sudah diterima tetap tersimpan; klien melanjutkan dari offset di HEAD
+            return Response(status_code=400)
+        return _status_response(upload_id, meta)
+
+
+@router.post("/messages/uploads/{upload_id}/finalize")
+@query_budget(statements=2, commits=1)
+def finalize_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_principal)
+):
+    with resumable_upload.locked(upload_id, current_user.id) as meta:
+        media_url, file_type = resumable_upload.finalize(upload_id, meta)
+
+    derivatives = schedule_derivatives(db, media_url) if file_type == "image" else {}
+
+    log = schemas.ActivityLogCreate(action=f"Uploaded {file_type}")
+    log_activity(db, log, current_user.id)
+
+    return {
+        "success": True,
+        "data": {
+            "media_url": media_url,
+            "message_type": file_type,
+            "derivatives": derivatives
+        }
+    }
+
+
+@router.delete("/messages/uploads/{upload_id}", response_model=schemas.ResponseModel)
+@query_budget(statements=0)
+def delete_upload(upload_id: str, current_user: auth.Principal = Depends(auth.get_current_principal)):
+    with resumable_upload.locked(upload_id, current_user.id):
+        resumable_upload.discard(upload_id)
+    return schemas.ResponseModel(success=True, data=None)
@@ -0,0 +1,208 @@
+# app/user_bulk.py
+#
+# Impor dan ekspor user massal untuk onboarding klinik (lihat admin_routes.py):
+# - Impor membaca CSV (header = kolom schemas.UserCreate) atau NDJSON (satu objek per baris) per batch
+#   USER_IMPORT_BATCH_SIZE baris. Per batch: validasi dengan schemas.UserCreate, satu query untuk
+#   username/email yang sudah ada, hash bcrypt paralel (passwords.hash_many) di luar transaksi, lalu
+#   satu INSERT multi-baris + satu activity log dalam satu commit.
+# - Baris yang tidak valid atau username/email-nya sudah dipakai (di database atau di baris sebelumnya
+#   dalam file yang sama) dilewati dan dilaporkan dengan nomor barisnya; mengulang impor file yang
+#   sama aman. Bentrok yang baru muncul saat INSERT (pendaftaran bersamaan) membuat batch itu
+#   diulang per baris, sehingga impor tidak pernah berhenti di tengah.
+# - Ekspor men-stream semua user (tanpa hash password) dari replica jika ada.
+
+import csv
+import io
+import json
+import os
+from datetime import date
+from typing import IO, Dict, Iterable, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from . import db_routing, models, passwords, response_cache, schemas
+from .database import SessionLocal
+from .logging_service import log_activity
+
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", 1000))
+USER_IMPORT_MAX_BYTES = int(os.getenv("USER_IMPORT_MAX_BYTES", 100 * 1024 * 1024))  # 100MB
+USER_EXPORT_BATCH_SIZE = 1000
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+REQUIRED_FIELDS = [name for name, field in schemas.UserCreate.model_fields.items() if field.is_required()]
+EXPORT_FIELDS = list(schemas.UserResponse.model_fields)
+
+
+class UserImportError(ValueError):
+    pass
+
+
+def _csv_rows(reader: csv.DictReader) -> Iterator[Tuple[int, object]]:
+    for row in reader:
+        # Sel kosong berarti tidak diisi (misalnya date_of_birth), bukan string kosong
+        yield reader.line_num, {key: value for key, value in row.items() if key is not None and value != ""}
+
+
+def _ndjson_rows(f: IO[str]) -> Iterator[Tuple[int, object]]:
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, "baris bukan JSON yang valid"
+
+
+def read_rows(f: IO[str], fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    (nomor baris, data mentah) untuk setiap user di file; data berupa str jika barisnya bukan JSON valid.
+    Header CSV diperiksa saat fungsi dipanggil, sebelum respons mulai di-stream.
+    """
+    if fmt != "csv":
+        return _ndjson_rows(f)
+    reader = csv.DictReader(f)
+    missing = [name for name in REQUIRED_FIELDS if name not in (reader.fieldnames or [])]
+    if missing:
+        raise UserImportError(f"Header CSV tidak memuat kolom: {', '.join(missing)}")
+    return _csv_rows(reader)
+
+
+def _validate(raw: object) -> schemas.UserCreate:
+    if isinstance(raw, str):
+        raise UserImportError(raw)
+    if not isinstance(raw, dict):
+        raise UserImportError("baris harus berupa objek JSON")
+    try:
+        return schemas.UserCreate.model_validate(raw)
+    except ValidationError as exc:
+        raise UserImportError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+        ))
+
+
+def _existing(users: List[schemas.UserCreate]) -> Tuple[set, set]:
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(models.User.username, models.User.email).where(or_(
+                models.User.username.in_({user.username for user in users}),
+                models.User.email.in_({user.email for user in users}),
+            ))
+        ).all()
+    return {row.username for row in rows}, {row.email for row in rows}
+
+
+def _import_batch(batch: List[Tuple[int, schemas.UserCreate]], admin_id: int,
+                  seen_usernames: set, seen_emails: set) -> Tuple[int, List[Dict]]:
+    skipped = []
+    existing_usernames, existing_emails = _existing([user for _, user in batch])
+    accepted = []
+    for line, user in batch:
+        if user.username in seen_usernames or user.username in existing_usernames:
+            skipped.append({"line": line, "error": f"Username {user.username} sudah digunakan"})
+        elif user.email in seen_emails or user.email in existing_emails:
+            skipped.append({"line": line, "error": f"Email {user.email} sudah digunakan"})
+        else:
+            accepted.append((line, user))
+        seen_usernames.add(user.username)
+        seen_emails.add(user.email)
+    if not accepted:
+        return 0, skipped
+
+    # Bagian mahal (bcrypt) berjalan sebelum transaksi dibuka
+    hashed = passwords.hash_many([user.password for _, user in accepted])
+    rows = [
+        {**user.model_dump(exclude={"password"}), "hashed_password": hashed_password}
+        for (_, user), hashed_password in zip(accepted, hashed)
+    ]
+    created = len(rows)
+    with SessionLocal() as db:
+        try:
+            db.execute(insert(models.User), rows)
+        except IntegrityError:
+            # User yang sama didaftarkan (lewat /register atau impor lain) setelah pengecekan di atas:
+            # batch diulang per baris, masing-masing dalam savepoint, dan baris yang bentrok dilewati
+            db.rollback()
+            created = 0
+            for (line, _), row in zip(accepted, rows):
+                try:
+                    with db.begin_nested():
+                        db.execute(insert(models.User), [row])
+                    created += 1
+                except IntegrityError:
+                    skipped.append({"line": line, "error": "Username atau email sudah digunakan"})
+            if not created:
+                db.rollback()
+                return 0, skipped
+        log_activity(db, schemas.ActivityLogCreate(action=f"Admin mengimpor {created} user."), admin_id)
+        db.commit()
+    response_cache.invalidate("users")
+    return created, skipped
+
+
+def import_users(rows: Iterable[Tuple[int, object]], admin_id: int) -> Iterator[Dict]:
+    """
+    Mengimpor user per batch dan menghasilkan satu ringkasan per batch
+    ({"batch", "created", "skipped": [{"line", "error"}]}) untuk di-stream sebagai progres.
+    """
+    seen_usernames, seen_emails = set(), set()
+    batch: List[Tuple[int, schemas.UserCreate]] = []
+    invalid: List[Dict] = []
+    number = 0
+
+    def flush() -> Dict:
+        nonlocal batch, invalid, number
+        number += 1
+        created, skipped = _import_batch(batch, admin_id, seen_usernames, seen_emails) if batch else (0, [])
+        summary = {"batch": number, "created": created, "skipped": sorted(invalid + skipped, key=lambda item: item["line"])}
+        batch, invalid = [], []
+        return summary
+
+    for line, raw in rows:
+        try:
+            batch.append((line, _validate(raw)))
+        except UserImportError as exc:
+            invalid.append({"line": line, "error": str(exc)})
+        if len(batch) + len(invalid) >= USER_IMPORT_BATCH_SIZE:
+            yield flush()
+    if batch or invalid:
+        yield flush()
+
+
+def _export_value(value) -> object:
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def export_users(fmt: str) -> Iterator[str]:
+    """
+    Semua user dalam format csv/ndjson, urut id, dibaca dalam satu statement yang di-stream.
+    """
+    # Sesi sendiri, bukan get_db: dependency ditutup sebelum StreamingResponse selesai dikirim
+    db = SessionLocal()
+    db.info["replica"] = db_routing.choose_replica()
+    try:
+        result = db.execute(
+            select(*[getattr(models.User, name) for name in EXPORT_FIELDS])
+            .order_by(models.User.id)
+            .execution_options(yield_per=USER_EXPORT_BATCH_SIZE)
+        )
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+        for partition in result.partitions():
+            if fmt == "csv":
+                writer.writerows([[_export_value(value) for value in row] for row in partition])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(EXPORT_FIELDS, map(_export_value, row))), ensure_ascii=False) + "\n"
+                    for row in partition
+                )
+        if fmt == "csv" and buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
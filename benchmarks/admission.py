@@ -0,0 +1,128 @@
+# benchmarks/admission.py
+#
+# Menunjukkan efek admission control: latensi ekor klien normal (beberapa user yang membuka /chats
+# beberapa kali per detik) saat sendirian dan saat satu klien melakukan polling /chats tanpa jeda
+# dari banyak koneksi. Dijalankan dua kali, dengan ADMISSION_ENABLED=0 dan ADMISSION_ENABLED=1,
+# terhadap worker uvicorn terpisah dan database SQLite sementara yang sudah di-seed.
+#
+#   python benchmarks/admission.py --duration 10
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORKDIR = tempfile.mkdtemp(prefix="kanapp-admission-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+
+from app import auth, chat_models, models  # noqa: E402,F401
+from app.database import SessionLocal  # noqa: E402
+
+
+def request(port: int, token: str) -> tuple:
+    req = urllib.request.Request(f"http://127.0.0.1:{port}/chats", headers={"Authorization": f"Bearer {token}"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as exc:
+        status = exc.code
+    except (urllib.error.URLError, ConnectionError):
+        status = 0
+    return status, time.perf_counter() - started
+
+
+def well_behaved(port: int, token: str, rate: float, stop: threading.Event, latencies: list, statuses: Counter) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        status, elapsed = request(port, token)
+        statuses[status] += 1
+        if status == 200:
+            latencies.append(elapsed)
+        stop.wait(max(0.0, 1 / rate - (time.perf_counter() - started)))
+
+
+def abusive(port: int, token: str, stop: threading.Event, statuses: Counter) -> None:
+    while not stop.is_set():
+        statuses[request(port, token)[0]] += 1
+
+
+def run_phase(port: int, tokens: list, abuser_token: str, args, with_abuser: bool) -> str:
+    stop = threading.Event()
+    latencies, good, bad = [], Counter(), Counter()
+    threads = [threading.Thread(target=well_behaved, args=(port, t, args.rate, stop, latencies, good)) for t in tokens]
+    if with_abuser:
+        threads += [threading.Thread(target=abusive, args=(port, abuser_token, stop, bad)) for _ in range(args.abusers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000  # noqa: E731
+    line = (f"normal: n={len(latencies)} p50 {statistics.median(latencies) * 1000:.1f} ms "
+            f"p95 {p(0.95):.1f} ms p99 {p(0.99):.1f} ms status {dict(good)}")
+    if with_abuser:
+        line += f" | abuser status {dict(bad)}"
+    return line
+
+
+def serve(port: int, enabled: bool) -> subprocess.Popen:
+    env = dict(os.environ, ADMISSION_ENABLED="1" if enabled else "0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=WORKDIR, env=dict(env, PYTHONPATH=ROOT), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1).read()
+            return proc
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError("uvicorn tidak siap dalam 30 detik")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=8, help="jumlah klien normal")
+    parser.add_argument("--rate", type=float, default=2.0, help="request per detik per klien normal")
+    parser.add_argument("--abusers", type=int, default=32, help="koneksi paralel milik klien abusive")
+    parser.add_argument("--port", type=int, default=7200)
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "-m", "app.cli", "migrate"], cwd=WORKDIR, env=dict(os.environ, PYTHONPATH=ROOT), check=True)
+    subprocess.run([sys.executable, "-m", "app.cli", "seed", "--users", "50"], cwd=WORKDIR,
+                   env=dict(os.environ, PYTHONPATH=ROOT), check=True, stdout=subprocess.DEVNULL)
+    with SessionLocal() as db:
+        users = {user.username: user for user in db.query(models.User).filter(models.User.username.like("seed%"))}
+        tokens = [auth.issue_tokens(users[f"seed{i}"])["access_token"] for i in range(1, args.clients + 1)]
+        abuser_token = auth.issue_tokens(users["seed0"])["access_token"]
+
+    for enabled in (False, True):
+        proc = serve(args.port, enabled)
+        try:
+            print(f"ADMISSION_ENABLED={int(enabled)}")
+            print(f"  quiet : {run_phase(args.port, tokens, abuser_token, args, with_abuser=False)}")
+            print(f"  burst : {run_phase(args.port, tokens, abuser_token, args, with_abuser=True)}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/chat_search.py
+#
+# Latensi /chats/search (lapisan message_search, tanpa HTTP) pada database ter-seed.
+#   SQLite (default)  : termasuk waktu membangun inverted index di memori pada pencarian pertama
+#   PostgreSQL        : --database-url ke database kosong; memakai index GIN dari `migrate`
+#
+#   python benchmarks/chat_search.py --users 500 --messages-per-chat 400     # +-1 juta pesan
+#   python benchmarks/chat_search.py --database-url postgresql://.../kanapp_bench
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = ["obat", "jadwal kontrol", "pesan 7", "tentang obat", "tidakada"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages-per-chat", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="kanapp-search-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    from app import message_search, models
+    from app.database import SessionLocal, engine
+    from app.preflight import run_migrations
+    from app.seed import seed
+
+    os.chdir(workdir)
+    run_migrations(engine)
+    db = SessionLocal()
+    started = time.perf_counter()
+    counts = seed(db, users=args.users, messages_per_chat=args.messages_per_chat)
+    print(f"seed: {counts['messages']} pesan dalam {time.perf_counter() - started:.1f} s")
+
+    user_id = db.query(models.User.id).filter(models.User.username == "seed1").scalar()
+    started = time.perf_counter()
+    message_search.search(db, user_id, "obat", 0, 21)
+    print(f"pencarian pertama (termasuk membangun index di SQLite): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    for q in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            hits = message_search.search(db, user_id, q, 0, 21)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        print(f"q={q!r:16} hits={len(hits):>2} p50 {statistics.median(samples) * 1000:.1f} ms "
+              f"p95 {samples[int(0.95 * (len(samples) - 1))] * 1000:.1f} ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/serialization.py
+#
+# Membandingkan biaya query + serialisasi untuk 1.000 user dan 1.000 pesan:
+#   legacy : instance ORM -> from_orm -> envelope -> serialize_response FastAPI -> JSONResponse
+#   fast   : tuple kolom -> TypeAdapter envelope -> bytes JSON pydantic-core
+#
+#   python benchmarks/serialization.py --rows 1000 --repeat 20
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from sqlalchemy import String, cast  # noqa: E402
+
+from app import chat_models, chat_schemas, models, schemas, serializers  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+
+def seed(rows: int) -> str:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add_all([
+        models.User(
+            name=f"User {i}", username=f"user{i}", email=f"user{i}@example.com",
+            hashed_password="x", role="user", disease="-", place_of_birth="Jakarta",
+        )
+        for i in range(rows)
+    ])
+    db.flush()
+    chat_id = str(uuid.uuid4())
+    db.add(chat_models.Chat(id=chat_id))
+    started = datetime.utcnow() - timedelta(days=1)
+    db.add_all([
+        chat_models.Message(
+            id=str(uuid.uuid4()), chat_id=chat_id, sender_id=1 + i % 2,
+            content=f"pesan nomor {i}", timestamp=started + timedelta(seconds=i), read=True,
+        )
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+    return chat_id
+
+
+async def legacy(envelope_type, envelope) -> bytes:
+    field = create_model_field(name="response", type_=envelope_type)
+    content = await serialize_response(field=field, response_content=envelope)
+    return JSONResponse(content).body
+
+
+def legacy_users(db) -> bytes:
+    users = db.query(models.User).all()
+    envelope = schemas.ResponseModel(success=True, data=[schemas.UserResponse.from_orm(u) for u in users])
+    return asyncio.run(legacy(schemas.ResponseModel, envelope))
+
+
+def fast_users(db) -> bytes:
+    users = db.query(*serializers.columns_for(models.User, schemas.UserResponse)).all()
+    return serializers.users.render(users).body
+
+
+def legacy_messages(db, chat_id: str) -> bytes:
+    messages = db.query(chat_models.Message).filter(
+        chat_models.Message.chat_id == chat_id
+    ).order_by(chat_models.Message.timestamp).all()
+    data = []
+    for message in messages:
+        sender = db.query(models.User).filter(models.User.id == message.sender_id).first()
+        data.append(chat_schemas.Message(
+            id=message.id, chat_id=message.chat_id, sender_id=str(message.sender_id),
+            sender_name=sender.name, content=message.content, message_type=message.message_type,
+            media_url=message.media_url, timestamp=message.timestamp, read=message.read,
+        ))
+    envelope = chat_schemas.MessageListResponse(success=True, data=data)
+    return asyncio.run(legacy(chat_schemas.MessageListResponse, envelope))
+
+
+def fast_messages(db, chat_id: str) -> bytes:
+    messages = db.query(
+        chat_models.Message.id,
+        chat_models.Message.chat_id,
+        cast(chat_models.Message.sender_id, String).label("sender_id"),
+        models.User.name.label("sender_name"),
+        chat_models.Message.content,
+        chat_models.Message.message_type,
+        chat_models.Message.media_url,
+        chat_models.Message.timestamp,
+        chat_models.Message.read,
+    ).join(models.User, models.User.id == chat_models.Message.sender_id).filter(
+        chat_models.Message.chat_id == chat_id
+    ).order_by(chat_models.Message.timestamp).all()
+    return serializers.messages.render(messages).body
+
+
+def measure(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        started = time.perf_counter()
+        fn(db)
+        samples.append(time.perf_counter() - started)
+        db.close()
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    chat_id = seed(args.rows)
+    cases = [
+        ("users", legacy_users, fast_users),
+        ("messages", lambda db: legacy_messages(db, chat_id), lambda db: fast_messages(db, chat_id)),
+    ]
+    for name, slow, fast in cases:
+        slow_ms = measure(slow, args.repeat)
+        fast_ms = measure(fast, args.repeat)
+        print(f"{args.rows} {name}: legacy {slow_ms:.1f} ms, fast {fast_ms:.1f} ms ({slow_ms / fast_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
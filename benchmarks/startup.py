@@ -0,0 +1,64 @@
+# benchmarks/startup.py
+#
+# Mengukur time-to-first-request sebuah worker: waktu dari proses uvicorn dijalankan
+# sampai request pertama ke endpoint yang menyentuh database berhasil.
+#
+#   python -m app.cli migrate
+#   python benchmarks/startup.py --runs 5
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def first_request_time(port: int, path: str, token: str, timeout: float) -> float:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}{path}",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(request, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError(f"Server tidak merespons dalam {timeout} detik")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=7100)
+    parser.add_argument("--path", default="/users/search/public?user_id=1")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    token = os.getenv("STATIC_BEARER_TOKEN", "")
+    samples = [first_request_time(args.port, args.path, token, args.timeout) for _ in range(args.runs)]
+    print(f"time-to-first-request ({args.runs} runs): "
+          f"median {statistics.median(samples) * 1000:.1f} ms, "
+          f"min {min(samples) * 1000:.1f} ms, max {max(samples) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# tests/conftest.py
+#
+# Test berjalan terhadap database SQLite sementara; environment diisi sebelum modul app diimpor
+# (database.py membuat engine saat import, .env tidak menimpa variabel yang sudah ada).
+#
+# Fixture query budget:
+#   def test_list_chats(client, user_headers, query_budget_guard):
+#       client.get("/chats", headers=user_headers)   # gagal jika melampaui @query_budget route-nya
+
+import os
+import tempfile
+
+import pytest
+
+_WORKDIR = tempfile.mkdtemp(prefix="kanapp-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_WORKDIR, 'test.db')}"
+# Hanya query di dalam request yang dihitung; job yang diantrekan tidak perlu dijalankan
+os.environ.setdefault("JOBS_WORKER_THREADS", "0")
+os.environ.setdefault("LOG_ACCESS", "0")
+
+
+@pytest.fixture(scope="session")
+def seeded_db():
+    from app.database import SessionLocal, engine
+    from app.preflight import run_migrations
+    from app.seed import seed
+
+    # upload-media menulis ke ./uploads; jalankan di direktori sementara seperti check-budgets
+    os.chdir(_WORKDIR)
+    run_migrations(engine)
+    db = SessionLocal()
+    seed(db, users=20)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(scope="session")
+def budget_context(seeded_db):
+    from app import budget_check
+
+    return budget_check._context(seeded_db)
+
+
+@pytest.fixture(scope="session")
+def client(seeded_db):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user_headers(budget_context):
+    return {"Authorization": f"Bearer {budget_context['token']}"}
+
+
+@pytest.fixture
+def query_budget_guard():
+    """
+    Gagal (QueryBudgetExceeded, dengan daftar statement) jika ada request selama test yang melampaui
+    @query_budget route-nya.
+    """
+    from app import query_budget
+
+    with query_budget.enforce() as violations:
+        yield violations
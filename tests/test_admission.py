@@ -0,0 +1,125 @@
+# tests/test_admission.py
+
+import asyncio
+import time
+
+from app import admission, auth
+
+
+async def _send(middleware, path: str, ip: str, token: str, method: str = "POST", headers=()) -> int:
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode()), *headers],
+        "client": (ip, 40000),
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent[0]["status"]
+
+
+def _call(middleware, path: str, ip: str, token: str, headers=()) -> int:
+    return asyncio.run(_send(middleware, path, ip, token, headers=headers))
+
+
+def _middleware():
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.post("/login")
+    def login():
+        return {"success": True}
+
+    return admission.AdmissionMiddleware(app, router=app.router)
+
+
+def test_static_token_is_limited_per_ip(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "LIMITS", dict(admission.LIMITS, auth=(0.001, 3)))
+    monkeypatch.setattr(admission, "_buckets", {})
+    middleware = _middleware()
+
+    statuses = [_call(middleware, "/login", "10.0.0.1", auth.STATIC_BEARER_TOKEN) for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    # Klien lain dengan static token yang sama tetap punya jatah sendiri
+    assert _call(middleware, "/login", "10.0.0.2", auth.STATIC_BEARER_TOKEN) == 200
+
+
+def test_jwt_does_not_bypass_auth_limit(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "LIMITS", dict(admission.LIMITS, auth=(0.001, 1)))
+    monkeypatch.setattr(admission, "_buckets", {})
+    middleware = _middleware()
+
+    assert _call(middleware, "/login", "10.0.0.3", auth.STATIC_BEARER_TOKEN) == 200
+    assert _call(middleware, "/login", "10.0.0.3", "bukan-token") == 429
+
+
+def test_forwarded_ip_is_trusted_only_from_proxy(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "ADMISSION_TRUSTED_PROXIES", frozenset({"10.0.0.9"}))
+    monkeypatch.setattr(admission, "LIMITS", dict(admission.LIMITS, auth=(0.001, 1)))
+    monkeypatch.setattr(admission, "_buckets", {})
+    middleware = _middleware()
+
+    def forwarded(value: str):
+        return [(b"x-forwarded-for", value.encode())]
+
+    # Di belakang proxy setiap pengguna punya bucket login sendiri
+    assert _call(middleware, "/login", "10.0.0.9", auth.STATIC_BEARER_TOKEN, forwarded("203.0.113.1")) == 200
+    assert _call(middleware, "/login", "10.0.0.9", auth.STATIC_BEARER_TOKEN, forwarded("203.0.113.2")) == 200
+    # Alamat palsu di kiri header tidak membuka bucket baru
+    assert _call(middleware, "/login", "10.0.0.9", auth.STATIC_BEARER_TOKEN, forwarded("1.2.3.4, 203.0.113.1")) == 429
+    # Klien langsung tidak bisa memilih IP-nya sendiri lewat header
+    assert _call(middleware, "/login", "198.51.100.7", auth.STATIC_BEARER_TOKEN, forwarded("203.0.113.3")) == 200
+    assert _call(middleware, "/login", "198.51.100.7", auth.STATIC_BEARER_TOKEN, forwarded("203.0.113.4")) == 429
+
+
+def test_abusive_client_does_not_starve_others(monkeypatch):
+    from fastapi import FastAPI
+
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "_buckets", {})
+    monkeypatch.setattr(admission, "_in_flight", {})
+    monkeypatch.setattr(admission, "_client_in_flight", {})
+    app = FastAPI()
+
+    @app.get("/chats")
+    async def list_chats():
+        await asyncio.sleep(0.05)
+        return {"success": True}
+
+    middleware = admission.AdmissionMiddleware(app, router=app.router)
+    abusive = auth.access_token_for(1, "user", 0)
+    polite = auth.access_token_for(2, "user", 0)
+
+    async def polite_client():
+        results = []
+        for _ in range(3):
+            # Datang saat request burst masih berjalan
+            await asyncio.sleep(0.01)
+            started = time.monotonic()
+            status = await _send(middleware, "/chats", "10.0.0.5", polite, method="GET")
+            results.append((status, time.monotonic() - started))
+        return results
+
+    async def scenario():
+        burst = [_send(middleware, "/chats", "10.0.0.4", abusive, method="GET") for _ in range(60)]
+        return await asyncio.gather(polite_client(), *burst)
+
+    polite_results, *abusive_statuses = asyncio.run(scenario())
+    assert 429 in abusive_statuses or 503 in abusive_statuses
+    # Klien normal tidak pernah ditolak dan tidak menunggu di belakang burst
+    assert [status for status, _ in polite_results] == [200, 200, 200]
+    assert max(elapsed for _, elapsed in polite_results) < 0.5
@@ -0,0 +1,28 @@
+# tests/test_auth.py
+
+from app import auth, models
+
+
+def _refresh(client, refresh_token: str):
+    return client.post(
+        "/token/refresh",
+        headers={"Authorization": f"Bearer {auth.STATIC_BEARER_TOKEN}"},
+        json={"refresh_token": refresh_token},
+    )
+
+
+def test_refresh_token_rotates_and_reuse_revokes_all(client, seeded_db):
+    user = seeded_db.query(models.User).filter(models.User.username == "seed3").first()
+    leaked = auth.issue_tokens(seeded_db, user)["refresh_token"]
+    seeded_db.commit()
+
+    response = _refresh(client, leaked)
+    assert response.status_code == 200
+    rotated = response.json()["data"]
+    assert rotated["refresh_token"] != leaked
+
+    # Token yang sudah ditukar tidak berlaku lagi, dan pemakaian ulangnya mencabut pasangan baru juga
+    assert _refresh(client, leaked).status_code == 401
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
+    profile = client.get("/users/me/", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert profile.status_code == 401
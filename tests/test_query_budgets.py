@@ -0,0 +1,26 @@
+# tests/test_query_budgets.py
+#
+# Skenario yang sama dengan `python -m app.cli check-budgets`, dijalankan berurutan (beberapa skenario,
+# mis. logout, bergantung pada urutan) di bawah fixture query_budget_guard.
+
+import pytest
+
+from app import budget_check
+
+
+@pytest.mark.parametrize(
+    "method, path, build", budget_check.SCENARIOS, ids=[f"{method} {path}" for method, path, _ in budget_check.SCENARIOS]
+)
+def test_route_within_budget(client, budget_context, query_budget_guard, method, path, build):
+    response = client.request(method, **build(budget_context))
+    assert response.status_code < 400, response.text[:200]
+
+
+def test_guard_reports_violation(client, user_headers, monkeypatch):
+    from app import query_budget
+
+    endpoint = next(route.endpoint for route in client.app.routes if getattr(route, "path", None) == "/users/me/")
+    monkeypatch.setattr(endpoint, "__query_budget__", query_budget.QueryBudget(statements=0, commits=0))
+    with pytest.raises(query_budget.QueryBudgetExceeded):
+        with query_budget.enforce():
+            client.get("/users/me/", headers=user_headers)